@@ -0,0 +1,192 @@
+"""Bounded request handling and admission control for the HTTP server.
+
+ThreadingMixIn starts one thread per connection with no upper bound, so a
+burst of submissions could start dozens of threads, each holding a PDF and
+its rendered pages while it waits on Grok. This module provides:
+
+- PooledMixIn: a drop-in replacement for ThreadingMixIn. A fixed number of
+  handler threads serve connections from a bounded accept queue. When the
+  queue is full, the connection is answered straight away with 503 and
+  Retry-After instead of being queued. A connection that sends nothing
+  for TSM2_REQUEST_TIMEOUT seconds (before its request line, between
+  header lines or during an upload) is closed, so idle sockets cannot hold
+  every handler thread. Requests that legitimately hold a thread for long
+  (synchronous submissions, event streams) are capped, and
+  handler_threads_for keeps TSM2_MIN_FREE_HANDLERS threads beyond those
+  caps for status polls and static files.
+- AdmissionControl: a cap on submissions in flight (synchronous requests
+  being processed plus background jobs not yet finished). /api/submit
+  answers 503 with Retry-After before reading the upload when the cap is
+  reached.
+
+Both keep live counts for the /api/status endpoint.
+"""
+
+import os
+import json
+import queue
+import socket
+import threading
+
+import logutil
+
+
+SERVER_MODE = os.environ.get("TSM2_SERVER_MODE", "pooled")
+HANDLER_THREADS = int(os.environ.get("TSM2_HANDLER_THREADS", "24"))
+MIN_FREE_HANDLERS = int(os.environ.get("TSM2_MIN_FREE_HANDLERS", "4"))
+ACCEPT_QUEUE_SIZE = int(os.environ.get("TSM2_ACCEPT_QUEUE", "64"))
+MAX_SUBMISSIONS = int(os.environ.get("TSM2_MAX_SUBMISSIONS", "8"))
+RETRY_AFTER_SECONDS = int(os.environ.get("TSM2_RETRY_AFTER_SECONDS", "30"))
+REQUEST_TIMEOUT = float(os.environ.get("TSM2_REQUEST_TIMEOUT", "30"))
+
+BUSY_MESSAGE = "The server is busy processing other submissions. Please try again in a minute."
+
+
+def handler_threads_for(long_lived, threads=HANDLER_THREADS, min_free=MIN_FREE_HANDLERS):
+    """Pool size that leaves min_free threads when long_lived requests each hold one.
+
+    A configured size that is too small is raised, with a warning, rather
+    than letting capped streams and submissions starve every other request.
+    """
+    needed = long_lived + max(1, min_free)
+    if threads < needed:
+        logutil.warning("ADMISSION", f"TSM2_HANDLER_THREADS={threads} leaves too few threads free beside "
+                        f"{long_lived} long-lived requests; using {needed}", threads=threads, needed=needed)
+        return needed
+    return threads
+
+
+class AdmissionControl:
+    """Counting gate for expensive requests; never blocks."""
+
+    def __init__(self, max_in_flight=MAX_SUBMISSIONS):
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+class PooledMixIn:
+    """Serve connections on a fixed pool of threads fed by a bounded queue.
+
+    Mix in ahead of socketserver.TCPServer / http.server.HTTPServer in
+    place of ThreadingMixIn.
+    """
+
+    handler_threads = HANDLER_THREADS
+    accept_queue_size = ACCEPT_QUEUE_SIZE
+    retry_after = RETRY_AFTER_SECONDS
+
+    def _pool_init(self):
+        self._pool_lock = threading.Lock()
+        self._pool_queue = queue.Queue(maxsize=self.accept_queue_size)
+        self._pool_threads = []
+        self._pool_busy = 0
+        self._pool_handled = 0
+        self._pool_rejected = 0
+
+    def process_request(self, request, client_address):
+        if not hasattr(self, "_pool_queue"):
+            self._pool_init()
+        if not self._pool_threads:
+            for i in range(self.handler_threads):
+                thread = threading.Thread(target=self._pool_worker, name=f"http-handler-{i}", daemon=True)
+                thread.start()
+                self._pool_threads.append(thread)
+        try:
+            self._pool_queue.put_nowait((request, client_address))
+        except queue.Full:
+            with self._pool_lock:
+                self._pool_rejected += 1
+            logutil.warning("ADMISSION", f"Accept queue full; rejecting connection from {client_address[0]}")
+            self.reject_request(request)
+
+    def _pool_worker(self):
+        while True:
+            item = self._pool_queue.get()
+            if item is None:
+                return
+            request, client_address = item
+            with self._pool_lock:
+                self._pool_busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._pool_lock:
+                    self._pool_busy -= 1
+                    self._pool_handled += 1
+
+    def reject_request(self, request):
+        """Answer a connection we have no thread for with a bare 503."""
+        body = json.dumps({"error": BUSY_MESSAGE}).encode("utf-8")
+        head = (
+            "HTTP/1.0 503 Service Unavailable\r\n"
+            f"Retry-After: {self.retry_after}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        try:
+            # Take what the client has already sent so closing the socket
+            # does not reset the connection before it reads the reply.
+            request.settimeout(0.2)
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.sendall(head + body)
+            request.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def pool_stats(self):
+        if not hasattr(self, "_pool_queue"):
+            self._pool_init()
+        with self._pool_lock:
+            return {
+                "mode": "pooled",
+                "threads": self.handler_threads,
+                "in_flight": self._pool_busy,
+                "queued": self._pool_queue.qsize(),
+                "max_queued": self.accept_queue_size,
+                "handled": self._pool_handled,
+                "rejected": self._pool_rejected,
+            }
+
+    def server_close(self):
+        super().server_close()
+        if hasattr(self, "_pool_queue"):
+            for _ in self._pool_threads:
+                try:
+                    self._pool_queue.put_nowait(None)
+                except queue.Full:
+                    break
@@ -0,0 +1,487 @@
+"""Asyncio server mode for the TSM2 Submission Portal.
+
+An alternative to the threaded servers in server.py. It serves the same
+routes: / and the in-memory assets (staticassets), other static files
+(including /uploads/), GET /api/submissions/<id> and its /events stream,
+GET /api/status, GET /metrics, GET /api/scorecards (plus /stats and /<issue>),
+OPTIONS, and POST /api/submit in synchronous and job mode.
+
+Everything that waits on the network is a coroutine on one event loop:
+- reading requests and streaming uploads into the multipart parser
+- the GitHub and Grok calls, run as flows on httppool.ASYNC_HTTP_POOL
+- background jobs, which are tasks rather than pool threads
+
+CPU-bound PDF work (analysis, page rendering for the streamed Grok body,
+base64 encoding) goes to the default executor, and the PDF engine's
+process pool runs under that. Email is already queued to emailutil's
+SMTP workers. Thousands of slow clients and long Grok calls therefore
+share a handful of threads.
+
+Run with TSM2_SERVER_MODE=asyncio (server.py dispatches here) or directly
+with `python asyncserver.py`. Directory listings are not served.
+"""
+
+import os
+import json
+import signal
+import asyncio
+import mimetypes
+import posixpath
+import http.client
+import email.utils
+import urllib.parse
+from http import HTTPStatus
+from io import BytesIO
+
+import admission
+import emailutil
+import flows
+import httppool
+import jobs
+import logutil
+import metrics
+import multipart
+import server as portal
+import staticassets
+import rangefiles
+
+
+HEADER_TIMEOUT = float(os.environ.get("TSM2_ASYNC_HEADER_TIMEOUT", "30"))
+BODY_TIMEOUT = float(os.environ.get("TSM2_ASYNC_BODY_TIMEOUT", "60"))
+MAX_HEADER_BYTES = 64 * 1024
+MAX_JSON_BODY = 1024 * 1024
+CHUNK_SIZE = multipart.CHUNK_SIZE
+
+
+class Request:
+    def __init__(self, method, target, version, headers, reader, client):
+        self.method = method
+        self.target = target
+        self.path = target.split("?")[0]
+        self.version = version
+        self.headers = headers
+        self.reader = reader
+        self.client = client
+        self.requestline = f"{method} {target} {version}"
+
+    @property
+    def wants_keep_alive(self):
+        connection = self.headers.get("Connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+
+class AsyncPortalServer:
+    """Connection handling and routing for the asyncio mode."""
+
+    def __init__(self, directory="."):
+        self.directory = os.path.abspath(directory)
+        self.open_connections = 0
+        self.in_flight = 0
+        self.handled = 0
+        self._tasks = set()
+
+    # --- connections -------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        self.open_connections += 1
+        client = (writer.get_extra_info("peername") or ("-",))[0]
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await self.read_request(reader, writer, client)
+                if request is None:
+                    break
+                self.in_flight += 1
+                try:
+                    with logutil.scope(request_id=logutil.new_request_id(request.headers.get("X-Request-ID"))):
+                        keep_alive = await self.dispatch(request, writer) and request.wants_keep_alive
+                finally:
+                    self.in_flight -= 1
+                    self.handled += 1
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logutil.error("HTTP", f"Request handling error: {type(e).__name__}: {e}")
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def read_request(self, reader, writer, client):
+        """Next request on the connection, or None when it is finished."""
+        try:
+            raw = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            await self.send(writer, None, 431, b"", keep_alive=False)
+            return None
+        line, _, rest = raw.partition(b"\r\n")
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            await self.send(writer, None, 400, b"", keep_alive=False)
+            return None
+        headers = http.client.parse_headers(BytesIO(rest))
+        return Request(parts[0].upper(), parts[1], parts[2], headers, reader, client)
+
+    async def dispatch(self, request, writer):
+        """Route one request; returns False if the connection must be closed."""
+        if request.method == "OPTIONS":
+            return await self.send(writer, request, 200, b"", headers={
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type, Prefer",
+            })
+        if request.method in ("GET", "HEAD"):
+            if request.path.startswith("/api/submissions/") and request.path.endswith("/events"):
+                return await self.handle_job_events(request, writer, request.path[len("/api/submissions/"):-len("/events")].strip("/"))
+            if request.path.startswith("/api/submissions/"):
+                return await self.handle_job_status(request, writer, request.path[len("/api/submissions/"):].strip("/"))
+            if request.path == "/api/scorecards" or request.path.startswith("/api/scorecards/"):
+                query = urllib.parse.parse_qs(urllib.parse.urlsplit(request.target).query)
+                code, data = await asyncio.get_running_loop().run_in_executor(
+                    None, portal.scorecard_response, request.path, query)
+                return await self.send_json(writer, request, code, data)
+            if request.path == "/api/status":
+                return await self.send_json(writer, request, 200, portal.server_status(self.stats()))
+            if request.path == "/metrics":
+                return await self.send(writer, request, 200, metrics.REGISTRY.render(), {"Content-Type": metrics.CONTENT_TYPE})
+            response = staticassets.STATIC_ASSETS.respond(request.path, request.headers)
+            if response is not None:
+                code, headers, body = response
+                return await self.send(writer, request, code, body, dict(headers))
+            if request.path in ("/", "", "/index.html") or staticassets.is_private(request.path):
+                return await self.send(writer, request, 404, b"File not found", {"Content-Type": "text/plain"})
+            download = rangefiles.prepare(request.path, request.headers)
+            if download is not None:
+                return await self.send_download(writer, request, download)
+            return await self.send_static(writer, request)
+        if request.method == "POST":
+            if request.path == "/api/submit":
+                return await self.handle_submit(request, writer)
+            return await self.send_json(writer, request, 404, {"error": "Not found"}, keep_alive=False)
+        return await self.send(writer, request, 501, b"", keep_alive=False)
+
+    # --- responses ---------------------------------------------------------
+
+    async def send(self, writer, request, code, body, headers=None, keep_alive=True):
+        """Write a complete response; returns keep_alive for chaining."""
+        try:
+            phrase = HTTPStatus(code).phrase
+        except ValueError:
+            phrase = ""
+        head = [f"HTTP/1.1 {code} {phrase}", "Server: TSM2-Portal-asyncio",
+                f"Date: {email.utils.formatdate(usegmt=True)}"]
+        headers = dict(headers or {})
+        headers.setdefault("Content-Length", str(len(body)))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        if logutil.get("request_id"):
+            headers["X-Request-ID"] = logutil.get("request_id")
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        if body and (request is None or request.method != "HEAD"):
+            writer.write(body)
+        await writer.drain()
+        self.log_request(request, code)
+        return keep_alive
+
+    async def send_json(self, writer, request, code, data, extra_headers=None, keep_alive=True):
+        headers = {
+            "Content-Type": "application/json",
+            "Cache-Control": "no-cache, no-store, must-revalidate",
+            "Access-Control-Allow-Origin": "*",
+        }
+        headers.update(extra_headers or {})
+        keep_alive = await self.send(writer, request, code, json.dumps(data).encode("utf-8"), headers, keep_alive)
+        # The body can hold a full scorecard; only worth writing when debugging.
+        logutil.debug("HTTP", f"Response sent: {code}", status=code, response=data)
+        return keep_alive
+
+    async def send_file(self, writer, request, path, headers=None):
+        """200 with the file's contents; no file I/O runs on the event loop.
+
+        The body goes out with loop.sendfile, as rangefiles.send_async does:
+        os.sendfile where the transport allows it, otherwise reads on the
+        default executor.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            f = await loop.run_in_executor(None, open, path, "rb")
+        except OSError:
+            return await self.send(writer, request, 404, b"File not found", {"Content-Type": "text/plain"})
+        with f:
+            stat = os.fstat(f.fileno())
+            headers = dict(headers or {})
+            headers["Content-Length"] = str(stat.st_size)
+            headers.setdefault("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+            head = [f"HTTP/1.1 200 OK", "Server: TSM2-Portal-asyncio",
+                    f"Date: {email.utils.formatdate(usegmt=True)}", "Connection: keep-alive"]
+            head.extend(f"{name}: {value}" for name, value in headers.items())
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            if request.method != "HEAD" and stat.st_size:
+                await loop.sendfile(writer.transport, f, 0, stat.st_size)
+        self.log_request(request, 200)
+        return True
+
+    async def send_download(self, writer, request, response):
+        headers = dict(response.headers)
+        if response.status != 304:
+            headers["Content-Length"] = str(response.content_length)
+        keep_alive = await self.send(writer, request, response.status, b"", headers)
+        if request.method != "HEAD":
+            await rangefiles.send_async(asyncio.get_running_loop(), writer, response)
+        return keep_alive
+
+    async def send_static(self, writer, request):
+        """Files under the working directory, as SimpleHTTPRequestHandler serves them."""
+        path = self.translate_path(request.path)
+        if os.path.isdir(path):
+            if not request.path.endswith("/"):
+                return await self.send(writer, request, 301, b"", {"Location": request.path + "/"})
+            for index in ("index.html", "index.htm"):
+                if os.path.isfile(os.path.join(path, index)):
+                    path = os.path.join(path, index)
+                    break
+            else:
+                return await self.send(writer, request, 404, b"File not found", {"Content-Type": "text/plain"})
+        if not os.path.isfile(path):
+            return await self.send(writer, request, 404, b"File not found", {"Content-Type": "text/plain"})
+        ims = request.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                since = email.utils.parsedate_to_datetime(ims).timestamp()
+                if int(os.path.getmtime(path)) <= since:
+                    return await self.send(writer, request, 304, b"")
+            except (TypeError, ValueError, IndexError, OverflowError):
+                pass
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return await self.send_file(writer, request, path, {"Content-Type": content_type})
+
+    def translate_path(self, path):
+        path = posixpath.normpath(urllib.parse.unquote(path))
+        result = self.directory
+        for word in filter(None, path.split("/")):
+            if os.path.dirname(word) or word in (os.curdir, os.pardir):
+                continue
+            result = os.path.join(result, word)
+        return result
+
+    def log_request(self, request, code):
+        requestline = request.requestline if request else "-"
+        client = request.client if request else "-"
+        logutil.info("HTTP", f'"{requestline}" {code} -', client=client, status=code)
+
+    def stats(self):
+        return {
+            "mode": "asyncio",
+            "connections": self.open_connections,
+            "in_flight": self.in_flight,
+            "handled": self.handled,
+            "background_jobs": len(self._tasks),
+        }
+
+    # --- API ---------------------------------------------------------------
+
+    async def handle_job_status(self, request, writer, job_id):
+        job = portal.JOB_MANAGER.get(job_id)
+        if job is None:
+            return await self.send_json(writer, request, 404, {"error": "Unknown submission job"})
+        return await self.send_json(writer, request, 200, job.to_dict())
+
+    async def handle_job_events(self, request, writer, job_id):
+        """Server-Sent Events for a job (see jobs); the connection closes when the job is done."""
+        job = portal.JOB_MANAGER.get(job_id)
+        if job is None:
+            return await self.send_json(writer, request, 404, {"error": "Unknown submission job"})
+        if not jobs.EVENT_STREAMS.try_acquire():
+            return await self.send_json(
+                writer, request, 503, {"error": "Too many live progress streams; poll the status URL instead."},
+                extra_headers={"Retry-After": str(admission.RETRY_AFTER_SECONDS)},
+            )
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(changed.set)
+
+        job.add_listener(listener)
+        try:
+            last_id = jobs.last_event_id(request.headers, urllib.parse.parse_qs(urllib.parse.urlsplit(request.target).query))
+            head = [f"HTTP/1.1 200 OK", "Server: TSM2-Portal-asyncio",
+                    f"Date: {email.utils.formatdate(usegmt=True)}", "Connection: close"]
+            head.extend(f"{name}: {value}" for name, value in jobs.EVENT_STREAM_HEADERS.items())
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + jobs.stream_preamble())
+            self.log_request(request, 200)
+            while True:
+                changed.clear()
+                events, done = job.events_after(last_id)
+                for event in events:
+                    writer.write(jobs.format_event(event))
+                    last_id = event[0]
+                await writer.drain()
+                if done and not events:
+                    break
+                if not events:
+                    try:
+                        await asyncio.wait_for(changed.wait(), jobs.EVENT_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        writer.write(jobs.HEARTBEAT)
+        finally:
+            job.remove_listener(listener)
+            jobs.EVENT_STREAMS.release()
+        return False
+
+    async def handle_submit(self, request, writer):
+        if not portal.SUBMISSION_ADMISSION.try_acquire():
+            logutil.info("ADMISSION", f"Rejecting submission: {portal.SUBMISSION_ADMISSION.stats()}")
+            return await self.send_json(
+                writer, request, 503, {"error": admission.BUSY_MESSAGE},
+                extra_headers={"Retry-After": str(admission.RETRY_AFTER_SECONDS)}, keep_alive=False,
+            )
+        handed_off = False
+        try:
+            if "multipart/form-data" in request.headers.get("Content-Type", ""):
+                keep_alive, handed_off = await self.handle_multipart_submission(request, writer)
+                return keep_alive
+            return await self.handle_json_submission(request, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            raise
+        except Exception as e:
+            logutil.exception("SUBMISSION", f"Unhandled exception: {type(e).__name__}: {e}")
+            return await self.send_json(writer, request, 500, {"error": f"Server error: {str(e)}"}, keep_alive=False)
+        finally:
+            if not handed_off:
+                portal.SUBMISSION_ADMISSION.release()
+
+    async def read_multipart(self, request):
+        """Stream the body into a MultipartParser; returns (fields, files)."""
+        remaining = int(request.headers.get("Content-Length", 0))
+        parser = multipart.MultipartParser(
+            request.headers["Content-Type"], upload_dir="uploads", max_file_size=portal.MAX_PDF_SIZE,
+            content_length=remaining,
+        )
+        try:
+            while remaining > 0:
+                chunk = await asyncio.wait_for(request.reader.read(min(CHUNK_SIZE, remaining)), BODY_TIMEOUT)
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                parser.feed(chunk)
+        except BaseException:
+            parser.abort()
+            raise
+        return parser.close()
+
+    async def handle_multipart_submission(self, request, writer):
+        """Returns (keep_alive, handed_off); handed_off means a job now owns the admission slot."""
+        try:
+            with metrics.span("multipart"):
+                fields, files = await self.read_multipart(request)
+        except multipart.MultipartError as e:
+            # The rest of the body was not consumed; don't reuse the connection.
+            return await self.send_json(writer, request, e.status, {"error": str(e)}, keep_alive=False), False
+
+        submission, error = portal.prepare_submission(fields, files)
+        if error:
+            return await self.send_json(writer, request, 400, {"error": error}), False
+
+        if portal.wants_job_mode(request.target, request.headers):
+            job = portal.JOB_MANAGER.create()
+            task = asyncio.get_running_loop().create_task(self.run_job(job, submission))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            status_url = f"/api/submissions/{job.job_id}"
+            logutil.info("JOB", f"Queued {job.job_id} for: {submission['title']}")
+            return await self.send_json(writer, request, 202, {
+                "success": True,
+                "job_id": job.job_id,
+                "status": job.status,
+                "status_url": status_url,
+            }, extra_headers={"Location": status_url}), True
+
+        code, response_data = await flows.run_async(portal.process_submission_flow(submission))
+        return await self.send_json(writer, request, code, response_data), False
+
+    async def run_job(self, job, submission):
+        try:
+            await portal.JOB_MANAGER.run_async(
+                job, flows.run_async(portal.process_submission_flow(submission, job))
+            )
+        finally:
+            portal.SUBMISSION_ADMISSION.release()
+
+    async def handle_json_submission(self, request, writer):
+        content_length = int(request.headers.get("Content-Length", 0))
+        if content_length > MAX_JSON_BODY:
+            return await self.send_json(writer, request, 413, {"error": "Request too large"}, keep_alive=False)
+        post_data = await asyncio.wait_for(request.reader.readexactly(content_length), BODY_TIMEOUT)
+
+        logutil.debug("SUBMISSION", f"Received JSON submission, content length: {content_length}")
+
+        try:
+            data = json.loads(post_data.decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logutil.warning("SUBMISSION", f"JSON decode error: {e}")
+            return await self.send_json(writer, request, 400, {"error": "Invalid JSON in request"})
+
+        title = data.get("title", "")
+        body = data.get("body", "")
+
+        logutil.debug("SUBMISSION", f"Parsed request - Title: {title[:50]}...")
+
+        result = await flows.run_async(portal.create_github_issue_flow(title, body))
+
+        if result.get("success"):
+            return await self.send_json(writer, request, 200, {
+                "success": True,
+                "html_url": result.get("html_url"),
+                "number": result.get("number"),
+            })
+        return await self.send_json(writer, request, result.get("code", 500), {"error": result.get("error")})
+
+
+async def serve(host, port, directory="."):
+    """Run the asyncio server until SIGTERM/SIGINT."""
+    app = AsyncPortalServer(directory)
+    srv = await asyncio.start_server(app.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def handle_shutdown(signum):
+        logutil.info("SHUTDOWN", f"Received signal {signum}, shutting down...")
+        stop.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, handle_shutdown, signum)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        loop.add_signal_handler(signal.SIGHUP, lambda: logutil.info("SHUTDOWN", "Received SIGHUP, ignoring..."))
+    except (NotImplementedError, RuntimeError, AttributeError):
+        pass
+
+    logutil.info("STARTUP", f"Server running on port {port} (asyncio)")
+    async with srv:
+        await stop.wait()
+    httppool.ASYNC_HTTP_POOL.close()
+
+
+def main(port=None):
+    if port is None:
+        is_production = os.environ.get("REPLIT_DEPLOYMENT") is not None
+        port = 80 if is_production else 5000
+    logutil.info("STARTUP", f"Starting asyncio server on port {port}...")
+    staticassets.STATIC_ASSETS.preload()
+    try:
+        asyncio.run(serve("0.0.0.0", port))
+    finally:
+        logutil.info("SHUTDOWN", "Server stopped")
+        emailutil.EMAIL_QUEUE.shutdown(timeout=10)
+        logutil.WRITER.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+"""The nine-criterion compliance prompt, and parallel per-criterion evaluation.
+
+The prompt pieces here (system text, criterion wording, response rules,
+metadata header, vision note) are shared by the single-request check in
+server.py and by the parallel mode below.
+
+With TSM2_GROK_EVAL=parallel the scorecard is not produced by one Grok
+call. The criteria are split into small groups (TSM2_GROK_EVAL_GROUPS), and
+each group is sent as its own request, all at once (flows.Gather):
+
+- each request carries only the PDF sections relevant to its criteria
+  (sectionindex, within TSM2_GROK_GROUP_TOKEN_BUDGET), and page images only
+  if the group has a criterion that figures and equations bear on;
+- every returned criterion is validated on its own. A malformed reply or
+  a failed request only loses the criteria it was for, and only those are
+  sent again, for up to TSM2_GROK_EVAL_ROUNDS rounds in total;
+- the answers are merged into the usual criteria / overall_status /
+  minimum_corrections result. Criteria that never got a valid answer are
+  marked UNAVAILABLE for the examiner instead of discarding the rest.
+
+Complete group answers are cached per PDF and prompt, like the
+single-request result.
+"""
+
+import os
+import json
+import time
+import random
+import re
+import hashlib
+import threading
+
+import flows
+import grokapi
+import httppool
+import logutil
+import pdfengine
+import resultcache
+import sectionindex
+
+
+def parse_groups(spec):
+    """'1,2,7;4,5,6' -> [[1, 2, 7], [4, 5, 6]]; criteria left out get a group of their own."""
+    groups = []
+    seen = set()
+    for part in spec.split(";"):
+        group = [int(x) for x in part.split(",") if x.strip().isdigit()]
+        group = [cid for cid in group if cid in sectionindex.CRITERION_NAMES and cid not in seen]
+        if group:
+            groups.append(group)
+            seen.update(group)
+    groups.extend([cid] for cid in sectionindex.CRITERION_NAMES if cid not in seen)
+    return groups
+
+
+EVAL_MODE = os.environ.get("TSM2_GROK_EVAL", "single")
+GROUPS = parse_groups(os.environ.get("TSM2_GROK_EVAL_GROUPS", "1,2,7;4,5,6;3,8,9"))
+MAX_ROUNDS = int(os.environ.get("TSM2_GROK_EVAL_ROUNDS", "3"))
+GROUP_TOKEN_BUDGET = int(os.environ.get("TSM2_GROK_GROUP_TOKEN_BUDGET", "4000"))
+GROUP_MAX_TOKENS = 2000
+TEMPERATURE = 0.3
+RETRY_BACKOFF = 1.0
+
+ALL_CRITERIA = list(sectionindex.CRITERION_NAMES)
+# Mechanism diagrams, prediction plots and equations: the groups holding
+# these criteria get the page images.
+VISUAL_CRITERIA = (3, 8, 9)
+STATUSES = ("PASS", "NON_COMPLIANT")
+
+EXTRACTION_FAILED_TEXT = "[PDF text could not be extracted. Assess based on the metadata fields above only. Note in your summary that the assessment is limited to form fields due to PDF extraction failure.]"
+
+SYSTEM_TEXT = "You are a structural compliance screener for the TSM2 Institute for Cosmology. Your task is to assess scientific submissions against 9 structural criteria covering claim clarity, mechanism, falsifiability, methodology, predictive capability, and reproducibility. You assess structure and methodological discipline, not scientific truth, and not agreement with any particular theoretical framework. A submission can be excellent structurally while contradicting TSM2, or be aligned with TSM2 while failing structurally. Judge structure only. Respond only with valid JSON in the schema specified."
+
+# The criteria as worded in the single-request prompt, by id.
+CRITERION_RULES = {
+    1: """1. CLEAR CORE CLAIM — Is there an identifiable, consistent central proposition? The claim should be stated clearly enough that a reader can identify what the manuscript is asserting. It does not need to be reducible to a single sentence — coherent restatements across the document are acceptable. PASS if a clear central claim is identifiable. NON_COMPLIANT if the claim is incoherent, contradictory across sections, or cannot be extracted.""",
+    2: """2. DEFINED TERMS — Are the key technical terms operationally defined and consistently applied? Definitions can be in a glossary, a definitions section, or inline at first use. PASS if the primary technical vocabulary is defined and used consistently. NON_COMPLIANT if core terms are undefined, used inconsistently, or rely on metaphor without operational grounding.""",
+    3: """3. MECHANISM — Is there a coherent mechanism pathway that explains how the claim leads to its consequences? The mechanism can be conceptual rather than formally axiomatized — what matters is that a generative sequence exists (e.g., "polarity → distinction → relation → order → number → operations"). PASS if a coherent mechanism pathway is present, even if conceptual. NON_COMPLIANT if no mechanism is offered, or if the paper explicitly disclaims any generative/causal pathway.""",
+    4: """4. TEST PATH — Does the manuscript provide at least one explicit testable procedure? Tests can be experimental, computational, mathematical, or observational. Each test must include: (a) a prediction or expected outcome, (b) a procedure for evaluating it, and (c) a condition under which the test would fail. PASS if at least one testable procedure meeting all three elements is present. NON_COMPLIANT if "tests" consist only of compatibility observations, interpretive mappings, or post-hoc pattern matching without a defined failure condition.""",
+    5: """5. FALSIFIABILITY — Does the manuscript contain explicit falsifiers — conditions under which the claim or framework would be rejected? Falsifiers should be identifiable failure conditions (e.g., "discovery of a fundamental equation lacking frequency-mode representation"). They do not need to be expressed as binary numerical thresholds. PASS if at least one identifiable falsifier is stated. NON_COMPLIANT if the framework can absorb any contradictory observation through reinterpretation, or no failure conditions are articulated.""",
+    6: """6. DEPENDENCY TRANSPARENCY — Does the author explicitly acknowledge assumptions, conceptual scope, limitations, and what the framework does not claim? PASS if a dedicated limitations/scope/assumptions section is present, or if these acknowledgments are clearly distributed and identifiable. NON_COMPLIANT if assumptions are hidden, unstated, or the manuscript overreaches its own scope.""",
+    7: """7. NON-ARBITRARY SELECTION — Is the selection of primitives, categories, or analytical units justified? The manuscript should explain why these specific elements were chosen and why alternatives were rejected or considered. PASS if a justification section or argument is present (e.g., a "Why these primitives?" section comparing alternatives). NON_COMPLIANT if selection is post-hoc or unjustified.""",
+    8: """8. PREDICTIVE CAPABILITY — Does the manuscript produce at least one measurable prediction, scaling relation, or numerical consequence derived from the framework? Predictions can be quantitative scaling relations, numerical values, observational signatures, or model-specific expected outcomes. PASS if at least one explicit prediction is derivable from the framework. NON_COMPLIANT if the manuscript only re-describes or re-interprets existing data without generating new predictions.""",
+    9: """9. REPRODUCIBILITY — Could an independent reviewer reproduce the analysis using the methodology, sources, and procedures described? PASS if the logical framework, cited equations, and procedures are independently traceable. NON_COMPLIANT if the methodology cannot be replicated from the manuscript alone.""",
+}
+
+RESPONSE_RULES = """For each criterion, return:
+- status: either "PASS" or "NON_COMPLIANT" (binary only — no conditional states)
+- reason: one short paragraph (1-3 sentences) describing what is present or absent in the PDF that supports this verdict. Cite specific sections, figures, or terms where possible.
+- required_correction: ONLY populated when status is NON_COMPLIANT. This must be a PRESCRIPTIVE INSTRUCTION telling the submitter what to add, not a diagnostic description of the gap. Use Geoff's voice:
+  - Start with a concrete action: "Add a dedicated section titled X" or "Provide at least one Y" or "Justify the selection of Z by..."
+  - Include 2-4 bulleted examples of what the corrected content might look like
+  - End with a clear quality bar: "These must include a prediction, procedure, and failure condition" or similar
+  - Set required_correction to null when status is PASS
+
+CRITICAL: The required_correction is the submitter's repair instruction. They should be able to action it directly. Do NOT write generic feedback like "consider improving X" — write specific instructions like "Add a section titled 'Potential Falsifiers' listing at least three failure conditions. Examples may include: (a) discovery of foundational equations irreducible to oscillatory representation, (b) proof that polarity cannot generate required mathematical structures, (c) observational signatures incompatible with the framework. Each falsifier must be an identifiable failure condition the framework could not absorb.\""""
+
+
+# The form fields every prompt shows Grok, with their labels.
+PROMPT_FORM_FIELDS = (
+    ("submission_title", "Title"),
+    ("core_claim", "Submitter's stated core claim"),
+    ("primary_scale", "Submitter's stated primary scale"),
+)
+
+
+def screening_header(form_data, scope):
+    """Opening instructions and the submitter's metadata; scope names the criteria assessed."""
+    metadata = "\n".join(f"- {label}: {form_data.get(key, 'Not provided')}" for key, label in PROMPT_FORM_FIELDS)
+    return f"""You are screening a submission to the TSM2 Institute for Cosmology against {scope}. Evaluate structure, methodology, and epistemic discipline only — do NOT judge scientific merit, correctness, or alignment with any framework.
+
+SUBMISSION METADATA (provided for orientation only — assess from PDF text below, not from these fields):
+CRITICAL INSTRUCTION: The metadata fields above are the submitter's SELF-DESCRIPTION of their work. They may be more polished than what the PDF actually contains. Always assess from the PDF text. If the PDF does not contain what the form field claims, score based on what is in the PDF, not what the form field says.
+{metadata}"""
+
+
+def criteria_rules(criteria_ids):
+    return "\n\n".join(CRITERION_RULES[cid] for cid in criteria_ids)
+
+
+def schema_lines(criteria_ids):
+    return ",\n".join(
+        '{"id": %d, "name": "%s", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}'
+        % (cid, sectionindex.CRITERION_NAMES[cid])
+        for cid in criteria_ids
+    )
+
+
+def pdf_context(pdf_text, pdf_extraction_failed, token_budget=None, criteria_ids=None):
+    """(label, text, coverage sentence, compaction report or None) for the PDF text block."""
+    if pdf_extraction_failed or not pdf_text:
+        return "PDF TEXT:", EXTRACTION_FAILED_TEXT, "The text extraction covers the full document.", None
+    text, report = sectionindex.compact_pdf_text(pdf_text, token_budget, criteria_ids)
+    sectionindex.PROMPT_STATS.record(report)
+    if not report["compacted"]:
+        return "PDF TEXT:", text, "The text extraction covers the full document.", report
+    logutil.info("PROMPT", f"PDF text {report['original_tokens']} -> {report['prompt_tokens']} tokens (saved {report['tokens_saved']}), kept {report['sections_kept']}/{report['sections']} sections")
+    label = "PDF TEXT (condensed to the sections most relevant to the criteria, in document order; omitted sections are listed by heading):"
+    return label, text, "The text excerpts are drawn from the full document.", report
+
+
+def vision_note(render_result, text_coverage):
+    """Note placed before the prompt when only some pages are sent as images, else None."""
+    total = render_result.get("total_pages", 0)
+    selection = render_result.get("selection")
+    if selection:
+        sent = [str(p["page"]) for p in selection["pages"] if p["sent"]]
+        return (
+            f"NOTE: This PDF has {total} pages. "
+            f"Only pages {', '.join(sent)} contain figures, diagrams or equations "
+            f"and have been rendered as images for visual analysis, in that order. "
+            f"{text_coverage}"
+        )
+    if render_result.get("truncated", False):
+        return (
+            f"NOTE: This PDF has {total} pages. "
+            f"Only the first {render_result.get('rendered_pages', 0)} pages have been "
+            f"rendered as images for visual analysis. {text_coverage}"
+        )
+    return None
+
+
+def images_digest(deferred, images):
+    """Cache key part identifying the page images of a request."""
+    digest = hashlib.sha256()
+    if deferred:
+        # Rendering is deterministic, so the plan identifies the images.
+        digest.update(json.dumps(deferred, sort_keys=True).encode("utf-8"))
+    for image in images:
+        digest.update(image["image_url"]["url"].encode("ascii"))
+    return digest.hexdigest()
+
+
+def reply_content(result):
+    """The message text of a chat completion, without a ```json fence."""
+    content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    if content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return content.strip()
+
+
+def normalize_criterion(item, criteria_ids):
+    """A well-formed criterion answer for one of criteria_ids, or None."""
+    if not isinstance(item, dict):
+        return None
+    try:
+        cid = int(item.get("id"))
+    except (TypeError, ValueError):
+        return None
+    status = item.get("status")
+    reason = item.get("reason")
+    correction = item.get("required_correction")
+    if cid not in criteria_ids or status not in STATUSES or not isinstance(reason, str) or not reason.strip():
+        return None
+    if isinstance(correction, list) and all(isinstance(line, str) for line in correction):
+        correction = "\n".join(correction)
+    if status == "PASS":
+        correction = None
+    elif not isinstance(correction, str) or not correction.strip():
+        return None
+    return {
+        "id": cid,
+        "name": sectionindex.CRITERION_NAMES[cid],
+        "status": status,
+        "reason": reason.strip(),
+        "required_correction": correction,
+    }
+
+
+def parse_group_reply(content, criteria_ids):
+    """{criterion id: criterion} for the valid answers in a group reply."""
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return {}
+    items = data.get("criteria") if isinstance(data, dict) else None
+    answered = {}
+    for item in items if isinstance(items, list) else []:
+        criterion = normalize_criterion(item, criteria_ids)
+        if criterion and criterion["id"] not in answered:
+            answered[criterion["id"]] = criterion
+    return answered
+
+
+CRITERIA_ARRAY = re.compile(r'"criteria"\s*:\s*\[')
+
+
+class CriteriaScanner:
+    """Picks criterion objects out of a reply while it is still streaming.
+
+    feed() takes the reply text in pieces. Each object in the "criteria"
+    array is decoded as soon as its closing brace arrives; valid ones
+    (normalize_criterion) go to on_criterion, once per criterion id.
+    """
+
+    def __init__(self, criteria_ids, on_criterion):
+        self.criteria_ids = criteria_ids
+        self.on_criterion = on_criterion
+        self.seen = set()
+        self._text = ""
+        self._pos = None
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escaped = False
+        self._finished = False
+
+    def feed(self, text):
+        if self._finished:
+            return
+        self._text += text
+        if self._pos is None:
+            match = CRITERIA_ARRAY.search(self._text)
+            if not match:
+                return
+            self._pos = match.end()
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            c = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif c == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(text[self._start:i + 1])
+            elif c == "]" and self._depth == 0:
+                self._finished = True
+                break
+            i += 1
+        self._pos = i
+
+    def _emit(self, raw):
+        try:
+            criterion = normalize_criterion(json.loads(raw), self.criteria_ids)
+        except ValueError:
+            return
+        if criterion and criterion["id"] not in self.seen:
+            self.seen.add(criterion["id"])
+            self.on_criterion(criterion)
+
+
+def group_prompt(form_data, criteria_ids, pdf_text, pdf_extraction_failed):
+    """(user prompt, text coverage sentence) for one group of criteria."""
+    label, text, coverage, _ = pdf_context(pdf_text, pdf_extraction_failed, GROUP_TOKEN_BUDGET, criteria_ids)
+    count = len(criteria_ids)
+    prompt = f"""{screening_header(form_data, f"{count} of its 9 structural criteria")}
+
+{label}
+---
+{text}
+---
+
+EVALUATE AGAINST THESE {count} CRITERIA ONLY, using BINARY status only: PASS or NON_COMPLIANT. The other criteria are assessed separately.
+
+{criteria_rules(criteria_ids)}
+
+{RESPONSE_RULES}
+
+Respond in this exact JSON format only — no markdown, no preamble, no trailing text:
+
+{{
+  "criteria": [
+{schema_lines(criteria_ids)}
+  ]
+}}"""
+    return prompt, coverage
+
+
+def evaluate_group_flow(api_key, form_data, criteria_ids, pdf_text, pdf_extraction_failed, render_result, pdf_sha256=None, pdf_path=None,
+                        on_criterion=None):
+    """Flow: one Grok request for a group of criteria.
+
+    on_criterion, if given, receives each valid criterion as soon as it
+    has streamed in.
+
+    Returns:
+        {criterion id: criterion} for the criteria answered validly; the
+        others are simply missing. Raises httppool.HTTPError on API errors.
+    """
+    user_text, coverage = group_prompt(form_data, criteria_ids, pdf_text, pdf_extraction_failed)
+    images = render_result.get("images", [])
+    deferred = render_result.get("deferred") if pdf_path else None
+    with_images = pdfengine.has_page_images(dict(render_result, deferred=deferred)) and any(
+        cid in VISUAL_CRITERIA for cid in criteria_ids
+    )
+    if with_images:
+        note = vision_note(render_result, coverage)
+        if note:
+            user_text = note + "\n\n" + user_text
+    model_name = "grok-4" if with_images else "grok-3-mini"
+
+    cache_key = None
+    if pdf_sha256:
+        cache_key = (
+            pdf_sha256,
+            model_name,
+            SYSTEM_TEXT,
+            user_text,
+            images_digest(deferred, images) if with_images else "",
+            TEMPERATURE,
+            GROUP_MAX_TOKENS,
+        )
+        cached = resultcache.RESULT_CACHE.get("compliance_group", *cache_key)
+        if cached is not None:
+            logutil.info("CACHE", f"Compliance result hit for criteria {criteria_ids} of {pdf_sha256[:12]}")
+            for criterion in cached if on_criterion else []:
+                on_criterion(criterion)
+            return {c["id"]: c for c in cached}
+
+    request_images = None
+    streamed_settings = []
+    if with_images:
+        request_images = pdfengine.iter_page_images(pdf_path, render_result, streamed_settings) if deferred else images
+
+    scanner = CriteriaScanner(criteria_ids, on_criterion) if on_criterion else None
+    start_time = time.time()
+    try:
+        result = yield from grokapi.chat_completion_flow(
+            api_key, model_name, SYSTEM_TEXT, user_text, request_images,
+            temperature=TEMPERATURE, max_tokens=GROUP_MAX_TOKENS, timeout=300,
+            on_text=scanner.feed if scanner else None,
+        )
+    finally:
+        if with_images and deferred:
+            pdfengine.record_streamed_pages(render_result, streamed_settings)
+    answered = parse_group_reply(reply_content(result), criteria_ids)
+    logutil.info("GROK", f"Criteria {criteria_ids}: model {model_name}, {time.time() - start_time:.1f}s, valid answers for {sorted(answered)}")
+    if cache_key and len(answered) == len(criteria_ids):
+        resultcache.RESULT_CACHE.put("compliance_group", [answered[cid] for cid in criteria_ids], *cache_key)
+    return answered
+
+
+def merge(answered):
+    """The compliance result for the answered criteria (id -> criterion)."""
+    criteria = []
+    for cid in ALL_CRITERIA:
+        criteria.append(answered.get(cid) or {
+            "id": cid,
+            "name": sectionindex.CRITERION_NAMES[cid],
+            "status": "UNAVAILABLE",
+            "reason": "This criterion could not be assessed automatically; the examiner will assess it.",
+            "required_correction": None,
+        })
+    failed = [c for c in criteria if c["status"] == "NON_COMPLIANT"]
+    missing = [c for c in criteria if c["status"] == "UNAVAILABLE"]
+
+    if failed:
+        overall_status = "NON_COMPLIANT"
+        summary = f"{len(failed)} of 9 structural criteria are not met: {', '.join(c['name'] for c in failed)}. See the minimum corrections list."
+    elif missing:
+        overall_status = "UNAVAILABLE"
+        summary = f"{9 - len(missing)} of 9 structural criteria were assessed and met."
+    else:
+        overall_status = "COMPLIANT"
+        summary = "All 9 structural criteria are met."
+    if missing:
+        summary += f" Not assessed automatically: {', '.join(c['name'] for c in missing)}; manual review required."
+
+    return {
+        "compliant": overall_status == "COMPLIANT",
+        "message": summary,
+        "overall_status": overall_status,
+        "criteria": criteria,
+        "minimum_corrections": [c["required_correction"] for c in failed],
+    }
+
+
+def evaluate_flow(api_key, form_data, pdf_text=None, pdf_extraction_failed=False, render_result=None, pdf_sha256=None, pdf_path=None,
+                  on_criterion=None, reuse=None):
+    """Flow: the compliance check as concurrent per-group requests with partial retry.
+
+    Returns the same result shape as server.check_compliance_with_grok_flow,
+    plus an "evaluation" report (requests made, criteria retried, reused or
+    left unavailable). on_criterion receives each criterion verdict as it
+    streams in, from whichever group it belongs to.
+
+    reuse maps criterion id -> an earlier verdict to keep (a revised
+    resubmission, see revisions.py). Those criteria are left out of the
+    groups, so only the rest are sent to Grok.
+    """
+    render_result = render_result or {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": "no render"}
+    started = time.time()
+    answered = dict(reuse or {})
+    if on_criterion:
+        for cid in sorted(answered):
+            on_criterion(answered[cid])
+    pending = [[cid for cid in group if cid not in answered] for group in GROUPS]
+    pending = [group for group in pending if group]
+    retried = set()
+    requests = 0
+    rounds = 0
+    while pending and rounds < MAX_ROUNDS:
+        rounds += 1
+        if rounds > 1:
+            retried.update(cid for group in pending for cid in group)
+            logutil.info("GROK", f"Retrying criteria {pending} (round {rounds})")
+            yield flows.Sleep(RETRY_BACKOFF * 2 ** (rounds - 2) * random.uniform(0.5, 1.5))
+        outcomes = yield flows.Gather(
+            evaluate_group_flow(
+                api_key, form_data, group, pdf_text, pdf_extraction_failed, render_result, pdf_sha256, pdf_path, on_criterion,
+            )
+            for group in pending
+        )
+        requests += len(pending)
+        failed = []
+        for group, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                detail = f"HTTP {outcome.code}: {outcome.text(300)}" if isinstance(outcome, httppool.HTTPError) else f"{type(outcome).__name__}: {outcome}"
+                logutil.error("GROK", f"Criteria {group}: {detail}")
+                outcome = {}
+            answered.update(outcome)
+            missing = [cid for cid in group if cid not in outcome]
+            if missing:
+                failed.append(missing)
+        pending = failed
+
+    unavailable = [cid for group in pending for cid in group]
+    EVAL_STATS.record(requests, len(retried), len(unavailable))
+    evaluation = {
+        "mode": "parallel",
+        "requests": requests,
+        "rounds": rounds,
+        "retried": sorted(retried),
+        "reused": sorted(reuse or {}),
+        "unavailable": unavailable,
+        "seconds": round(time.time() - started, 1),
+    }
+    logutil.info("GROK", f"Parallel evaluation: {evaluation}")
+    if not answered:
+        return {
+            "compliant": False,
+            "message": "AI pre-check could not assess any criterion. Manual review required.",
+            "overall_status": "UNAVAILABLE",
+            "criteria": [],
+            "minimum_corrections": [],
+            "error": True,
+            "evaluation": evaluation,
+        }
+    result = merge(answered)
+    result["evaluation"] = evaluation
+    return result
+
+
+class EvalStats:
+    """Running totals of parallel evaluations for /api/status."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.requests = 0
+        self.retried_criteria = 0
+        self.unavailable_criteria = 0
+
+    def record(self, requests, retried, unavailable):
+        with self._lock:
+            self.evaluations += 1
+            self.requests += requests
+            self.retried_criteria += retried
+            self.unavailable_criteria += unavailable
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": EVAL_MODE,
+                "groups": GROUPS,
+                "evaluations": self.evaluations,
+                "requests": self.requests,
+                "retried_criteria": self.retried_criteria,
+                "unavailable_criteria": self.unavailable_criteria,
+            }
+
+
+EVAL_STATS = EvalStats()
@@ -2,25 +2,76 @@
 
 Sends email via the Institute's hosted mail server (smtp.hostedemail.com)
 using TLS on port 587. Credentials come from the TSM2_INFO_EMAIL secret.
+TSM2_SMTP_HOST, TSM2_SMTP_PORT and TSM2_SMTP_STARTTLS=0 point it at a
+local sink instead (see loadbench.py).
 
 Email sending must never block or fail a submission — callers should use
 send_email_async for fire-and-forget delivery after the GitHub issue
-has been created.
+has been created. Queued messages are delivered by a small pool of worker
+threads (EmailQueue), each of which keeps its authenticated SMTP session
+open between messages and reconnects and retries with backoff on failure.
 """
 
 import os
-import sys
+import time
+import queue
 import smtplib
 import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+import logutil
+import metrics
 
-SMTP_HOST = "smtp.hostedemail.com"
-SMTP_PORT = 587
+
+SMTP_HOST = os.environ.get("TSM2_SMTP_HOST", "smtp.hostedemail.com")
+SMTP_PORT = int(os.environ.get("TSM2_SMTP_PORT", "587"))
+# Only a local test sink (loadbench.py) runs without STARTTLS.
+SMTP_STARTTLS = os.environ.get("TSM2_SMTP_STARTTLS", "1") != "0"
 SMTP_USER = "info@tsm2.org"
 FROM_HEADER = "TSM2 Institute <info@tsm2.org>"
 
+EMAIL_WORKERS = int(os.environ.get("TSM2_EMAIL_WORKERS", "2"))
+EMAIL_QUEUE_SIZE = int(os.environ.get("TSM2_EMAIL_QUEUE_SIZE", "200"))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("TSM2_EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BACKOFF = float(os.environ.get("TSM2_EMAIL_RETRY_BACKOFF", "2"))
+# Close a worker's SMTP session after this long without mail; hosted
+# servers drop idle sessions anyway, and reconnecting is cheap when rare.
+SMTP_IDLE_SECONDS = float(os.environ.get("TSM2_SMTP_IDLE_SECONDS", "60"))
+
+# Failures that retrying will not fix.
+PERMANENT_SMTP_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+)
+
+
+def build_message(to_address, subject, body_text, body_html=None):
+    """MIME message with a plain text part and an optional HTML part."""
+    msg = MIMEMultipart("alternative")
+    msg["From"] = FROM_HEADER
+    msg["To"] = to_address
+    msg["Subject"] = subject
+
+    msg.attach(MIMEText(body_text, "plain", "utf-8"))
+    if body_html:
+        msg.attach(MIMEText(body_html, "html", "utf-8"))
+    return msg
+
+
+def open_smtp_session(smtp_pass):
+    """Connected, TLS-upgraded and authenticated SMTP session."""
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+    try:
+        if SMTP_STARTTLS:
+            server.starttls()
+        server.login(SMTP_USER, smtp_pass)
+    except Exception:
+        server.close()
+        raise
+    return server
+
 
 def send_email(to_address, subject, body_text, body_html=None):
     """Send an email via the Institute's SMTP server.
@@ -37,42 +88,224 @@ def send_email(to_address, subject, body_text, body_html=None):
     smtp_pass = os.environ.get("TSM2_INFO_EMAIL", "")
 
     if not smtp_pass:
-        print("[EMAIL ERROR] TSM2_INFO_EMAIL secret not configured", file=sys.stderr)
+        logutil.error("EMAIL", "TSM2_INFO_EMAIL secret not configured")
         return False
 
     if not to_address:
-        print("[EMAIL ERROR] No recipient address provided", file=sys.stderr)
+        logutil.error("EMAIL", "No recipient address provided")
         return False
 
     try:
-        msg = MIMEMultipart("alternative")
-        msg["From"] = FROM_HEADER
-        msg["To"] = to_address
-        msg["Subject"] = subject
+        msg = build_message(to_address, subject, body_text, body_html)
 
-        msg.attach(MIMEText(body_text, "plain", "utf-8"))
-        if body_html:
-            msg.attach(MIMEText(body_html, "html", "utf-8"))
-
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as server:
-            server.starttls()
-            server.login(SMTP_USER, smtp_pass)
+        with open_smtp_session(smtp_pass) as server:
             server.send_message(msg)
 
-        print(f"[EMAIL] Sent to {to_address}: {subject}", file=sys.stderr)
+        logutil.info("EMAIL", f"Sent to {to_address}: {subject}")
         return True
 
     except Exception as e:
-        print(f"[EMAIL ERROR] Failed to send to {to_address}: {e}", file=sys.stderr)
+        logutil.error("EMAIL", f"Failed to send to {to_address}: {e}")
         return False
 
 
+class EmailQueue:
+    """Bounded delivery queue served by worker threads with persistent SMTP sessions.
+
+    Workers start on the first enqueue. Each worker owns one SMTP session
+    (smtplib connections are not thread-safe) and reuses it for every
+    message it sends, closing it after SMTP_IDLE_SECONDS without mail.
+    A failed send reconnects; if the failure was on a reused session, the
+    message is retried straight away on the new one, otherwise after an
+    exponential backoff, up to max_attempts in total.
+    """
+
+    def __init__(self, workers=EMAIL_WORKERS, max_queue=EMAIL_QUEUE_SIZE,
+                 max_attempts=EMAIL_MAX_ATTEMPTS, backoff=EMAIL_RETRY_BACKOFF,
+                 idle_seconds=SMTP_IDLE_SECONDS, connect=open_smtp_session):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_seconds = idle_seconds
+        self._connect = connect
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._counts = {
+            "enqueued": 0, "sent": 0, "failed": 0, "dropped": 0,
+            "retries": 0, "logins": 0, "reused_sessions": 0,
+        }
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads or self._stopping:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"email-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, to_address, subject, body_text, body_html=None):
+        """Queue one message. Returns False if it could not be queued."""
+        if not to_address:
+            logutil.error("EMAIL", "No recipient address provided")
+            return False
+        self._ensure_workers()
+        item = (to_address, subject, body_text, body_html, time.monotonic(), logutil.current())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count("dropped")
+            logutil.error("EMAIL", f"Delivery queue full; dropping mail to {to_address}: {subject}")
+            return False
+        self._count("enqueued")
+        return True
+
+    def enqueue_many(self, messages):
+        """Queue several messages.
+
+        Args:
+            messages: iterable of dicts with to_address, subject, body_text
+                and optional body_html keys
+
+        Returns:
+            Number of messages queued.
+        """
+        return sum(1 for m in messages if self.enqueue(**m))
+
+    def _worker(self):
+        server = None
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                server = _close_session(server)
+                continue
+            if item is None:
+                _close_session(server)
+                self._queue.task_done()
+                return
+            try:
+                with logutil.restore(item[5]), metrics.span("email") as span:
+                    server = self._deliver(server, item, span)
+                metrics.EMAILS.inc(outcome="sent" if span.outcome == "ok" else "failed")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, server, item, span):
+        """Send one queued message; returns the session to keep for the next one.
+
+        A message that could not be delivered marks span failed.
+        """
+        to_address, subject, body_text, body_html, queued_at, _ = item
+        msg = build_message(to_address, subject, body_text, body_html)
+        attempt = 0
+        while True:
+            attempt += 1
+            reused = server is not None
+            try:
+                if server is None:
+                    smtp_pass = os.environ.get("TSM2_INFO_EMAIL", "")
+                    if not smtp_pass:
+                        logutil.error("EMAIL", "TSM2_INFO_EMAIL secret not configured")
+                        self._count("failed")
+                        span.fail()
+                        return None
+                    server = self._connect(smtp_pass)
+                    self._count("logins")
+                else:
+                    self._count("reused_sessions")
+                server.send_message(msg)
+            except PERMANENT_SMTP_ERRORS as e:
+                logutil.error("EMAIL", f"Failed to send to {to_address}: {e}")
+                self._count("failed")
+                span.fail()
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    server = _close_session(server)
+                return server
+            except Exception as e:
+                server = _close_session(server)
+                if attempt >= self.max_attempts:
+                    logutil.error("EMAIL", f"Failed to send to {to_address} after {attempt} attempts: {e}")
+                    self._count("failed")
+                    span.fail()
+                    return None
+                self._count("retries")
+                metrics.EMAILS.inc(outcome="retry")
+                if not reused:
+                    delay = self.backoff * (2 ** (attempt - 1))
+                    logutil.warning("EMAIL", f"Send to {to_address} failed ({e}); retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                continue
+
+            latency = time.monotonic() - queued_at
+            with self._lock:
+                self._counts["sent"] += 1
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+            logutil.info("EMAIL", f"Sent to {to_address}: {subject} ({latency:.1f}s after queueing)")
+            return server
+
+    def stats(self):
+        with self._lock:
+            sent = self._counts["sent"]
+            return dict(
+                self._counts,
+                queue_depth=self._queue.qsize(),
+                workers=len(self._threads),
+                avg_latency=round(self._latency_total / sent, 3) if sent else None,
+                max_latency=round(self._latency_max, 3),
+            )
+
+    def flush(self, timeout=None):
+        """Wait until every queued message has been handled; True if it finished in time."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=10):
+        """Deliver what is queued (up to timeout seconds), then stop the workers."""
+        flushed = self.flush(timeout)
+        with self._lock:
+            self._stopping = True
+            threads = list(self._threads)
+        for _ in threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        if not flushed:
+            logutil.warning("EMAIL", f"Shutdown with {self._queue.qsize()} messages undelivered")
+        return flushed
+
+
+def _close_session(server):
+    if server is not None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    return None
+
+
+EMAIL_QUEUE = EmailQueue()
+
+
 def send_email_async(to_address, subject, body_text, body_html=None):
-    """Fire-and-forget email sending in a background thread."""
-    thread = threading.Thread(
-        target=send_email,
-        args=(to_address, subject, body_text, body_html),
-        daemon=True,
-    )
-    thread.start()
-    return thread
+    """Fire-and-forget delivery through the shared EmailQueue.
+
+    Returns True if the message was queued.
+    """
+    return EMAIL_QUEUE.enqueue(to_address, subject, body_text, body_html)
@@ -0,0 +1,199 @@
+"""Submission stages written once, run either blocking or as coroutines.
+
+A flow is a generator function that does its own logic but, instead of
+performing slow I/O, yields an effect describing it:
+
+    response = yield flows.HttpRequest("POST", url, body, headers)
+    analysis = yield flows.Blocking(pdfengine.PDF_ENGINE.analyze, pdf_path)
+
+run() executes a flow on the calling thread with the blocking pool in
+httppool, which is what the threaded servers use. run_async() executes the
+same flow on an event loop: HTTP effects become coroutines on
+httppool.ASYNC_HTTP_POOL and CPU-bound Blocking effects go to an executor.
+Exceptions raised while performing an effect are thrown back into the flow
+at the yield, so flows use ordinary try/except. Flows compose with
+`yield from`. Effects that move work to another thread carry the caller's
+context along, so log records keep their correlation id.
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+
+import httppool
+import logutil
+
+
+class HttpRequest:
+    """An HTTP request; the flow receives an httppool.Response.
+
+    body follows httppool.ConnectionPool.request. blocking_body marks a
+    body iterable whose pieces are expensive to produce (pages rendered on
+    demand), so the async driver pulls them on an executor thread. on_data
+    receives the pieces of a streamed response body as they arrive.
+    """
+
+    def __init__(self, method, url, body=None, headers=None, timeout=60,
+                 encode_chunked=False, blocking_body=False, on_data=None):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.timeout = timeout
+        self.encode_chunked = encode_chunked
+        self.blocking_body = blocking_body
+        self.on_data = on_data
+
+    def run(self):
+        return httppool.HTTP_POOL.request(
+            self.method, self.url, body=self.body, headers=self.headers,
+            timeout=self.timeout, encode_chunked=self.encode_chunked,
+            on_data=self.on_data,
+        )
+
+    async def run_async(self):
+        return await httppool.ASYNC_HTTP_POOL.request(
+            self.method, self.url, body=self.body, headers=self.headers,
+            timeout=self.timeout, encode_chunked=self.encode_chunked,
+            blocking_body=self.blocking_body, on_data=self.on_data,
+        )
+
+
+class Blocking:
+    """A CPU-bound or otherwise blocking call; the flow receives its result."""
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        return self.fn(*self.args, **self.kwargs)
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, lambda: context.run(self.fn, *self.args, **self.kwargs))
+
+
+class Sleep:
+    """Pause the flow without holding an event loop thread."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def run(self):
+        time.sleep(self.seconds)
+
+    async def run_async(self):
+        await asyncio.sleep(self.seconds)
+
+
+class Gather:
+    """Run several flows concurrently and wait for all of them.
+
+    The flow receives a list with, for each sub-flow in order, its result
+    or the exception it raised; one failure does not cancel the others.
+    Blocking mode runs each sub-flow on its own thread; async mode as tasks.
+    """
+
+    def __init__(self, flows):
+        self.flows = list(flows)
+
+    def run(self):
+        outcomes = [None] * len(self.flows)
+
+        def target(i, flow):
+            try:
+                outcomes[i] = run(flow)
+            except Exception as e:
+                outcomes[i] = e
+
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(target, i, flow), daemon=True)
+                   for i, flow in enumerate(self.flows)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    async def run_async(self):
+        return await asyncio.gather(*(run_async(flow) for flow in self.flows), return_exceptions=True)
+
+
+class Background:
+    """Start another flow without waiting for it (fire-and-forget).
+
+    Blocking mode runs it on a daemon thread; async mode as a task.
+    Failures are logged, never raised into the parent flow.
+    """
+
+    _tasks = set()
+
+    def __init__(self, flow, name="background"):
+        self.flow = flow
+        self.name = name
+
+    def _log_failure(self, e):
+        logutil.exception(self.name.upper(), f"{type(e).__name__}: {e}")
+
+    def run(self):
+        def target():
+            try:
+                run(self.flow)
+            except Exception as e:
+                self._log_failure(e)
+
+        threading.Thread(target=contextvars.copy_context().run, args=(target,), daemon=True).start()
+
+    async def run_async(self):
+        async def target():
+            try:
+                await run_async(self.flow)
+            except Exception as e:
+                self._log_failure(e)
+
+        task = asyncio.get_running_loop().create_task(target())
+        # Keep a reference so the task is not garbage-collected mid-flight.
+        Background._tasks.add(task)
+        task.add_done_callback(Background._tasks.discard)
+
+
+def run(flow):
+    """Drive a flow to completion with blocking I/O; returns its result."""
+    value = None
+    error = None
+    while True:
+        try:
+            effect = flow.throw(error) if error is not None else flow.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = effect.run()
+        except Exception as e:
+            error = e
+
+
+async def run_async(flow):
+    """Drive a flow to completion on the running event loop."""
+    value = None
+    error = None
+    while True:
+        try:
+            effect = flow.throw(error) if error is not None else flow.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = await effect.run_async()
+        except Exception as e:
+            error = e
+
+
+def request_json(method, url, payload=None, headers=None, timeout=60):
+    """Flow: JSON in, JSON out. Raises httppool.HTTPError for non-2xx."""
+    body, headers = httppool.json_body(payload, headers)
+    response = yield HttpRequest(method, url, body=body, headers=headers, timeout=timeout)
+    return httppool.json_result(response)
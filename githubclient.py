@@ -0,0 +1,192 @@
+"""One rate-limit-aware client for every GitHub API call the portal makes.
+
+Issue creation, label fallback and the Git Data upload requests all go
+through GITHUB.request_flow, which shares auth headers, error handling and
+what GitHub reports about its limits:
+
+- X-RateLimit-Limit/Remaining/Reset/Used are recorded per resource from
+  every response. Once fewer than TSM2_GITHUB_RATE_RESERVE requests remain,
+  requests wait for the reset rather than running into 403s. If the wait
+  would exceed TSM2_GITHUB_MAX_WAIT, they fail fast with RateLimited.
+- Writes (POST/PATCH/PUT/DELETE) are spaced at least
+  TSM2_GITHUB_WRITE_INTERVAL seconds apart, across threads and tasks, as
+  GitHub asks for content-creating requests. A burst of submissions
+  therefore queues up instead of tripping the secondary rate limit.
+- 403/429 rate-limit responses are retried after Retry-After, the primary
+  reset time, or a jittered backoff for secondary limits. Every request
+  then waits out that block. GETs are also retried on 5xx and network
+  errors; writes are not, since the write may have been applied.
+
+Waiting is done with flows.Sleep, so it does not hold an event loop in the
+asyncio server. stats() reports the remaining quota for /api/status.
+"""
+
+import os
+import time
+import random
+import threading
+import http.client
+
+import flows
+import httppool
+import logutil
+
+
+WRITE_INTERVAL = float(os.environ.get("TSM2_GITHUB_WRITE_INTERVAL", "1.0"))
+RATE_LIMIT_RESERVE = int(os.environ.get("TSM2_GITHUB_RATE_RESERVE", "10"))
+MAX_RATE_WAIT = float(os.environ.get("TSM2_GITHUB_MAX_WAIT", "90"))
+MAX_ATTEMPTS = int(os.environ.get("TSM2_GITHUB_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE = 1.0
+SECONDARY_BACKOFF = 60.0
+
+WRITE_METHODS = ("POST", "PATCH", "PUT", "DELETE")
+
+
+class RateLimited(Exception):
+    """The quota is exhausted for longer than we are willing to wait."""
+
+    def __init__(self, reset_at):
+        super().__init__(
+            f"GitHub API rate limit exhausted until {time.strftime('%H:%M:%S', time.localtime(reset_at))}"
+        )
+        self.reset_at = reset_at
+
+
+def _jitter(seconds):
+    return seconds * random.uniform(0.5, 1.5)
+
+
+class GitHubClient:
+    def __init__(self, write_interval=WRITE_INTERVAL, reserve=RATE_LIMIT_RESERVE,
+                 max_wait=MAX_RATE_WAIT, max_attempts=MAX_ATTEMPTS):
+        self.write_interval = write_interval
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._next_write = 0.0
+        self._blocked_until = 0.0
+        self.limits = {}
+        self.counts = {"requests": 0, "retries": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    def token(self):
+        return os.environ.get("Submissions_PAT_21May", "")
+
+    def _reserve_slot(self, method):
+        """Seconds to wait before sending; claims the next write slot."""
+        now = time.time()
+        with self._lock:
+            delay = max(0.0, self._blocked_until - now)
+            core = self.limits.get("core")
+            if core and core["remaining"] <= self.reserve and core["reset"] > now:
+                wait = core["reset"] - now + 1
+                if wait > self.max_wait:
+                    raise RateLimited(core["reset"])
+                delay = max(delay, wait)
+            if method in WRITE_METHODS:
+                slot = max(now + delay, self._next_write)
+                self._next_write = slot + self.write_interval
+                delay = slot - now
+            self.counts["requests"] += 1
+            self.counts["waited_seconds"] += delay
+        return delay
+
+    def _record(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        try:
+            limit = {
+                "limit": int(headers.get("X-RateLimit-Limit", 0)),
+                "remaining": int(remaining),
+                "used": int(headers.get("X-RateLimit-Used", 0)),
+                "reset": int(headers.get("X-RateLimit-Reset", 0)),
+            }
+        except ValueError:
+            return
+        with self._lock:
+            self.limits[headers.get("X-RateLimit-Resource", "core")] = limit
+
+    def _block(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + seconds)
+            self.counts["rate_limited"] += 1
+
+    def _retry_delay(self, method, response, attempt):
+        """Seconds before retrying this response, or None to give up."""
+        if response.status in (403, 429):
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = int(retry_after) + random.uniform(0, 1)
+            elif response.headers.get("X-RateLimit-Remaining") == "0":
+                reset = int(response.headers.get("X-RateLimit-Reset", 0))
+                delay = max(0, reset - time.time()) + random.uniform(1, 2)
+            elif b"rate limit" in response.body.lower():
+                delay = _jitter(SECONDARY_BACKOFF * 2 ** (attempt - 1))
+            else:
+                return None
+            if delay > self.max_wait:
+                return None
+            self._block(delay)
+            return delay
+        if response.status >= 500 and method not in WRITE_METHODS:
+            return _jitter(BACKOFF_BASE * 2 ** (attempt - 1))
+        return None
+
+    def request_flow(self, method, path, payload=None, body=None, headers=None,
+                     timeout=30, token=None, blocking_body=False):
+        """Flow: one API call with pacing and retries; returns the decoded JSON.
+
+        path is relative to the API root ("/repos/..."). Send either a JSON
+        payload or a raw body (bytes or a callable producing pieces; see
+        httppool). Raises httppool.HTTPError for a final non-2xx response
+        and RateLimited when the quota will not reset in time.
+        """
+        request_headers = httppool.github_headers(token or self.token())
+        request_headers.update(headers or {})
+        if payload is not None:
+            body, request_headers = httppool.json_body(payload, request_headers)
+        url = f"{httppool.GITHUB_API_URL}{path}"
+
+        for attempt in range(1, self.max_attempts + 1):
+            delay = self._reserve_slot(method)
+            if delay > 0:
+                yield flows.Sleep(delay)
+            try:
+                response = yield flows.HttpRequest(
+                    method, url, body=body, headers=request_headers, timeout=timeout,
+                    blocking_body=blocking_body,
+                )
+            except (OSError, http.client.HTTPException) as e:
+                if method in WRITE_METHODS or attempt == self.max_attempts:
+                    raise
+                retry = _jitter(BACKOFF_BASE * 2 ** (attempt - 1))
+                reason = f"{type(e).__name__}: {e}"
+            else:
+                self._record(response.headers)
+                retry = self._retry_delay(method, response, attempt)
+                if retry is None or attempt == self.max_attempts:
+                    return httppool.json_result(response)
+                reason = f"HTTP {response.status}"
+            with self._lock:
+                self.counts["retries"] += 1
+            logutil.warning("GITHUB", f"{method} {path}: {reason}; retrying in {retry:.1f}s")
+            yield flows.Sleep(retry)
+
+    def create_issue_flow(self, repo, title, body, labels=None):
+        """Flow: create an issue with its labels in a single request."""
+        payload = {"title": title, "body": body}
+        if labels:
+            payload["labels"] = labels
+        return (yield from self.request_flow("POST", f"/repos/{repo}/issues", payload))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limits": {name: dict(limit) for name, limit in self.limits.items()},
+                "blocked_for": round(max(0.0, self._blocked_until - time.time()), 1),
+                **{k: round(v, 1) if isinstance(v, float) else v for k, v in self.counts.items()},
+            }
+
+
+GITHUB = GitHubClient()
@@ -0,0 +1,227 @@
+"""Submission PDF uploads through the GitHub Git Data API.
+
+The Contents API needs the whole file base64-encoded inside one JSON
+string, about 2.7x the PDF size in memory, and it refuses large files.
+Uploads here take two steps:
+
+1. The PDF is streamed into a blob (`POST /git/blobs`). The JSON body is
+   produced piece by piece, base64-encoding the file in 192 KiB reads, and
+   its Content-Length is known up front, so memory use does not depend on
+   the file size and the body can be replayed.
+2. The blob is committed by a CommitBatcher worker. It collects the blobs
+   of submissions that arrive close together (within TSM2_GITHUB_BATCH_WINDOW
+   seconds, up to TSM2_GITHUB_BATCH_MAX files) and adds them all in one
+   tree + commit + ref update. A ref update that loses a race with another
+   commit is retried on the new head. A blob whose caller stopped waiting
+   before the worker picked it up is dropped, not committed, so a
+   submission reported as failed never lands in the repository later.
+
+Requests go through githubclient.GITHUB (rate limits, pacing, retries).
+TSM2_GITHUB_UPLOAD=contents keeps the old Contents API path in server.py.
+mock_github.py is a local stand-in for these endpoints for testing.
+"""
+
+import os
+import time
+import queue
+import base64
+import threading
+
+import flows
+import httppool
+import githubclient
+import logutil
+
+
+UPLOAD_MODE = os.environ.get("TSM2_GITHUB_UPLOAD", "gitdata")
+BATCH_WINDOW = float(os.environ.get("TSM2_GITHUB_BATCH_WINDOW", "1.0"))
+BATCH_MAX = int(os.environ.get("TSM2_GITHUB_BATCH_MAX", "10"))
+COMMIT_TIMEOUT = 180
+REF_UPDATE_ATTEMPTS = 3
+
+# A multiple of 3, so each read encodes to base64 without padding and the
+# pieces concatenate into the encoding of the whole file.
+READ_SIZE = 3 * 64 * 1024
+
+BLOB_PREFIX = b'{"encoding": "base64", "content": "'
+BLOB_SUFFIX = b'"}'
+
+
+def iter_blob_body(path):
+    """Yield the JSON body of a blob request for the file at path."""
+    yield BLOB_PREFIX
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+    yield BLOB_SUFFIX
+
+
+def blob_body_length(path):
+    size = os.path.getsize(path)
+    return len(BLOB_PREFIX) + 4 * ((size + 2) // 3) + len(BLOB_SUFFIX)
+
+
+def create_blob_flow(repo, local_path, token):
+    """Flow: stream a file into a Git blob; returns the blob SHA."""
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Length": str(blob_body_length(local_path)),
+    }
+    result = yield from githubclient.GITHUB.request_flow(
+        "POST", f"/repos/{repo}/git/blobs", body=lambda: iter_blob_body(local_path),
+        headers=headers, timeout=300, token=token, blocking_body=True,
+    )
+    return result["sha"]
+
+
+def commit_files_flow(repo, branch, files, token, message):
+    """Flow: commit blobs to a branch in one commit; returns the commit SHA.
+
+    files is a list of (path in repo, blob sha).
+    """
+    api = f"/repos/{repo}/git"
+    entries = [{"path": path, "mode": "100644", "type": "blob", "sha": sha} for path, sha in files]
+    for attempt in range(1, REF_UPDATE_ATTEMPTS + 1):
+        ref = yield from githubclient.GITHUB.request_flow("GET", f"{api}/ref/heads/{branch}", token=token)
+        parent = ref["object"]["sha"]
+        head = yield from githubclient.GITHUB.request_flow("GET", f"{api}/commits/{parent}", token=token)
+        tree = yield from githubclient.GITHUB.request_flow(
+            "POST", f"{api}/trees", {"base_tree": head["tree"]["sha"], "tree": entries}, timeout=60, token=token
+        )
+        commit = yield from githubclient.GITHUB.request_flow(
+            "POST", f"{api}/commits", {"message": message, "tree": tree["sha"], "parents": [parent]}, token=token
+        )
+        try:
+            yield from githubclient.GITHUB.request_flow(
+                "PATCH", f"{api}/refs/heads/{branch}", {"sha": commit["sha"], "force": False}, token=token
+            )
+            return commit["sha"]
+        except httppool.HTTPError as e:
+            # 422: the branch moved since we read it (not a fast-forward).
+            if e.code != 422 or attempt == REF_UPDATE_ATTEMPTS:
+                raise
+            logutil.warning("GITHUB PDF", f"{branch} moved during commit; retrying ({attempt})")
+
+
+def commit_message(paths):
+    names = [os.path.basename(p) for p in paths]
+    if len(names) == 1:
+        return f"Upload submission PDF: {names[0]}"
+    return f"Upload {len(names)} submission PDFs\n\n" + "\n".join(f"- {name}" for name in names)
+
+
+class CommitBatcher:
+    """Commits blobs from concurrent uploads together on one worker thread."""
+
+    def __init__(self, window=BATCH_WINDOW, max_batch=BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.commits = 0
+        self.files = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, repo, branch, path, blob_sha, token, timeout=COMMIT_TIMEOUT):
+        """Queue a blob for commit and wait for it.
+
+        On timeout a blob still in the queue is cancelled. One the worker is
+        already committing is waited for once more, so the caller learns
+        whether it landed.
+
+        Returns:
+            (commit_sha, error) tuple; commit_sha is None on failure.
+        """
+        entry = {
+            "repo": repo, "branch": branch, "path": path, "sha": blob_sha, "token": token,
+            "state": "queued", "done": threading.Event(), "result": (None, "not committed"),
+        }
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="git-commit", daemon=True)
+                self._worker.start()
+        self._queue.put(entry)
+        if entry["done"].wait(timeout):
+            return entry["result"]
+        with self._lock:
+            if entry["state"] == "queued":
+                entry["state"] = "cancelled"
+                self.cancelled += 1
+                return None, f"timed out after {timeout}s waiting for the commit"
+        if entry["done"].wait(timeout):
+            return entry["result"]
+        return None, f"commit still in progress after {2 * timeout}s; {path} may yet be committed"
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            groups = {}
+            batch = self._collect()
+            with self._lock:
+                # Claimed entries can no longer be cancelled by their caller.
+                batch = [entry for entry in batch if entry["state"] == "queued"]
+                for entry in batch:
+                    entry["state"] = "committing"
+            for entry in batch:
+                groups.setdefault((entry["repo"], entry["branch"], entry["token"]), []).append(entry)
+            for (repo, branch, token), entries in groups.items():
+                paths = [e["path"] for e in entries]
+                try:
+                    sha = flows.run(commit_files_flow(
+                        repo, branch, [(e["path"], e["sha"]) for e in entries], token, commit_message(paths),
+                    ))
+                    result = (sha, None)
+                    with self._lock:
+                        self.commits += 1
+                        self.files += len(entries)
+                    logutil.info("GITHUB PDF", f"Committed {len(entries)} file(s) in {sha[:7]}")
+                except Exception as e:
+                    detail = e.text(300) if isinstance(e, httppool.HTTPError) else str(e)
+                    result = (None, f"{type(e).__name__}: {detail}")
+                    with self._lock:
+                        self.failed += len(entries)
+                    logutil.error("GITHUB PDF", f"Commit of {paths} failed: {result[1]}")
+                for entry in entries:
+                    entry["result"] = result
+                    entry["done"].set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "commits": self.commits,
+                "files": self.files,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "pending": self._queue.qsize(),
+            }
+
+
+COMMIT_BATCHER = CommitBatcher()
+
+
+def upload_flow(repo, branch, repo_path, local_path, token):
+    """Flow: blob upload then batched commit.
+
+    Returns:
+        (commit_sha, error) tuple; commit_sha is None on failure.
+    """
+    blob_sha = yield from create_blob_flow(repo, local_path, token)
+    logutil.info("GITHUB PDF", f"Blob {blob_sha[:7]} created for {repo_path}")
+    return (yield flows.Blocking(COMMIT_BATCHER.submit, repo, branch, repo_path, blob_sha, token))
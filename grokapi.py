@@ -0,0 +1,183 @@
+"""Streaming request bodies for the Grok (x.ai) chat completions API.
+
+A vision request carries up to 50 base64 page images. Building it as a
+Python dict and then json.dumps(...).encode() holds the images three times
+over. Here the JSON body is produced piece by piece — one image part at a
+time — and written straight to the socket:
+
+- when the images are already in memory (a list), the Content-Length is
+  computed from the pieces first, so the body is never joined into one
+  buffer;
+- when the images come from a generator (pages rendered on demand), the
+  body is sent with chunked transfer encoding, so rendering and upload
+  overlap and only about one page image is alive at a time.
+
+Requests go over the shared keep-alive pools in httppool; chat_completion_flow
+is the flows version used by both the blocking and the asyncio server.
+
+With on_text, the completion is requested with "stream": true. The
+server-sent chunks are parsed as they arrive (ChatStream), and each
+content delta is passed to on_text. The caller still gets the usual
+response dict once the stream ends. TSM2_GROK_STREAM=0 turns streaming off.
+
+Each request's duration goes to metrics (tsm2_grok_request_duration_seconds)
+by model and outcome.
+"""
+
+import os
+import json
+import time
+
+import flows
+import httppool
+import metrics
+
+
+GROK_API_URL = os.environ.get("TSM2_GROK_API_URL", "https://api.x.ai/v1/chat/completions")
+STREAM = os.environ.get("TSM2_GROK_STREAM", "1") != "0"
+
+
+def _dumps(value):
+    return json.dumps(value).encode("utf-8")
+
+
+def iter_chat_body(model, system_text, user_text, images=None, temperature=0.3, max_tokens=4000, extra=None):
+    """Yield the JSON request body in pieces.
+
+    The output is byte-for-byte what json.dumps would produce for
+    {"model", "messages": [system, user], "temperature", "max_tokens"},
+    where the user content is the image parts followed by the text part,
+    or just the text when there are no images. extra holds any additional
+    top-level fields (e.g. "stream").
+    """
+    yield (
+        b'{"model": ' + _dumps(model)
+        + b', "messages": [{"role": "system", "content": ' + _dumps(system_text)
+        + b'}, {"role": "user", "content": '
+    )
+    if images is None:
+        yield _dumps(user_text)
+    else:
+        yield b"["
+        for image in images:
+            yield _dumps(image) + b", "
+        yield _dumps({"type": "text", "text": user_text}) + b"]"
+    tail = b'}], "temperature": ' + _dumps(temperature) + b', "max_tokens": ' + _dumps(max_tokens)
+    for key, value in (extra or {}).items():
+        tail += b", " + _dumps(key) + b": " + _dumps(value)
+    yield tail + b"}"
+
+
+def post_chat_completion(api_key, model, system_text, user_text, images=None,
+                         temperature=0.3, max_tokens=4000, timeout=300, extra=None):
+    """POST a chat completion and return the decoded JSON response.
+
+    images may be None (text-only request), a list of image parts, or an
+    iterator/generator of image parts. Raises httppool.HTTPError on non-2xx.
+    """
+    return flows.run(chat_completion_flow(
+        api_key, model, system_text, user_text, images, temperature, max_tokens, timeout, extra
+    ))
+
+
+def chat_completion_flow(api_key, model, system_text, user_text, images=None,
+                         temperature=0.3, max_tokens=4000, timeout=300, extra=None, on_text=None):
+    """Flow form of post_chat_completion (see flows).
+
+    on_text, if given, receives the reply text piece by piece as it is
+    generated (streamed request); the return value is the same either way.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    stream = None
+    if on_text is not None and STREAM:
+        stream = ChatStream(on_text)
+        extra = dict(extra or {}, stream=True)
+
+    def body():
+        return iter_chat_body(model, system_text, user_text, images, temperature, max_tokens, extra)
+
+    if images is None or isinstance(images, (list, tuple)):
+        headers["Content-Length"] = str(sum(len(piece) for piece in body()))
+        chunked = False
+    else:
+        chunked = True
+
+    # A generator can only be consumed once, so a streamed body is not
+    # replayable; the pool then will not retry it on a fresh connection.
+    replayable = not chunked
+    started = time.perf_counter()
+    status = None
+    try:
+        response = yield flows.HttpRequest(
+            "POST", GROK_API_URL, body=body if replayable else body(),
+            headers=headers, timeout=timeout, encode_chunked=chunked,
+            blocking_body=chunked, on_data=stream.feed if stream else None,
+        )
+        status = response.status
+    finally:
+        metrics.GROK_SECONDS.observe(time.perf_counter() - started, model=model, outcome=metrics.outcome_for_status(status))
+    if stream is None or response.status >= 400:
+        return httppool.json_result(response)
+    return stream.result()
+
+
+class ChatStream:
+    """Incremental parser for a streamed chat completion (server-sent events).
+
+    feed() takes raw response bytes in any split; every "data:" event is
+    decoded as it completes, and content deltas go to on_text. result()
+    rebuilds the non-streamed response shape from the deltas.
+    """
+
+    def __init__(self, on_text=None):
+        self.on_text = on_text
+        self._buffer = b""
+        self._content = []
+        self.model = None
+        self.finish_reason = None
+        self.usage = None
+
+    def feed(self, data):
+        self._buffer += data
+        while True:
+            line, newline, rest = self._buffer.partition(b"\n")
+            if not newline:
+                return
+            self._buffer = rest
+            self._event_line(line.rstrip(b"\r"))
+
+    def _event_line(self, line):
+        if not line.startswith(b"data:"):
+            return
+        payload = line[5:].strip()
+        if not payload or payload == b"[DONE]":
+            return
+        try:
+            chunk = json.loads(payload)
+        except ValueError:
+            return
+        self.model = chunk.get("model", self.model)
+        self.usage = chunk.get("usage") or self.usage
+        for choice in chunk.get("choices") or []:
+            self.finish_reason = choice.get("finish_reason") or self.finish_reason
+            text = (choice.get("delta") or {}).get("content")
+            if text:
+                self._content.append(text)
+                if self.on_text is not None:
+                    self.on_text(text)
+
+    def result(self):
+        """The completion as a non-streamed response would have returned it."""
+        self.feed(b"\n")
+        return {
+            "model": self.model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(self._content)},
+                "finish_reason": self.finish_reason,
+            }],
+            "usage": self.usage,
+        }
@@ -0,0 +1,461 @@
+"""Keep-alive HTTPS connection pool for the GitHub and x.ai APIs.
+
+urllib.request.urlopen opens a new TCP connection and TLS session for every
+call, so a single submission paid four or more cold handshakes to
+api.github.com and api.x.ai. This pool keeps idle http.client connections
+per host and hands them back out to the next request, across threads.
+
+- Idle connections are dropped after TSM2_HTTP_IDLE_TIMEOUT seconds.
+- At most TSM2_HTTP_POOL_SIZE idle connections are kept per host.
+- A reused connection is checked for a close from the server first. If
+  a request with a replayable body still fails on one, it is retried once
+  on a fresh connection, but only when the server cannot have acted on
+  it: the failure came while sending, or the method is idempotent. A
+  POST or PATCH that fails after it was sent is not repeated, and nothing
+  is repeated once part of a streamed body went to on_data.
+- Creation, reuse and retry counts are kept for stats().
+
+AsyncConnectionPool is the asyncio counterpart used by the asyncio server
+mode (see flows and asyncserver): the same pooling rules over
+asyncio.open_connection, with bodies written and responses read as
+coroutines.
+"""
+
+import io
+import os
+import ssl
+import json
+import time
+import select
+import asyncio
+import threading
+import http.client
+import urllib.parse
+
+
+POOL_SIZE = int(os.environ.get("TSM2_HTTP_POOL_SIZE", "4"))
+IDLE_TIMEOUT = float(os.environ.get("TSM2_HTTP_IDLE_TIMEOUT", "60"))
+USER_AGENT = "TSM2-Submission-Portal"
+GITHUB_API_URL = os.environ.get("TSM2_GITHUB_API_URL", "https://api.github.com").rstrip("/")
+STREAM_READ_SIZE = 64 * 1024
+
+# Errors that mean a kept-alive connection was closed by the server,
+# typically while it sat idle. Whether the request can be replayed depends
+# on how far it got; see _may_retry.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+# Repeating these has the same effect as sending them once.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+
+class HTTPError(Exception):
+    """Non-2xx response. body holds the raw response bytes."""
+
+    def __init__(self, code, reason, headers, body):
+        super().__init__(f"HTTP {code} {reason}")
+        self.code = code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def text(self, limit=None):
+        text = self.body.decode("utf-8", errors="replace")
+        return text if limit is None else text[:limit]
+
+
+class Response:
+    """A fully read response."""
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+def _split_url(url):
+    """(key, path) where key is (scheme, host, port)."""
+    parsed = urllib.parse.urlsplit(url)
+    scheme = parsed.scheme
+    port = parsed.port or (443 if scheme == "https" else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    return (scheme, parsed.hostname, port), path
+
+
+def _may_retry(method, sent, delivered):
+    """Whether a request that failed on a reused connection can be sent again.
+
+    sent: the whole request went out, so the server may have acted on it.
+    delivered: part of the response body was already passed to on_data.
+    """
+    return not delivered and (not sent or method in IDEMPOTENT_METHODS)
+
+
+def json_body(payload, headers=None):
+    """(body, headers) for a JSON request; body is None without a payload."""
+    headers = dict(headers or {})
+    if payload is None:
+        return None, headers
+    headers.setdefault("Content-Type", "application/json")
+    return json.dumps(payload).encode("utf-8"), headers
+
+
+def json_result(response):
+    """Decoded JSON of a Response; raises HTTPError for non-2xx."""
+    if response.status >= 400:
+        raise HTTPError(response.status, response.reason, response.headers, response.body)
+    return response.json() if response.body else None
+
+
+class _PoolBase:
+    def __init__(self, max_idle_per_host=POOL_SIZE, idle_timeout=IDLE_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self._ssl_context = ssl.create_default_context()
+        self._idle = {}  # (scheme, host, port) -> [(conn, idle_since), ...]
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, host, name, amount=1):
+        with self._lock:
+            entry = self._stats.setdefault(host, {
+                "requests": 0, "created": 0, "reused": 0,
+                "retried": 0, "closed_idle": 0, "discarded": 0,
+            })
+            entry[name] += amount
+
+    def _take_idle(self, key, is_dropped):
+        """Pop the newest usable idle connection; returns (conn or None, expired list)."""
+        now = time.monotonic()
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, since = idle.pop()
+                if now - since <= self.idle_timeout and not is_dropped(candidate):
+                    conn = candidate
+                    break
+                expired.append(candidate)
+            # Anything left below the newest usable connection is older still.
+            while idle and now - idle[0][1] > self.idle_timeout:
+                expired.append(idle.pop(0)[0])
+        if expired:
+            self._count(key[1], "closed_idle", len(expired))
+        return conn, expired
+
+    def _keep_idle(self, key, conn):
+        """Park a connection for reuse; False if the host already has enough."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append((conn, time.monotonic()))
+                return True
+        self._count(key[1], "discarded")
+        return False
+
+    def stats(self):
+        with self._lock:
+            hosts = {host: dict(entry) for host, entry in self._stats.items()}
+            for (_, host, _), idle in self._idle.items():
+                hosts.setdefault(host, {})["idle"] = len(idle)
+        return hosts
+
+
+class ConnectionPool(_PoolBase):
+    """Thread-safe pool of idle keep-alive connections, keyed by host."""
+
+    def _acquire(self, key, timeout):
+        """Return (conn, reused)."""
+        conn, expired = self._take_idle(key, _is_dropped)
+        for old in expired:
+            old.close()
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            self._count(key[1], "reused")
+            return conn, True
+
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        self._count(host, "created")
+        return conn, False
+
+    def _release(self, key, conn):
+        if not self._keep_idle(key, conn):
+            conn.close()
+
+    def request(self, method, url, body=None, headers=None, timeout=60, encode_chunked=False, on_data=None):
+        """Send a request on a pooled connection and read the whole response.
+
+        body is None, bytes, a zero-argument callable returning an iterable
+        of bytes (so it can be produced again if the request has to be
+        replayed on a fresh connection), or a one-shot iterable, which is
+        never replayed. on_data, if given, is called with each piece of a
+        successful response body as it arrives (streamed responses). Returns
+        a Response whatever the status code; see request_json for the
+        raising variant.
+        """
+        key, path = _split_url(url)
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", USER_AGENT)
+        self._count(key[1], "requests")
+        replayable = body is None or isinstance(body, (bytes, bytearray)) or callable(body)
+
+        for attempt in (1, 2):
+            conn, reused = self._acquire(key, timeout)
+            payload = body() if callable(body) else body
+            sent = delivered = False
+            try:
+                conn.request(method, path, body=payload, headers=headers, encode_chunked=encode_chunked)
+                sent = True
+                response = conn.getresponse()
+                if on_data is not None and response.status < 400:
+                    parts = []
+                    while True:
+                        piece = response.read1(STREAM_READ_SIZE)
+                        if not piece:
+                            break
+                        parts.append(piece)
+                        delivered = True
+                        on_data(piece)
+                    data = b"".join(parts)
+                else:
+                    data = response.read()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused and replayable and attempt == 1 and _may_retry(method, sent, delivered):
+                    self._count(key[1], "retried")
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            return Response(response.status, response.reason, response.headers, data)
+
+    def request_json(self, method, url, payload=None, headers=None, timeout=60):
+        """JSON in, JSON out. Raises HTTPError for non-2xx responses."""
+        body, headers = json_body(payload, headers)
+        response = self.request(method, url, body=body, headers=headers, timeout=timeout)
+        return json_result(response)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+
+def _is_dropped(conn):
+    """True if an idle connection has been closed (or sent data) by the server."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class _AsyncConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool(_PoolBase):
+    """Keep-alive pool for coroutines; use from one event loop at a time."""
+
+    async def _acquire(self, key, timeout):
+        conn, expired = self._take_idle(key, lambda c: c.reader.at_eof())
+        for old in expired:
+            old.close()
+        if conn is not None:
+            self._count(key[1], "reused")
+            return conn, True
+        scheme, host, port = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self._ssl_context if scheme == "https" else None),
+            timeout,
+        )
+        self._count(host, "created")
+        return _AsyncConnection(reader, writer), False
+
+    async def request(self, method, url, body=None, headers=None, timeout=60,
+                      encode_chunked=False, blocking_body=False, on_data=None):
+        """Coroutine version of ConnectionPool.request.
+
+        timeout applies to each connect, write and read step, as with
+        http.client. With blocking_body, pieces of an iterable body are
+        produced on an executor thread so the event loop is not held up.
+        """
+        key, path = _split_url(url)
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", USER_AGENT)
+        headers.setdefault("Host", key[1] if key[2] in (80, 443) else f"{key[1]}:{key[2]}")
+        self._count(key[1], "requests")
+        replayable = body is None or isinstance(body, (bytes, bytearray)) or callable(body)
+
+        for attempt in (1, 2):
+            conn, reused = await self._acquire(key, timeout)
+            payload = body() if callable(body) else body
+            sent = False
+            delivered = []
+
+            def forward(piece):
+                delivered.append(len(piece))
+                on_data(piece)
+
+            try:
+                await self._send(conn.writer, method, path, payload, headers, timeout, encode_chunked, blocking_body)
+                sent = True
+                response, keep_alive = await self._read_response(
+                    conn.reader, method, timeout, forward if on_data is not None else None
+                )
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                conn.close()
+                if reused and replayable and attempt == 1 and _may_retry(method, sent, bool(delivered)):
+                    self._count(key[1], "retried")
+                    continue
+                if isinstance(e, asyncio.IncompleteReadError):
+                    raise http.client.RemoteDisconnected("Remote end closed connection without response") from e
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if not keep_alive or not self._keep_idle(key, conn):
+                conn.close()
+            return response
+
+    async def _send(self, writer, method, path, payload, headers, timeout, encode_chunked, blocking_body):
+        # Like http.client: an iterable body without a Content-Length is
+        # sent with chunked transfer encoding.
+        if isinstance(payload, (bytes, bytearray)):
+            headers["Content-Length"] = str(len(payload))
+        elif payload is not None and (encode_chunked or "Content-Length" not in headers):
+            headers.pop("Content-Length", None)
+            headers["Transfer-Encoding"] = "chunked"
+        elif payload is None and method in ("POST", "PUT", "PATCH"):
+            headers["Content-Length"] = "0"
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1"))
+
+        if isinstance(payload, (bytes, bytearray)):
+            writer.write(payload)
+        elif payload is not None:
+            chunked = headers.get("Transfer-Encoding") == "chunked"
+            pieces = iter(payload)
+            loop = asyncio.get_running_loop()
+            while True:
+                if blocking_body:
+                    piece = await loop.run_in_executor(None, next, pieces, None)
+                else:
+                    piece = next(pieces, None)
+                if piece is None:
+                    break
+                if not piece:
+                    continue
+                writer.write(b"%x\r\n%s\r\n" % (len(piece), piece) if chunked else piece)
+                await asyncio.wait_for(writer.drain(), timeout)
+            if chunked:
+                writer.write(b"0\r\n\r\n")
+        await asyncio.wait_for(writer.drain(), timeout)
+
+    async def _read_response(self, reader, method, timeout, on_data=None):
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        lines = []
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b"".join(lines) + b"\r\n"))
+        status = int(status)
+        keep_alive = version == "HTTP/1.1" and headers.get("Connection", "").lower() != "close"
+        if status >= 400:
+            on_data = None
+
+        def received(piece):
+            if on_data is not None:
+                on_data(piece)
+            return piece
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size_line = await asyncio.wait_for(reader.readline(), timeout)
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # Trailers (if any) end with a blank line.
+                    while (await asyncio.wait_for(reader.readline(), timeout)) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                parts.append(received(await asyncio.wait_for(reader.readexactly(size), timeout)))
+                await asyncio.wait_for(reader.readline(), timeout)
+            body = b"".join(parts)
+        elif headers.get("Content-Length") is not None:
+            remaining = int(headers["Content-Length"])
+            parts = []
+            while remaining > 0:
+                piece = await asyncio.wait_for(reader.read(min(remaining, STREAM_READ_SIZE)), timeout)
+                if not piece:
+                    raise asyncio.IncompleteReadError(b"".join(parts), remaining)
+                parts.append(received(piece))
+                remaining -= len(piece)
+            body = b"".join(parts)
+        else:
+            parts = []
+            while True:
+                piece = await asyncio.wait_for(reader.read(STREAM_READ_SIZE), timeout)
+                if not piece:
+                    break
+                parts.append(received(piece))
+            body = b"".join(parts)
+            keep_alive = False
+        return Response(status, reason, headers, body), keep_alive
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+
+HTTP_POOL = ConnectionPool()
+ASYNC_HTTP_POOL = AsyncConnectionPool()
+
+
+def github_headers(token):
+    return {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3+json",
+        "User-Agent": USER_AGENT,
+    }
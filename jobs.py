@@ -0,0 +1,311 @@
+"""Background submission jobs for the TSM2 Submission Portal.
+
+In job mode, /api/submit only validates and stores the PDF, registers a Job
+here and answers 202 Accepted straight away. A small worker pool then runs
+the slow stages (PDF analysis, GitHub upload, Grok pre-check, issue
+creation, notifications) and records stage-by-stage progress on the Job,
+which GET /api/submissions/<job_id> reports back to the browser.
+
+Every change is also appended to the job's event log: stage starts and
+ends, stage details, each criterion verdict as it streams in from Grok,
+and a final "done" event carrying the result. GET
+/api/submissions/<job_id>/events relays the log as Server-Sent Events. It
+replays what the client missed (Last-Event-ID), then pushes new events as
+they happen, with a comment line every TSM2_SSE_HEARTBEAT seconds so
+proxies keep the connection open. At most TSM2_SSE_MAX_STREAMS streams are
+served at once; past that the browser falls back to polling.
+
+Jobs live in memory only. The GitHub issue remains the authoritative
+record; a job is just a progress handle for the submitter's browser.
+"""
+
+import os
+import time
+import json
+import uuid
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import admission
+import logutil
+import metrics
+
+
+JOB_WORKERS = int(os.environ.get("TSM2_JOB_WORKERS", "4"))
+JOB_RETENTION_SECONDS = int(os.environ.get("TSM2_JOB_RETENTION_SECONDS", "86400"))
+EVENT_HEARTBEAT = float(os.environ.get("TSM2_SSE_HEARTBEAT", "15"))
+MAX_EVENT_STREAMS = int(os.environ.get("TSM2_SSE_MAX_STREAMS", "8"))
+EVENT_RETRY_MS = 3000
+
+STAGES = [
+    "analyzing",
+    "uploading",
+    "evaluating",
+    "creating_issue",
+    "notifying",
+]
+
+
+class Job:
+    """Progress record for one submission processed in the background."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = "queued"
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.current_stage = None
+        self.stages = {name: {"status": "pending"} for name in STAGES}
+        self.http_status = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._listeners = set()
+        self._criteria_sent = set()
+
+    @contextlib.contextmanager
+    def stage(self, name, detail=None):
+        """Mark a pipeline stage as running for the duration of the block."""
+        started = time.time()
+        with self._lock:
+            self.current_stage = name
+            self.stages[name] = {"status": "running", "started_at": started}
+            if detail:
+                self.stages[name]["detail"] = detail
+            self.updated_at = started
+            self._publish_locked("stage", dict(self.stages[name], name=name))
+        try:
+            yield
+        except Exception as e:
+            self._end_stage(name, "failed", started, str(e))
+            raise
+        self._end_stage(name, "done", started)
+
+    def _end_stage(self, name, status, started, error=None):
+        finished = time.time()
+        with self._lock:
+            entry = self.stages.setdefault(name, {})
+            entry["status"] = status
+            entry["finished_at"] = finished
+            entry["elapsed"] = round(finished - started, 3)
+            if error:
+                entry["error"] = error
+            self.updated_at = finished
+            self._publish_locked("stage", dict(entry, name=name))
+
+    def note(self, name, detail):
+        """Attach a short human-readable detail to a stage."""
+        with self._lock:
+            entry = self.stages.setdefault(name, {"status": "pending"})
+            entry["detail"] = detail
+            self.updated_at = time.time()
+            self._publish_locked("stage", dict(entry, name=name))
+
+    def publish_criterion(self, criterion):
+        """Record a criterion verdict for the browser; each id is sent once."""
+        with self._lock:
+            if criterion.get("id") in self._criteria_sent:
+                return
+            self._criteria_sent.add(criterion.get("id"))
+            self._publish_locked("criterion", criterion)
+
+    def finish(self, http_status, result):
+        with self._lock:
+            self.http_status = http_status
+            self.current_stage = None
+            self.updated_at = time.time()
+            if http_status == 200 and result.get("success"):
+                self.status = "completed"
+                self.result = result
+            else:
+                self.status = "failed"
+                self.error = result.get("error", "Submission failed")
+            self._publish_done_locked()
+
+    def fail(self, message):
+        with self._lock:
+            self.status = "failed"
+            self.http_status = 500
+            self.error = message
+            self.updated_at = time.time()
+            self._publish_done_locked()
+
+    def _publish_done_locked(self):
+        data = {"status": self.status}
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        self._publish_locked("done", data)
+
+    def _publish_locked(self, kind, data):
+        self.events.append((len(self.events) + 1, kind, data))
+        self._changed.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, listener):
+        """Call listener() (from any thread) whenever an event is published."""
+        with self._lock:
+            self._listeners.add(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+    def events_after(self, last_id, timeout=0):
+        """(events newer than last_id, job finished), waiting up to timeout for one."""
+        with self._lock:
+            if len(self.events) <= last_id and not self.done and timeout:
+                self._changed.wait(timeout)
+            return self.events[last_id:], self.done
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "job_id": self.job_id,
+                "status": self.status,
+                "stage": self.current_stage,
+                "stages": [dict(self.stages[name], name=name) for name in self.stages],
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+            if self.result is not None:
+                data["result"] = self.result
+            if self.error is not None:
+                data["error"] = self.error
+            return data
+
+
+class JobManager:
+    """Thread pool plus an in-memory registry of submission jobs."""
+
+    def __init__(self, max_workers=JOB_WORKERS, retention_seconds=JOB_RETENTION_SECONDS):
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="submission-job")
+
+    def create(self):
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.job_id] = job
+        return job
+
+    def submit(self, job, fn, *args, **kwargs):
+        """Run fn(*args, job=job, **kwargs) on the pool.
+
+        fn must return an (http_status, response_data) tuple, the same shape
+        the synchronous /api/submit path sends back to the browser. It runs
+        in a copy of the caller's context, so its log records keep the
+        request's correlation id.
+        """
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        with logutil.bind(job_id=job.job_id):
+            self._mark_running(job)
+            try:
+                http_status, result = fn(*args, job=job, **kwargs)
+                job.finish(http_status, result)
+            except Exception as e:
+                self._crashed(job, e)
+
+    async def run_async(self, job, coro):
+        """Await coro on the caller's event loop with the same bookkeeping as submit().
+
+        coro must produce an (http_status, response_data) tuple. Used by the
+        asyncio server, where jobs are tasks rather than pool threads.
+        """
+        with logutil.bind(job_id=job.job_id):
+            self._mark_running(job)
+            try:
+                http_status, result = await coro
+                job.finish(http_status, result)
+            except Exception as e:
+                self._crashed(job, e)
+
+    def _mark_running(self, job):
+        with job._lock:
+            job.status = "running"
+            job.updated_at = time.time()
+
+    def _crashed(self, job, e):
+        logutil.exception("JOB", f"{job.job_id}: {type(e).__name__}: {e}")
+        job.fail(f"Server error: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune_locked()
+            return self._jobs.get(job_id)
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [jid for jid, j in self._jobs.items() if j.done and j.updated_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def stats(self):
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+            for j in self._jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+            return counts
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+
+EVENT_STREAMS = admission.AdmissionControl(MAX_EVENT_STREAMS)
+
+EVENT_STREAM_HEADERS = {
+    "Content-Type": "text/event-stream; charset=utf-8",
+    "Cache-Control": "no-cache, no-transform",
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "*",
+}
+
+
+def format_event(event):
+    """One job event as a Server-Sent Events message."""
+    event_id, kind, data = event
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def stream_preamble():
+    return f"retry: {EVENT_RETRY_MS}\n\n".encode("ascii")
+
+
+HEARTBEAT = b": keep-alive\n\n"
+
+
+def last_event_id(headers, query):
+    """Where a (re)connecting event stream resumes: Last-Event-ID or ?last_event_id=."""
+    value = headers.get("Last-Event-ID") or (query.get("last_event_id") or [""])[0]
+    return int(value) if value.isdigit() else 0
+
+
+@contextlib.contextmanager
+def track(job, name, detail=None):
+    """Stage context: a metrics span, plus progress on the job if there is one.
+
+    Yields the metrics.Span, so the caller can mark a handled failure.
+    """
+    with metrics.span(name) as span:
+        if job is None:
+            yield span
+        else:
+            with job.stage(name, detail):
+                yield span
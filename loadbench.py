@@ -0,0 +1,640 @@
+"""End-to-end load benchmark for /api/submit against local stand-in services.
+
+Starts, in a child process:
+
+- the GitHub API mock from mock_github.py;
+- a mock of the x.ai chat completions endpoint, streamed or not as the
+  request asks, which answers every criterion in the prompt with PASS;
+- an SMTP sink that accepts any login and every message, without TLS.
+
+Each stand-in adds its own latency to every request or message and fails a
+share of them (--github-latency, --xai-errors, --smtp-errors, ...): GitHub
+with 502, x.ai with 503, SMTP with a 451 for the message.
+
+server.py then runs as a separate process, in a scratch directory, pointed
+at the stand-ins (TSM2_GITHUB_API_URL, TSM2_GROK_API_URL, TSM2_SMTP_HOST,
+TSM2_SMTP_PORT, TSM2_SMTP_STARTTLS=0). The result cache is off unless
+--cache is given, so every submission runs the full pipeline. --requests
+multipart submissions, built from the PDFs in pdfs/ the way the browser
+builds them, are posted to /api/submit, --concurrency at a time. With
+--job-mode each is posted with ?mode=async and timed until its job is done.
+
+Reports p50/p95/p99 latency of the successful submissions, throughput,
+outcome counts, the server process's peak RSS and thread count (sampled
+from /proc, so Linux only) and what each stand-in received:
+
+    python loadbench.py [--requests N] [--concurrency C] [--server-mode pooled|threading|asyncio]
+                        [--job-mode] [--env NAME=VALUE ...] [--json FILE]
+
+Serve the stand-ins only: python loadbench.py --serve
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import glob
+import random
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import socketserver
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import mock_github
+import sectionindex
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BOUNDARY = "----TSM2LoadBenchBoundary"
+STREAM_DELTA_CHARS = 48
+CRITERION_ID = re.compile(r'\{"id": (\d+), "name"')
+
+
+class StandInStats:
+    """Counters for the x.ai mock and the SMTP sink, served at /_mock/state."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            "xai_requests": 0,
+            "xai_streamed": 0,
+            "xai_errors": 0,
+            "smtp_sessions": 0,
+            "smtp_messages": 0,
+            "smtp_bytes": 0,
+            "smtp_errors": 0,
+        }
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+STATS = StandInStats()
+
+
+def fails(latency, error_rate):
+    """Sleep for latency; True if this request should get an injected error."""
+    if latency:
+        time.sleep(latency)
+    return bool(error_rate) and random.random() < error_rate
+
+
+def prompt_text(payload):
+    parts = []
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(p.get("text", "") for p in content or [] if p.get("type") == "text")
+    return "\n".join(parts)
+
+
+def mock_scorecard(payload):
+    """A compliant answer for the criteria the prompt's response schema lists."""
+    ids = sorted({int(cid) for cid in CRITERION_ID.findall(prompt_text(payload))})
+    ids = [cid for cid in ids if cid in sectionindex.CRITERION_NAMES] or list(sectionindex.CRITERION_NAMES)
+    return {
+        "overall_status": "COMPLIANT",
+        "summary": "Mock pre-check: every criterion is met.",
+        "criteria": [
+            {
+                "id": cid,
+                "name": sectionindex.CRITERION_NAMES[cid],
+                "status": "PASS",
+                "reason": "Mock reviewer: the criterion is addressed.",
+                "required_correction": None,
+            }
+            for cid in ids
+        ],
+        "minimum_corrections": [],
+    }
+
+
+class MockXAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/_mock/state":
+            return self.reply(200, STATS.snapshot())
+        self.reply(404, {"error": "Not Found"})
+
+    def do_POST(self):
+        payload = json.loads(mock_github.read_request_body(self) or b"{}")
+        STATS.count("xai_requests")
+        if fails(self.latency, self.error_rate):
+            STATS.count("xai_errors")
+            return self.reply(503, {"error": "Mock x.ai: service unavailable"})
+        content = json.dumps(mock_scorecard(payload))
+        model = payload.get("model", "grok-mock")
+        usage = {"prompt_tokens": len(prompt_text(payload)) // 4, "completion_tokens": len(content) // 4}
+        if not payload.get("stream"):
+            return self.reply(200, {
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        STATS.count("xai_streamed")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(content), STREAM_DELTA_CHARS):
+            delta = content[i:i + STREAM_DELTA_CHARS]
+            self.send_chunk({"model": model, "choices": [{"index": 0, "delta": {"content": delta}}]})
+        self.send_chunk({"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage})
+        self.send_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_chunk(self, data):
+        line = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA."""
+
+    latency = 0.0
+    error_rate = 0.0
+
+    def send(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        STATS.count("smtp_sessions")
+        self.send("220 mock-smtp ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            words = line.decode("ascii", "replace").split()
+            verb = words[0].upper() if words else ""
+            if verb == "EHLO":
+                self.send("250-mock-smtp")
+                self.send("250-AUTH PLAIN LOGIN")
+                self.send("250 8BITMIME")
+            elif verb == "AUTH":
+                # Any credentials will do; read the ones not sent inline.
+                prompts = 2 if words[1:2] == ["LOGIN"] else 1
+                for _ in range(prompts - (len(words) - 2)):
+                    self.send("334 ")
+                    self.rfile.readline()
+                self.send("235 2.7.0 Authentication successful")
+            elif verb == "DATA":
+                self.send("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line.rstrip(b"\r\n") == b".":
+                        break
+                    size += len(line)
+                if fails(self.latency, self.error_rate):
+                    STATS.count("smtp_errors")
+                    self.send("451 4.3.0 Mock transient failure")
+                else:
+                    STATS.count("smtp_messages")
+                    STATS.count("smtp_bytes", size)
+                    self.send("250 2.0.0 Queued")
+            elif verb == "QUIT":
+                self.send("221 2.0.0 Bye")
+                return
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.send("250 OK")
+            else:
+                self.send("502 5.5.2 Command not recognized")
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_stand_ins(options, ports=(0, 0, 0)):
+    """(GitHub mock, x.ai mock, SMTP sink) servers, not yet serving."""
+    github = mock_github.make_mock_server(
+        ports[0], options["github_rate_limit"], 3600, options["github_latency"], options["github_errors"],
+    )
+    xai_handler = type("XAIHandler", (MockXAIHandler,), {
+        "latency": options["xai_latency"], "error_rate": options["xai_errors"],
+    })
+    xai = mock_github.ThreadingHTTPServer(("127.0.0.1", ports[1]), xai_handler)
+    smtp_handler = type("SMTPHandler", (SMTPSinkHandler,), {
+        "latency": options["smtp_latency"], "error_rate": options["smtp_errors"],
+    })
+    smtp = ThreadingTCPServer(("127.0.0.1", ports[2]), smtp_handler)
+    return github, xai, smtp
+
+
+def _serve_child(port_queue, options):
+    servers = make_stand_ins(options)
+    threads = [threading.Thread(target=s.serve_forever, daemon=True) for s in servers]
+    for thread in threads:
+        thread.start()
+    port_queue.put(tuple(s.server_address[1] for s in servers))
+    for thread in threads:
+        thread.join()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def portal_env(args, ports, port, workdir):
+    github_port, xai_port, smtp_port = ports
+    env = dict(os.environ)
+    env.pop("REPLIT_DEPLOYMENT", None)
+    env.update({
+        "PYTHONUNBUFFERED": "1",
+        "TSM2_PORT": str(port),
+        "TSM2_SERVER_MODE": args.server_mode,
+        "TSM2_GITHUB_API_URL": f"http://127.0.0.1:{github_port}",
+        "TSM2_GROK_API_URL": f"http://127.0.0.1:{xai_port}/v1/chat/completions",
+        "TSM2_SMTP_HOST": "127.0.0.1",
+        "TSM2_SMTP_PORT": str(smtp_port),
+        "TSM2_SMTP_STARTTLS": "0",
+        "TSM2_CACHE_DIR": os.path.join(workdir, "cache"),
+        "GROK_API_KEY": "mock-key",
+        "Submissions_PAT_21May": "mock-token",
+        "TSM2_INFO_EMAIL": "mock-password",
+    })
+    if not args.cache:
+        env["TSM2_CACHE_MAX_BYTES"] = "0"
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    return env
+
+
+def scratch_dir():
+    """Working directory for the portal: its own uploads/ and cache/, the real static files."""
+    workdir = tempfile.mkdtemp(prefix="tsm2-loadbench-")
+    os.makedirs(os.path.join(workdir, "uploads"))
+    for name in ("index.html", "public"):
+        if os.path.exists(os.path.join(ROOT, name)):
+            os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+    return workdir
+
+
+def get_json(port, path, timeout=10):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if get_json(port, "/api/status")[0] == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+class ProcessSampler:
+    """Peak RSS and thread count of a process, from /proc/<pid>/status."""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_kb = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def read(self):
+        fields = {}
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    fields[name] = value.split()[0] if value.split() else ""
+        except OSError:
+            return
+        self.peak_rss_kb = max(self.peak_rss_kb, int(fields.get("VmHWM", 0)), int(fields.get("VmRSS", 0)))
+        self.peak_threads = max(self.peak_threads, int(fields.get("Threads", 0)))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.read()
+
+    def start(self):
+        self.read()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.read()
+
+
+def submission_body(pdf_path, pdf_bytes, n):
+    """multipart/form-data body shaped like the browser's FormData submission."""
+    title = f"Load test submission {n}"
+    form = {
+        "submission_title": title,
+        "core_claim": "Load test core claim.",
+        "primary_scale": "Mesoscopic",
+        "criteria_terms": True,
+        "criteria_mechanism": True,
+        "criteria_test_path": True,
+        "criteria_falsifiability": True,
+        "criteria_transparency": True,
+        "criteria_selection": True,
+        "criteria_predictions": True,
+        "criteria_reproducibility": True,
+        "declaration": True,
+    }
+    user = {
+        "name": f"Load Test {n}",
+        "email": f"loadtest{n}@example.com",
+        "organization": "TSM2 load benchmark",
+        "phone": "",
+        "website": "",
+    }
+    fields = [
+        ("title", f"[TSM2-SUB] {title}"),
+        ("body", f"## {title}\n\nSubmitted by loadbench.py."),
+        ("userInfo", json.dumps(user)),
+        ("formData", json.dumps(form)),
+    ]
+    parts = []
+    for name, value in fields:
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8"))
+    filename = os.path.basename(pdf_path)
+    parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="pdf"; filename="{filename}"\r\n'
+                 f'Content-Type: application/pdf\r\n\r\n'.encode("utf-8"))
+    parts.append(pdf_bytes)
+    parts.append(f"\r\n--{BOUNDARY}--\r\n".encode("ascii"))
+    return b"".join(parts)
+
+
+def submit(port, body, job_mode, timeout):
+    """(outcome, HTTP status, seconds) for one submission, waiting for its job in job mode."""
+    started = time.monotonic()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("POST", "/api/submit?mode=async" if job_mode else "/api/submit", body=body, headers={
+            "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+        })
+        response = conn.getresponse()
+        data = json.loads(response.read() or b"null") or {}
+    except (OSError, ValueError, http.client.HTTPException):
+        return "error", None, time.monotonic() - started
+    finally:
+        conn.close()
+    status = response.status
+    if job_mode and status == 202:
+        status_url = data["status_url"]
+        while time.monotonic() - started < timeout:
+            time.sleep(0.2)
+            try:
+                status, data = get_json(port, status_url)
+            except (OSError, ValueError, http.client.HTTPException):
+                return "error", None, time.monotonic() - started
+            if data.get("status") in ("completed", "failed"):
+                data = data.get("result") or {"error": data.get("error")}
+                break
+        else:
+            return "timeout", status, time.monotonic() - started
+    elapsed = time.monotonic() - started
+    if status == 200 and data.get("success"):
+        return "ok", status, elapsed
+    if status == 503:
+        return "rejected", status, elapsed
+    return "failed", status, elapsed
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile; None for no values."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def settle(port, timeout):
+    """Wait until the SMTP sink has had no new message for a second (email is sent after the response)."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        state = get_json(port, "/_mock/state")[1]
+        seen = (state["smtp_messages"], state["smtp_errors"])
+        if seen == last:
+            return state
+        last = seen
+        time.sleep(1.0)
+    return get_json(port, "/_mock/state")[1]
+
+
+def stand_in_options(args):
+    return {
+        "github_rate_limit": args.github_rate_limit,
+        "github_latency": args.github_latency,
+        "github_errors": args.github_errors,
+        "xai_latency": args.xai_latency,
+        "xai_errors": args.xai_errors,
+        "smtp_latency": args.smtp_latency,
+        "smtp_errors": args.smtp_errors,
+    }
+
+
+def run_benchmark(args):
+    pdf_paths = sorted(args.pdfs or glob.glob(os.path.join(ROOT, "pdfs", "*.pdf")))
+    if not pdf_paths:
+        print("No PDFs to submit (pdfs/ is empty)", file=sys.stderr)
+        return 1
+    pdfs = []
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            pdfs.append((path, f.read()))
+
+    ctx = multiprocessing.get_context("spawn")
+    port_queue = ctx.Queue()
+    child = ctx.Process(target=_serve_child, args=(port_queue, stand_in_options(args)), daemon=True)
+    child.start()
+    ports = port_queue.get(timeout=30)
+    github_port, xai_port, smtp_port = ports
+
+    workdir = scratch_dir()
+    port = free_port()
+    log_path = args.log or os.path.join(workdir, "server.log")
+    log = open(log_path, "wb")
+    portal = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "server.py")],
+        cwd=workdir, env=portal_env(args, ports, port, workdir), stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        if not wait_ready(port, portal):
+            log.flush()
+            with open(log_path, "rb") as f:
+                tail = f.read()[-4000:].decode("utf-8", "replace")
+            print(f"Portal did not start; log tail:\n{tail}", file=sys.stderr)
+            return 1
+        print(f"Portal ({args.server_mode}) on port {port}; GitHub mock :{github_port}, "
+              f"x.ai mock :{xai_port}, SMTP sink :{smtp_port}", file=sys.stderr)
+
+        sampler = ProcessSampler(portal.pid)
+        sampler.start()
+        results = []
+        lock = threading.Lock()
+
+        def one(n):
+            path, data = pdfs[n % len(pdfs)]
+            outcome = submit(port, submission_body(path, data, n), args.job_mode, args.timeout)
+            with lock:
+                results.append(outcome)
+                done = len(results)
+            if done % max(1, args.requests // 10) == 0:
+                print(f"[LOADBENCH] {done}/{args.requests} done", file=sys.stderr)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(one, range(args.requests)))
+        elapsed = time.monotonic() - started
+
+        stand_ins = settle(xai_port, args.settle)
+        sampler.stop()
+        github_state = get_json(github_port, "/_mock/state")[1]
+        portal_status = get_json(port, "/api/status")[1]
+    finally:
+        portal.send_signal(signal.SIGTERM)
+        try:
+            portal.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            portal.kill()
+        log.close()
+        child.terminate()
+        if not args.log:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    outcomes = {}
+    statuses = {}
+    for outcome, status, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sorted(seconds for outcome, _, seconds in results if outcome == "ok")
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "server_mode": args.server_mode,
+            "job_mode": args.job_mode,
+            "cache": args.cache,
+            "pdfs": [os.path.basename(p) for p in pdf_paths],
+            "env": args.env,
+            "stand_ins": stand_in_options(args),
+        },
+        "outcomes": outcomes,
+        "http_status": statuses,
+        "latency": {
+            "p50": percentile(ok, 50),
+            "p95": percentile(ok, 95),
+            "p99": percentile(ok, 99),
+            "mean": sum(ok) / len(ok) if ok else None,
+            "max": ok[-1] if ok else None,
+        },
+        "seconds": round(elapsed, 3),
+        "throughput": {
+            "submissions_per_second": round(len(ok) / elapsed, 3) if elapsed else None,
+            "requests_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        },
+        "server": {
+            "peak_rss_mb": round(sampler.peak_rss_kb / 1024, 1),
+            "peak_threads": sampler.peak_threads,
+            "status": portal_status,
+        },
+        "stand_ins": {
+            "github": {k: github_state[k] for k in ("requests", "commits", "issues", "injected_errors")},
+            "xai": {k[4:]: v for k, v in stand_ins.items() if k.startswith("xai_")},
+            "smtp": {k[5:]: v for k, v in stand_ins.items() if k.startswith("smtp_")},
+        },
+    }
+    for name in ("p50", "p95", "p99", "mean", "max"):
+        if report["latency"][name] is not None:
+            report["latency"][name] = round(report["latency"][name], 3)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if not args.verbose:
+        del report["server"]["status"]
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDFs to submit (default: pdfs/*.pdf)")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--server-mode", choices=("pooled", "threading", "asyncio"), default="pooled")
+    parser.add_argument("--job-mode", action="store_true", help="submit with ?mode=async and time until the job is done")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache on")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per submission")
+    parser.add_argument("--settle", type=float, default=30, help="seconds to wait for queued email afterwards")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra portal setting")
+    parser.add_argument("--json", help="also write the report (with /api/status) to this file")
+    parser.add_argument("--log", help="keep the portal's log in this file")
+    parser.add_argument("--verbose", action="store_true", help="include the portal's /api/status in the report")
+    parser.add_argument("--github-latency", type=float, default=0.0, help="seconds per GitHub API request")
+    parser.add_argument("--github-errors", type=float, default=0.0, help="share of GitHub API requests answered 502")
+    parser.add_argument("--github-rate-limit", type=int, default=5000, help="GitHub requests per hour before 403")
+    parser.add_argument("--xai-latency", type=float, default=0.0, help="seconds before each x.ai reply")
+    parser.add_argument("--xai-errors", type=float, default=0.0, help="share of x.ai requests answered 503")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="seconds per message at the SMTP sink")
+    parser.add_argument("--smtp-errors", type=float, default=0.0, help="share of messages refused with 451")
+    parser.add_argument("--serve", action="store_true", help="only run the stand-in services")
+    parser.add_argument("--ports", default="8900,8901,8902", help="GitHub,x.ai,SMTP ports (--serve)")
+    args = parser.parse_args()
+    if args.serve:
+        ports = tuple(int(p) for p in args.ports.split(","))
+        servers = make_stand_ins(stand_in_options(args), ports)
+        github, xai, smtp = (s.server_address[1] for s in servers)
+        print(f"GitHub mock on http://127.0.0.1:{github}, x.ai mock on "
+              f"http://127.0.0.1:{xai}/v1/chat/completions, SMTP sink on 127.0.0.1:{smtp}", file=sys.stderr)
+        for s in servers[1:]:
+            threading.Thread(target=s.serve_forever, daemon=True).start()
+        servers[0].serve_forever()
+        return 0
+    return run_benchmark(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""Structured, queue-backed logging for the TSM2 Submission Portal.
+
+Call sites build a small record and put it on a bounded in-memory queue:
+
+    logutil.info("GITHUB PDF", f"Uploaded: {url}", url=url)
+    logutil.error("GROK", "Compliance check failed", status=e.code)
+
+A single writer thread drains the queue in batches. It does all the
+formatting, redaction and file I/O, so request threads and the event loop
+never block on stderr or the disk. When the queue is full the record is
+dropped and counted rather than waited for.
+
+Every record is one JSON object per line in TSM2_LOG_FILE. The file
+rotates at TSM2_LOG_MAX_BYTES, keeping TSM2_LOG_BACKUPS old files. It
+lives in DATA_DIR (TSM2_DATA_DIR, default $XDG_STATE_HOME/tsm2-portal),
+outside the working directory the server serves files from. The
+console (stderr) gets a short text line by default. Records carry the
+fields bound for the current request or job, so one grep for a request_id
+finds every line that request produced. That includes its background
+emails and label updates.
+
+Submitter PII is never written. Any email address is masked, and the
+values from the submitter's user_info (name, organization, phone, website)
+are replaced wherever they appear once protect() has been called for the
+request. Fields named like PII keys are redacted whole.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+import traceback
+import contextlib
+import contextvars
+
+
+# Private state (logs, and the scorecard database in scorestore) is kept
+# here, never under the working directory: that is served over HTTP.
+DATA_DIR = os.environ.get("TSM2_DATA_DIR") or os.path.join(
+    os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state"), "tsm2-portal")
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LOG_LEVEL = LEVELS.get(os.environ.get("TSM2_LOG_LEVEL", "INFO").upper(), 20)
+LOG_FILE = os.environ.get("TSM2_LOG_FILE", os.path.join(DATA_DIR, "logs", "portal.log"))
+LOG_MAX_BYTES = int(os.environ.get("TSM2_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("TSM2_LOG_BACKUPS", "5"))
+LOG_STDERR = os.environ.get("TSM2_LOG_STDERR", "text").lower()
+LOG_QUEUE_SIZE = int(os.environ.get("TSM2_LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH = 256
+
+PII_KEYS = {"name", "email", "organization", "phone", "website", "user_info", "to_address", "submitter_email"}
+EMAIL_RE = re.compile(r"([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+REDACTED = "[redacted]"
+
+_context = contextvars.ContextVar("tsm2_log_context", default={})
+_secrets = contextvars.ContextVar("tsm2_log_secrets", default=())
+
+
+def new_request_id(candidate=None):
+    """A correlation id: the caller's X-Request-ID if it looks safe, else a fresh one."""
+    if candidate and REQUEST_ID_RE.match(candidate):
+        return candidate
+    return uuid.uuid4().hex[:16]
+
+
+@contextlib.contextmanager
+def scope(**fields):
+    """A fresh logging context for one request: only these fields, nothing protected yet.
+
+    Handler threads and connection tasks serve many keep-alive requests,
+    so each request starts clean and leaves nothing behind.
+    """
+    with restore((fields, ())):
+        yield
+
+
+@contextlib.contextmanager
+def bind(**fields):
+    """Attach fields (request_id, job_id, ...) to every record logged inside the block."""
+    token = _context.set(dict(_context.get(), **fields))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def update(**fields):
+    """Change fields of the enclosing scope() or bind() in place."""
+    _context.set(dict(_context.get(), **fields))
+
+
+def get(name, default=None):
+    return _context.get().get(name, default)
+
+
+def current():
+    """(bound fields, protected values) for handing to another thread; see restore()."""
+    return _context.get(), _secrets.get()
+
+
+@contextlib.contextmanager
+def restore(saved):
+    """Re-enter a context captured with current(), e.g. on a queue worker thread."""
+    fields, secrets = saved or ({}, ())
+    field_token = _context.set(fields)
+    secret_token = _secrets.set(secrets)
+    try:
+        yield
+    finally:
+        _secrets.reset(secret_token)
+        _context.reset(field_token)
+
+
+def protect(user_info):
+    """Redact this submitter's personal details from everything logged for the request."""
+    if not isinstance(user_info, dict):
+        return
+    values = [str(user_info.get(key) or "").strip() for key in PII_KEYS]
+    values = tuple(v for v in values if len(v) >= 3)
+    if values:
+        # Longest first, so a full name is replaced before a part of it.
+        _secrets.set(tuple(sorted(set(_secrets.get() + values), key=len, reverse=True)))
+
+
+def redact(value, secrets=()):
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+        return EMAIL_RE.sub(r"\1***@\2", value)
+    if isinstance(value, dict):
+        return {k: REDACTED if k in PII_KEYS else redact(v, secrets) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v, secrets) for v in value]
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return redact(str(value), secrets)
+
+
+class LogWriter:
+    """Bounded record queue plus the thread that formats and writes it."""
+
+    def __init__(self, path=LOG_FILE, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                 console=LOG_STDERR, maxsize=LOG_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.console = console
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._size = 0
+        self._counts = {"written": 0, "dropped": 0, "rotations": 0, "write_errors": 0}
+
+    def put(self, record):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped"] += 1
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < LOG_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._write([r for r in batch if r is not None])
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records):
+        lines, console = [], []
+        for record in records:
+            secrets = record.pop("_secrets", ())
+            record = redact(record, secrets)
+            lines.append((json.dumps(record, default=str) + "\n").encode("utf-8"))
+            if self.console == "json":
+                console.append(lines[-1].decode("utf-8"))
+            elif self.console == "text":
+                console.append(format_text(record))
+        if console:
+            try:
+                sys.stderr.write("".join(console))
+                sys.stderr.flush()
+            except (OSError, ValueError):
+                pass
+        if self.path:
+            try:
+                self._append(lines)
+            except OSError as e:
+                self._file = None
+                with self._lock:
+                    self._counts["write_errors"] += 1
+                try:
+                    sys.stderr.write(f"[LOG ERROR] Cannot write {self.path}: {e}\n")
+                except (OSError, ValueError):
+                    pass
+        with self._lock:
+            self._counts["written"] += len(records)
+
+    def _append(self, lines):
+        """Write encoded lines with one flush, rotating before any line that would pass max_bytes."""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        pending = []
+        for line in lines:
+            if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+                self._file.write(b"".join(pending))
+                pending = []
+                self._rotate()
+            pending.append(line)
+            self._size += len(line)
+        self._file.write(b"".join(pending))
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+        self._size = 0
+        with self._lock:
+            self._counts["rotations"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, queue_depth=self._queue.qsize())
+
+    def shutdown(self, timeout=5):
+        """Write out what is queued, then stop the writer thread."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def format_text(record):
+    """Console form of a record: time, level, [TAG] message, then the extra fields."""
+    extra = {k: v for k, v in record.items() if k not in ("ts", "level", "tag", "msg", "exc")}
+    line = f"{record['ts'][11:19]} {record['level']:<7} [{record['tag']}] {record['msg']}"
+    if extra:
+        line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+    if record.get("exc"):
+        line += "\n" + record["exc"].rstrip()
+    return line + "\n"
+
+
+WRITER = LogWriter()
+atexit.register(WRITER.shutdown)
+
+
+def enabled(level):
+    return LEVELS[level] >= LOG_LEVEL
+
+
+def log(level, tag, msg, exc_info=False, **fields):
+    """Queue one record if level is enabled. Never blocks and never raises."""
+    if LEVELS[level] < LOG_LEVEL:
+        return
+    now = time.time()
+    record = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1000):03d}Z",
+        "level": level,
+        "tag": tag,
+        "msg": msg,
+    }
+    record.update(_context.get())
+    record.update(fields)
+    if exc_info:
+        record["exc"] = traceback.format_exc()
+    secrets = _secrets.get()
+    if secrets:
+        record["_secrets"] = secrets
+    WRITER.put(record)
+
+
+def debug(tag, msg, **fields):
+    log("DEBUG", tag, msg, **fields)
+
+
+def info(tag, msg, **fields):
+    log("INFO", tag, msg, **fields)
+
+
+def warning(tag, msg, **fields):
+    log("WARNING", tag, msg, **fields)
+
+
+def error(tag, msg, **fields):
+    log("ERROR", tag, msg, **fields)
+
+
+def exception(tag, msg, **fields):
+    """error() plus the traceback of the exception being handled."""
+    log("ERROR", tag, msg, exc_info=True, **fields)
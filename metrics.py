@@ -0,0 +1,239 @@
+"""Timing spans, counters and histograms, served as Prometheus text at GET /metrics.
+
+Every submission stage runs inside a span: jobs.track opens one around each
+stage in both synchronous and job mode. Multipart parsing and the work that
+outlives the request (SMTP delivery in emailutil, the follow-up label
+request) have spans of their own. A span observes its duration into
+tsm2_stage_duration_seconds{stage, outcome}. The outcome is "ok" unless the
+block raised or marked the span failed.
+
+Alongside the stage histogram:
+
+- tsm2_submissions_total and tsm2_submission_duration_seconds, by outcome
+  and page-count bucket;
+- tsm2_pdf_analysis_duration_seconds by page-count bucket;
+- tsm2_grok_request_duration_seconds by model and outcome (grokapi);
+- tsm2_emails_total by outcome;
+- readings taken from the existing stats() at scrape time (server.py
+  registers them): submissions in flight and rejected, jobs by status,
+  email queue depth, GitHub quota.
+
+Everything is in memory and per process. Prometheus computes rates and
+quantiles from the buckets, e.g.
+
+    histogram_quantile(0.99, sum by (le, stage) (rate(tsm2_stage_duration_seconds_bucket[5m])))
+
+No client library is needed.
+"""
+
+import math
+import time
+import threading
+import contextlib
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+PAGE_BUCKETS = ((4, "1-4"), (19, "5-19"), (49, "20-49"))
+
+
+def page_bucket(pages):
+    """Low-cardinality label for a page count: "0", "1-4", "5-19", "20-49" or "50+"."""
+    if not pages:
+        return "0"
+    for limit, label in PAGE_BUCKETS:
+        if pages <= limit:
+            return label
+    return "50+"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((self.name + "_bucket", names, key + (_format_number(float(bound)),), cumulative))
+            samples.append((self.name + "_sum", self.labelnames, key, total))
+            samples.append((self.name + "_count", self.labelnames, key, cumulative))
+        return samples
+
+
+class Reading:
+    """A value read at scrape time: read() returns a number, or {label values tuple: number}.
+
+    kind is "gauge", or "counter" for a running total kept elsewhere.
+    """
+
+    def __init__(self, name, help, read, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [(self.name, self.labelnames, tuple(str(v) for v in key), number)
+                for key, number in sorted(value.items()) if number is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add metric, replacing one of the same name (server.py can be imported twice, as __main__ and server)."""
+        with self._lock:
+            self._metrics = [m for m in self._metrics if m.name != metric.name] + [metric]
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, values, number in samples:
+                lines.append(f"{name}{_format_labels(labelnames, values)} {_format_number(number)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def histogram(name, help, labelnames=(), buckets=DURATION_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def reading(name, help, read, labelnames=(), kind="gauge"):
+    return REGISTRY.register(Reading(name, help, read, labelnames, kind))
+
+
+STAGE_SECONDS = histogram(
+    "tsm2_stage_duration_seconds", "Time spent in each submission stage and background task.", ("stage", "outcome"))
+SUBMISSIONS = counter(
+    "tsm2_submissions_total", "Processed submissions by outcome and page count.", ("outcome", "pages"))
+SUBMISSION_SECONDS = histogram(
+    "tsm2_submission_duration_seconds", "Time from stored PDF to response, by outcome and page count.", ("outcome", "pages"))
+PDF_ANALYSIS_SECONDS = histogram(
+    "tsm2_pdf_analysis_duration_seconds", "PDF text extraction and rendering time by page count.", ("pages",))
+GROK_SECONDS = histogram(
+    "tsm2_grok_request_duration_seconds", "Grok chat completion requests by model and outcome.", ("model", "outcome"))
+EMAILS = counter(
+    "tsm2_emails_total", "Email delivery attempts by outcome.", ("outcome",))
+
+
+class Span:
+    """A timed block; call fail() for a failure that was handled without raising."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.outcome = "ok"
+        self.seconds = None
+
+    def fail(self, outcome="error"):
+        self.outcome = outcome
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the block into tsm2_stage_duration_seconds{stage, outcome}; yields the Span."""
+    current = Span(stage)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.fail()
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(current.seconds, stage=stage, outcome=current.outcome)
+
+
+def record_submission(outcome, pages, seconds):
+    bucket = page_bucket(pages)
+    SUBMISSIONS.inc(outcome=outcome, pages=bucket)
+    SUBMISSION_SECONDS.observe(seconds, outcome=outcome, pages=bucket)
+
+
+def outcome_for_status(status):
+    """"ok" for 2xx, else "4xx"/"5xx"; "error" when there was no HTTP response."""
+    if status is None:
+        return "error"
+    return "ok" if 200 <= status < 300 else f"{status // 100}xx"
@@ -0,0 +1,356 @@
+"""Local mock of the GitHub API endpoints the portal uses, plus an upload harness.
+
+Serves, in memory: Git Data API blobs, refs, commits and trees, the
+Contents API (PUT), and issues, labels and comments. A ref update that is
+not a fast-forward gets 422, as on GitHub. Responses carry X-RateLimit-*
+headers, and requests past the configured quota get 403 until the window
+resets. Every API request can be delayed (latency) and a share of them
+answered 502 (error_rate). GET /_mock/state reports what was committed
+(SHA-256 of every file on each branch), the commit count, the largest
+request body, the request count, the comments per issue and the injected
+errors.
+
+Run the upload harness:
+
+    python mock_github.py [--files N] [--size-mb M] [--mode gitdata|contents] [pdf ...]
+
+It starts the mock in a child process and points the portal at it
+(TSM2_GITHUB_API_URL). It then uploads the given PDFs, or N generated
+files of M MiB, concurrently through server.upload_pdf_to_github and
+checks that every file landed byte for byte. It reports the number of
+commits and the uploading process's peak traced memory.
+
+Serve only: python mock_github.py --serve [--port P] [--latency S] [--error-rate R]
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+
+def git_sha(kind, data):
+    return hashlib.sha1(f"{kind} {len(data)}\0".encode() + data).hexdigest()
+
+
+class MockGitHub:
+    """In-memory repository state shared by the handler threads."""
+
+    def __init__(self, rate_limit=5000, rate_window=3600, latency=0.0, error_rate=0.0):
+        self.lock = threading.RLock()
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.latency = latency
+        self.error_rate = error_rate
+        self.injected_errors = 0
+        self.rate_used = 0
+        self.rate_reset = time.time() + rate_window
+        self.blobs = {}
+        self.trees = {"empty": {}}
+        self.commits = {}
+        root = self._commit("Initial commit", "empty", [])
+        self.refs = {"main": root}
+        self.issues = []
+        self.comments = {}
+        self.commit_count = 0
+        self.requests = 0
+        self.max_body = 0
+
+    def _commit(self, message, tree, parents):
+        sha = git_sha("commit", json.dumps([message, tree, parents, time.time()]).encode())
+        self.commits[sha] = {"message": message, "tree": tree, "parents": parents}
+        return sha
+
+    def inject_error(self):
+        """Sleep for the configured latency; True if this request should fail."""
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.error_rate or random.random() >= self.error_rate:
+            return False
+        with self.lock:
+            self.injected_errors += 1
+        return True
+
+    def take_quota(self):
+        """Count a request against the primary rate limit; False when exhausted."""
+        now = time.time()
+        if now >= self.rate_reset:
+            self.rate_used = 0
+            self.rate_reset = now + self.rate_window
+        if self.rate_used >= self.rate_limit:
+            return False
+        self.rate_used += 1
+        return True
+
+    def rate_headers(self):
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(0, self.rate_limit - self.rate_used)),
+            "X-RateLimit-Used": str(self.rate_used),
+            "X-RateLimit-Reset": str(int(self.rate_reset)),
+            "X-RateLimit-Resource": "core",
+        }
+
+    def files(self, branch):
+        tree = self.trees[self.commits[self.refs[branch]]["tree"]]
+        return {path: hashlib.sha256(self.blobs[sha]).hexdigest() for path, sha in tree.items()}
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def read_request_body(handler):
+    """Raw request body, Content-Length or chunked."""
+    if handler.headers.get("Transfer-Encoding", "").lower() == "chunked":
+        parts = []
+        while True:
+            size = int(handler.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                handler.rfile.readline()
+                break
+            parts.append(handler.rfile.read(size))
+            handler.rfile.readline()
+        return b"".join(parts)
+    return handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        body = read_request_body(self)
+        with self.state.lock:
+            self.state.requests += 1
+            self.state.max_body = max(self.state.max_body, len(body))
+        return json.loads(body) if body else None
+
+    def reply(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        with self.state.lock:
+            rate_headers = self.state.rate_headers()
+        for name, value in rate_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, method):
+        payload = self.read_body()
+        parts = self.path.split("?")[0].strip("/").split("/")
+        state = self.state
+        if parts == ["_mock", "state"]:
+            with state.lock:
+                return self.reply(200, {
+                    "branches": {branch: state.files(branch) for branch in state.refs},
+                    "commits": state.commit_count,
+                    "issues": len(state.issues),
+                    "comments": {number: len(bodies) for number, bodies in state.comments.items()},
+                    "requests": state.requests,
+                    "max_body": state.max_body,
+                    "injected_errors": state.injected_errors,
+                })
+        if len(parts) < 4 or parts[0] != "repos":
+            return self.reply(404, {"message": "Not Found"})
+        if state.inject_error():
+            return self.reply(502, {"message": "Server Error"})
+        owner, repo, rest = parts[1], parts[2], parts[3:]
+        with state.lock:
+            limited = not state.take_quota()
+        if limited:
+            return self.reply(403, {"message": "API rate limit exceeded"})
+        with state.lock:
+            if rest == ["git", "blobs"] and method == "POST":
+                data = base64.b64decode(payload["content"])
+                sha = git_sha("blob", data)
+                state.blobs[sha] = data
+                return self.reply(201, {"sha": sha})
+            if rest[:3] == ["git", "ref", "heads"] and method == "GET":
+                branch = "/".join(rest[3:])
+                if branch not in state.refs:
+                    return self.reply(404, {"message": "Not Found"})
+                return self.reply(200, {"object": {"sha": state.refs[branch], "type": "commit"}})
+            if rest[:2] == ["git", "commits"] and method == "GET":
+                commit = state.commits.get(rest[2])
+                if commit is None:
+                    return self.reply(404, {"message": "Not Found"})
+                return self.reply(200, {"sha": rest[2], "tree": {"sha": commit["tree"]}, "parents": commit["parents"]})
+            if rest == ["git", "trees"] and method == "POST":
+                tree = dict(state.trees.get(payload.get("base_tree"), {}))
+                for entry in payload["tree"]:
+                    if entry["sha"] not in state.blobs:
+                        return self.reply(422, {"message": f"Invalid blob {entry['sha']}"})
+                    tree[entry["path"]] = entry["sha"]
+                sha = git_sha("tree", json.dumps(sorted(tree.items())).encode())
+                state.trees[sha] = tree
+                return self.reply(201, {"sha": sha})
+            if rest == ["git", "commits"] and method == "POST":
+                sha = state._commit(payload["message"], payload["tree"], payload["parents"])
+                return self.reply(201, {"sha": sha})
+            if rest[:3] == ["git", "refs", "heads"] and method == "PATCH":
+                branch = "/".join(rest[3:])
+                if state.commits[payload["sha"]]["parents"] != [state.refs[branch]] and not payload.get("force"):
+                    return self.reply(422, {"message": "Update is not a fast forward"})
+                state.refs[branch] = payload["sha"]
+                state.commit_count += 1
+                return self.reply(200, {"object": {"sha": payload["sha"]}})
+            if rest[0] == "contents" and method == "PUT":
+                path = "/".join(rest[1:])
+                branch = payload.get("branch", "main")
+                tree = dict(state.trees[state.commits[state.refs[branch]]["tree"]])
+                if path in tree:
+                    return self.reply(422, {"message": "sha wasn't supplied"})
+                data = base64.b64decode(payload["content"])
+                blob = git_sha("blob", data)
+                state.blobs[blob] = data
+                tree[path] = blob
+                tree_sha = git_sha("tree", json.dumps(sorted(tree.items())).encode())
+                state.trees[tree_sha] = tree
+                state.refs[branch] = state._commit(payload["message"], tree_sha, [state.refs[branch]])
+                state.commit_count += 1
+                url = f"https://raw.githubusercontent.com/{owner}/{repo}/{branch}/{path}"
+                return self.reply(201, {"content": {"path": path, "download_url": url}})
+            if rest == ["issues"] and method == "POST":
+                state.issues.append(payload)
+                number = len(state.issues)
+                return self.reply(201, {
+                    "number": number,
+                    "html_url": f"https://github.com/{owner}/{repo}/issues/{number}",
+                    "labels": [{"name": label} for label in payload.get("labels", [])],
+                })
+            if rest[0] == "issues" and rest[-1] == "labels" and method == "POST":
+                return self.reply(200, [{"name": label} for label in payload.get("labels", [])])
+            if rest[0] == "issues" and rest[-1] == "comments" and method == "POST":
+                state.comments.setdefault(rest[1], []).append(payload.get("body", ""))
+                return self.reply(201, {"id": sum(len(b) for b in state.comments.values()), "body": payload.get("body", "")})
+        return self.reply(404, {"message": "Not Found"})
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PATCH(self):
+        self.route("PATCH")
+
+    def do_PUT(self):
+        self.route("PUT")
+
+
+def make_mock_server(port=0, rate_limit=5000, rate_window=3600, latency=0.0, error_rate=0.0):
+    MockHandler.state = MockGitHub(rate_limit, rate_window, latency, error_rate)
+    return ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+
+
+def _serve_child(port_queue):
+    server = make_mock_server()
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def run_harness(args):
+    ctx = multiprocessing.get_context("spawn")
+    port_queue = ctx.Queue()
+    child = ctx.Process(target=_serve_child, args=(port_queue,), daemon=True)
+    child.start()
+    port = port_queue.get(timeout=30)
+    os.environ["TSM2_GITHUB_API_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["TSM2_GITHUB_UPLOAD"] = args.mode
+    # Pacing writes would dominate the timings; the harness measures uploads.
+    os.environ.setdefault("TSM2_GITHUB_WRITE_INTERVAL", "0")
+
+    import tracemalloc
+    import server
+    import httppool
+
+    paths = list(args.pdfs)
+    os.makedirs("uploads", exist_ok=True)
+    for i in range(args.files if not paths else 0):
+        path = os.path.join("uploads", f"mock_{i}_{os.getpid()}.pdf")
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        paths.append(path)
+
+    tracemalloc.start()
+    results = {}
+    started = time.monotonic()
+
+    def upload(path):
+        name = f"{os.getpid()}_{os.path.basename(path)}"
+        results[path] = (name, server.upload_pdf_to_github(path, name, "mock-token"))
+
+    threads = [threading.Thread(target=upload, args=(p,)) for p in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    state = httppool.HTTP_POOL.request("GET", f"http://127.0.0.1:{port}/_mock/state").json()
+    committed = state["branches"]["main"]
+    ok = True
+    for path, (name, (url, success)) in results.items():
+        with open(path, "rb") as f:
+            expected = hashlib.sha256(f.read()).hexdigest()
+        landed = committed.get(f"{server.GITHUB_PDF_DIR}/{name}") == expected
+        ok = ok and success and landed
+        print(f"{'OK ' if success and landed else 'BAD'} {path} -> {url}")
+    total = sum(os.path.getsize(p) for p in paths)
+    print(json.dumps({
+        "mode": args.mode,
+        "files": len(paths),
+        "bytes": total,
+        "commits": state["commits"],
+        "requests": state["requests"],
+        "largest_request_body": state["max_body"],
+        "peak_traced_memory": peak,
+        "seconds": round(elapsed, 2),
+    }, indent=2))
+    if not args.pdfs:
+        for path in paths:
+            os.remove(path)
+    child.terminate()
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDFs to upload (default: generated files)")
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--mode", choices=("gitdata", "contents"), default="gitdata")
+    parser.add_argument("--serve", action="store_true", help="only run the mock server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--rate-limit", type=int, default=5000, help="requests per window before 403 (--serve)")
+    parser.add_argument("--rate-window", type=int, default=3600, help="rate limit window in seconds (--serve)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API request (--serve)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API requests answered 502 (--serve)")
+    args = parser.parse_args()
+    if args.serve:
+        server = make_mock_server(args.port, args.rate_limit, args.rate_window, args.latency, args.error_rate)
+        print(f"Mock GitHub API on http://127.0.0.1:{server.server_address[1]}", file=sys.stderr)
+        server.serve_forever()
+        return 0
+    return run_harness(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
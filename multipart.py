@@ -0,0 +1,293 @@
+"""Streaming multipart/form-data parser for the TSM2 Submission Portal.
+
+The request body is read from the socket in fixed-size chunks. File parts
+(the submission PDF) are written straight to a temporary file in uploads/
+and hashed as they arrive; only the small text fields (title, body,
+userInfo, formData) are kept in memory. Peak memory per upload is therefore
+a few chunks, regardless of how large the PDF is.
+
+Disk use per request is bounded too: a body larger than the file limit
+plus MAX_BODY_OVERHEAD is refused with 413 from its Content-Length, before
+anything is read, and a file field that appears twice is refused with 400.
+"""
+
+import os
+import re
+import uuid
+import hashlib
+
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_FIELD_SIZE = 1024 * 1024
+# Room for the text fields and part headers on top of the file itself.
+MAX_BODY_OVERHEAD = 8 * 1024 * 1024
+HEAD_BYTES = 1024
+
+
+class MultipartError(Exception):
+    """Raised when the body is malformed or exceeds a size limit.
+
+    `status` is the HTTP status the handler should answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadedFile:
+    """A file part that has been spooled to disk."""
+
+    def __init__(self, field_name, filename, path):
+        self.field_name = field_name
+        self.filename = filename
+        self.path = path
+        self.size = 0
+        self.head = b""
+        self._hash = hashlib.sha256()
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def get_boundary(content_type):
+    match = re.search(r'boundary=(?:"([^"]+)"|([^;\s]+))', content_type or "")
+    if not match:
+        raise MultipartError("Missing multipart boundary")
+    return (match.group(1) or match.group(2)).encode("latin-1")
+
+
+def _parse_part_headers(raw):
+    text = raw.decode("utf-8", errors="ignore")
+    name = None
+    filename = None
+    for line in text.split("\r\n"):
+        if not line.lower().startswith("content-disposition:"):
+            continue
+        name_match = re.search(r'(?:^|[;\s])name="([^"]*)"', line)
+        if name_match:
+            name = name_match.group(1)
+        file_match = re.search(r'filename="([^"]*)"', line)
+        if file_match:
+            filename = file_match.group(1)
+    return name, filename
+
+
+class _FieldSink:
+    def __init__(self, name, max_size):
+        self.name = name
+        self.max_size = max_size
+        self.data = bytearray()
+
+    def write(self, chunk):
+        if len(self.data) + len(chunk) > self.max_size:
+            raise MultipartError(f'Form field "{self.name}" is too large', status=413)
+        self.data += chunk
+
+    def close(self):
+        pass
+
+
+class _FileSink:
+    def __init__(self, upload, max_size):
+        self.upload = upload
+        self.max_size = max_size
+        self.fh = open(upload.path, "wb")
+
+    def write(self, chunk):
+        upload = self.upload
+        if upload.size + len(chunk) > self.max_size:
+            raise MultipartError(
+                f"File size exceeds {self.max_size // (1024 * 1024)}MB limit",
+                status=413,
+            )
+        if len(upload.head) < HEAD_BYTES:
+            upload.head += chunk[:HEAD_BYTES - len(upload.head)]
+        upload._hash.update(chunk)
+        upload.size += len(chunk)
+        self.fh.write(chunk)
+
+    def close(self):
+        self.fh.close()
+
+
+class MultipartParser:
+    """Push parser: feed() body chunks as they arrive, then close().
+
+    parse_multipart drives it from a blocking stream; the asyncio server
+    feeds it from a StreamReader. File parts go straight to disk as in
+    parse_multipart, so the parser only ever buffers about one chunk.
+    """
+
+    def __init__(self, content_type, upload_dir="uploads",
+                 max_file_size=100 * 1024 * 1024, max_field_size=MAX_FIELD_SIZE, content_length=None):
+        self.delimiter = b"\r\n--" + get_boundary(content_type)
+        self.upload_dir = upload_dir
+        self.max_file_size = max_file_size
+        self.max_field_size = max_field_size
+        self.max_body_size = max_file_size + MAX_BODY_OVERHEAD
+        if content_length is not None and content_length > self.max_body_size:
+            raise MultipartError(
+                f"Request body exceeds {self.max_body_size // (1024 * 1024)}MB limit", status=413,
+            )
+        self.received = 0
+        os.makedirs(upload_dir, exist_ok=True)
+        # The first boundary is not preceded by CRLF; prepending one lets a
+        # single delimiter pattern match every boundary in the body.
+        self.buf = bytearray(b"\r\n")
+        self.state = "preamble"
+        self.sink = None
+        self.fields = {}
+        self.files = {}
+        self.done = False
+
+    def feed(self, data):
+        """Consume one chunk of the body; True once the closing boundary was seen.
+
+        Anything after the closing boundary (the epilogue) is ignored.
+        """
+        if self.done:
+            return True
+        self.received += len(data)
+        if self.received > self.max_body_size:
+            self.abort()
+            raise MultipartError(
+                f"Request body exceeds {self.max_body_size // (1024 * 1024)}MB limit", status=413,
+            )
+        self.buf.extend(data)
+        self._run(eof=False)
+        return self.done
+
+    def close(self):
+        """End of body. Returns (fields, files) as parse_multipart does."""
+        if not self.done:
+            self._run(eof=True)
+        return self.fields, self.files
+
+    def abort(self):
+        """Drop everything spooled so far (e.g. the client went away)."""
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+        for upload in self.files.values():
+            upload.discard()
+
+    def _run(self, eof):
+        try:
+            self._parse(eof)
+        except Exception:
+            self.abort()
+            raise
+
+    def _parse(self, eof):
+        buf = self.buf
+        delimiter = self.delimiter
+        while True:
+            if self.state == "preamble":
+                idx = buf.find(delimiter)
+                if idx == -1:
+                    del buf[:max(0, len(buf) - len(delimiter))]
+                    if eof:
+                        raise MultipartError("Malformed multipart body: no boundary found")
+                    return
+                del buf[:idx + len(delimiter)]
+                self.state = "after_delimiter"
+
+            elif self.state == "after_delimiter":
+                if len(buf) < 2 and not eof:
+                    return
+                if buf[:2] == b"--":
+                    self.done = True
+                    return
+                if buf[:2] != b"\r\n":
+                    raise MultipartError("Malformed multipart body")
+                del buf[:2]
+                self.state = "headers"
+
+            elif self.state == "headers":
+                idx = buf.find(b"\r\n\r\n")
+                if idx == -1:
+                    if len(buf) > MAX_HEADER_SIZE:
+                        raise MultipartError("Multipart part headers too large")
+                    if eof:
+                        raise MultipartError("Malformed multipart body: truncated headers")
+                    return
+                name, filename = _parse_part_headers(bytes(buf[:idx]))
+                del buf[:idx + 4]
+                if filename is not None:
+                    if name in self.files:
+                        raise MultipartError(f'File field "{name}" appears more than once')
+                    path = os.path.join(self.upload_dir, f".part-{uuid.uuid4().hex}")
+                    upload = UploadedFile(name, filename, path)
+                    self.files[name] = upload
+                    self.sink = _FileSink(upload, self.max_file_size)
+                else:
+                    self.sink = _FieldSink(name, self.max_field_size)
+                self.state = "body"
+
+            elif self.state == "body":
+                sink = self.sink
+                idx = buf.find(delimiter)
+                if idx != -1:
+                    sink.write(bytes(buf[:idx]))
+                    sink.close()
+                    if isinstance(sink, _FieldSink) and sink.name is not None:
+                        self.fields[sink.name] = sink.data.decode("utf-8", errors="ignore")
+                    self.sink = None
+                    del buf[:idx + len(delimiter)]
+                    self.state = "after_delimiter"
+                    continue
+                # Keep enough tail bytes to catch a delimiter split across reads.
+                keep = len(delimiter) - 1
+                if len(buf) > keep:
+                    sink.write(bytes(buf[:len(buf) - keep]))
+                    del buf[:len(buf) - keep]
+                if eof:
+                    raise MultipartError("Malformed multipart body: truncated part")
+                return
+
+
+def parse_multipart(stream, content_type, content_length, upload_dir="uploads",
+                    max_file_size=100 * 1024 * 1024, max_field_size=MAX_FIELD_SIZE,
+                    chunk_size=CHUNK_SIZE):
+    """Parse a multipart/form-data body incrementally.
+
+    Args:
+        stream: file-like object positioned at the start of the body (rfile)
+        content_type: the request Content-Type header (carries the boundary)
+        content_length: number of body bytes to read
+        upload_dir: directory that file parts are spooled into
+        max_file_size: per-file limit in bytes; exceeding it raises 413,
+            as does a content_length above max_file_size + MAX_BODY_OVERHEAD
+        max_field_size: per-text-field limit in bytes
+
+    Returns:
+        (fields, files) tuple. fields maps name -> str for text parts;
+        files maps name -> UploadedFile for parts that carried a filename.
+        On error, including a failed read (socket timeout, reset
+        connection), every spooled file is removed before the error is
+        raised.
+    """
+    parser = MultipartParser(content_type, upload_dir, max_file_size, max_field_size, content_length)
+    remaining = content_length
+    # Reading continues past the closing boundary to drain any epilogue,
+    # so the connection stays usable for keep-alive.
+    try:
+        while remaining > 0:
+            chunk = stream.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            parser.feed(chunk)
+    except BaseException:
+        parser.abort()
+        raise
+    return parser.close()
@@ -0,0 +1,321 @@
+"""Micro-benchmark for the PDF stages: text extraction and page rendering.
+
+Runs server.extract_pdf_text and server.render_pdf_pages_to_images over a
+corpus of documents, across a matrix of settings:
+
+- extraction engine: pdfplumber (extract_pdf_text) or pymupdf (the native
+  text layer pdfengine uses, with its pdfplumber fallback for garbled
+  pages);
+- rendering DPI, and format: lossless PNG, or image budget mode (DPI,
+  PNG/JPEG and grayscale chosen per page within --budget-bytes);
+- page selection: all pages, or visual pages only.
+
+The corpus is the PDFs in pdfs/ and uploads/ (identical files once) plus
+three generated stress documents: many pages of text, pages full of
+embedded images, and pages dense with equations and drawn fractions. The
+generated ones are deterministic, so runs compare like with like.
+
+Each case runs --repeat times in a fresh process. It records the median wall
+and CPU time, the growth of the process's peak RSS (which includes MuPDF's
+own allocations), the output size, and the same figures per page. Results go
+to a JSON file keyed by "document/stage/settings", so two runs diff
+cleanly. With --baseline the run is compared to an earlier result file.
+Any figure that grew by more than --threshold (and by more than a small
+noise floor) is reported, and the exit status is 1:
+
+    python pdfbench.py [--out pdfbench.json] [--baseline old.json] [--threshold 0.2]
+                       [--dpi 100,150,200] [--formats png,budget] [--engines pdfplumber,pymupdf]
+                       [--selection all,visual] [--repeat 3] [--only NAME] [--quick]
+
+Peak RSS comes from resource.getrusage, so the memory figures need a
+Unix-like system.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import random
+import hashlib
+import argparse
+import platform
+import resource
+import statistics
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MAX_CHARS = 60000
+MAX_PAGES = 50
+# Growth below these is noise, whatever the ratio.
+NOISE_FLOOR = {
+    "wall_s": 0.05,
+    "cpu_s": 0.05,
+    "peak_rss_mb": 5.0,
+    "output_bytes": 4096,
+}
+WORDS = (
+    "mechanism field coupling polarity scale invariant prediction observable test boundary "
+    "symmetry measure energy density relation structure model parameter derivation limit "
+    "criterion evidence falsifiable selection dependency framework reproducible equation"
+).split()
+EQUATION_SYMBOLS = "∫∑∏∂∇√∞≈≠≤≥±×αβγδεθλμπσφψω"
+
+
+def _text_lines(rng, count, words=12):
+    return [" ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "." for _ in range(count)]
+
+
+def make_many_pages(path, pages=200):
+    """Plain text, a numbered heading and ~45 lines per page."""
+    import pymupdf
+    rng = random.Random(1)
+    doc = pymupdf.open()
+    for n in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"{n + 1}. Section {n + 1}", fontsize=14)
+        page.insert_text((72, 84), "\n".join(_text_lines(rng, 45)), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def make_image_heavy(path, pages=20):
+    """Three incompressible embedded raster images and a caption per page."""
+    import pymupdf
+    rng = random.Random(2)
+    doc = pymupdf.open()
+    for n in range(pages):
+        page = doc.new_page()
+        for i in range(3):
+            pix = pymupdf.Pixmap(pymupdf.csRGB, 480, 200, rng.randbytes(480 * 200 * 3), False)
+            top = 60 + i * 230
+            page.insert_image(pymupdf.Rect(72, top, 540, top + 200), pixmap=pix)
+        page.insert_text((72, 770), f"Figure {n + 1}: " + _text_lines(rng, 1)[0], fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def make_equation_heavy(path, pages=30):
+    """Twelve equations per page, in a font with real math glyphs, with drawn fraction bars."""
+    import pymupdf
+    rng = random.Random(3)
+    font = pymupdf.Font("cjk")
+    doc = pymupdf.open()
+    for n in range(pages):
+        page = doc.new_page()
+        writer = pymupdf.TextWriter(page.rect)
+        for i in range(12):
+            y = 70 + i * 58
+            lhs = "".join(rng.choice(EQUATION_SYMBOLS) for _ in range(8))
+            writer.append((72, y), f"({n + 1}.{i + 1})  {lhs} = ", font=font, fontsize=12)
+            writer.append((260, y - 10), "".join(rng.choice(EQUATION_SYMBOLS) for _ in range(6)), font=font, fontsize=10)
+            writer.append((260, y + 12), "".join(rng.choice(EQUATION_SYMBOLS) for _ in range(6)), font=font, fontsize=10)
+            page.draw_line((255, y - 3), (340, y - 3), width=0.8)
+            page.draw_polyline([(350, y), (354, y + 6), (360, y - 14), (420, y - 14)], width=0.8)
+        writer.write_text(page)
+    doc.save(path)
+    doc.close()
+
+
+SYNTHETIC = {
+    "synthetic_many_pages.pdf": make_many_pages,
+    "synthetic_image_heavy.pdf": make_image_heavy,
+    "synthetic_equation_heavy.pdf": make_equation_heavy,
+}
+
+
+def build_corpus(directory, synthetic=True, quick=False):
+    """[(name, path)]: pdfs/ and uploads/ deduplicated by content, then the generated documents."""
+    corpus = []
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(ROOT, "pdfs", "*.pdf")) + glob.glob(os.path.join(ROOT, "uploads", "*.pdf"))):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            corpus.append((os.path.basename(path), path))
+    if synthetic:
+        for name, make in SYNTHETIC.items():
+            path = os.path.join(directory, name)
+            if quick:
+                make(path, pages=10)
+            else:
+                make(path)
+            corpus.append((name, path))
+    return corpus
+
+
+def build_cases(corpus, args):
+    cases = []
+    for name, path in corpus:
+        for engine in args.engines:
+            cases.append({"doc": name, "path": path, "stage": "extract", "settings": {"engine": engine}})
+        for selection in args.selection:
+            for fmt in args.formats:
+                for dpi in args.dpi:
+                    cases.append({"doc": name, "path": path, "stage": "render",
+                                  "settings": {"dpi": dpi, "format": fmt, "selection": selection}})
+    return cases
+
+
+def case_key(case):
+    settings = ",".join(f"{k}={v}" for k, v in case["settings"].items())
+    return f"{case['doc']}/{case['stage']}/{settings}"
+
+
+def _extract(case):
+    import server
+    import pdfengine
+    if case["settings"]["engine"] == "pdfplumber":
+        text, truncated, pages = server.extract_pdf_text(case["path"], MAX_CHARS)
+        return {"pages": pages, "output_bytes": len((text or "").encode("utf-8")), "chars": len(text or ""), "truncated": truncated}
+    pages = pdfengine.count_pages(case["path"])
+    entries = pdfengine.analyze_page_range(case["path"], 0, pages, 0, 0)
+    text, truncated = pdfengine.join_page_texts([p["text"] for p in entries], MAX_CHARS)
+    return {
+        "pages": pages,
+        "output_bytes": len(text.encode("utf-8")),
+        "chars": len(text),
+        "truncated": truncated,
+        "pdfplumber_pages": sum(1 for p in entries if p["engine"] == "pdfplumber"),
+    }
+
+
+def _render(case, budget_bytes):
+    import server
+    settings = case["settings"]
+    budget = (budget_bytes, 0) if settings["format"] == "budget" else None
+    result = server.render_pdf_pages_to_images(case["path"], MAX_PAGES, settings["dpi"], budget=budget, selection=settings["selection"])
+    formats = {}
+    for page in result.get("page_settings") or []:
+        formats[page["format"]] = formats.get(page["format"], 0) + 1
+    return {
+        "pages": result["rendered_pages"],
+        "total_pages": result["total_pages"],
+        "output_bytes": sum(p["bytes"] for p in result.get("page_settings") or []),
+        "formats": formats,
+        "error": result.get("error"),
+    }
+
+
+def run_case(case, repeat, budget_bytes):
+    """Runs in a fresh worker process; returns the measurements for one case."""
+    import server  # imported before the RSS baseline
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    walls = []
+    cpus = []
+    output = None
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        output = _extract(case) if case["stage"] == "extract" else _render(case, budget_bytes)
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    wall = statistics.median(walls)
+    cpu = statistics.median(cpus)
+    pages = max(1, output["pages"])
+    return dict(output, **{
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "peak_rss_mb": round((peak_kb - baseline_kb) / 1024, 1),
+        "per_page": {
+            "wall_ms": round(wall * 1000 / pages, 2),
+            "cpu_ms": round(cpu * 1000 / pages, 2),
+            "output_bytes": output["output_bytes"] // pages,
+        },
+    })
+
+
+def compare(results, baseline, threshold):
+    """Figures that grew past threshold versus the baseline results: [(key, metric, old, new)]."""
+    regressions = []
+    for key, new in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            if metric in old and metric in new and new[metric] - old[metric] > max(floor, old[metric] * threshold):
+                regressions.append((key, metric, old[metric], new[metric]))
+    return regressions
+
+
+def _csv(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="pdfbench.json", help="result file (default pdfbench.json)")
+    parser.add_argument("--baseline", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed growth per figure (default 0.2 = 20%%)")
+    parser.add_argument("--dpi", type=_csv(int), default=[100, 150, 200])
+    parser.add_argument("--formats", type=_csv(str), default=["png", "budget"], help="png and/or budget")
+    parser.add_argument("--engines", type=_csv(str), default=["pdfplumber", "pymupdf"])
+    parser.add_argument("--selection", type=_csv(str), default=["all"], help="all and/or visual")
+    parser.add_argument("--budget-bytes", type=int, default=8 * 1024 * 1024, help="image budget per document for format=budget")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the median is reported")
+    parser.add_argument("--only", action="append", default=[], help="only documents whose name contains this")
+    parser.add_argument("--no-synthetic", action="store_true", help="skip the generated stress documents")
+    parser.add_argument("--quick", action="store_true", help="10-page stress documents, 100 DPI, one run per case")
+    args = parser.parse_args()
+    if args.quick:
+        args.dpi = [100]
+        args.repeat = 1
+
+    with tempfile.TemporaryDirectory(prefix="tsm2-pdfbench-") as directory:
+        corpus = build_corpus(directory, synthetic=not args.no_synthetic, quick=args.quick)
+        if args.only:
+            corpus = [(name, path) for name, path in corpus if any(s in name for s in args.only)]
+        cases = build_cases(corpus, args)
+        print(f"[PDFBENCH] {len(corpus)} documents, {len(cases)} cases, {args.repeat} run(s) each", file=sys.stderr)
+
+        results = {}
+        # One process per case, so each peak RSS figure belongs to that case alone.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                 max_tasks_per_child=1) as pool:
+            for i, case in enumerate(cases, 1):
+                key = case_key(case)
+                try:
+                    results[key] = pool.submit(run_case, case, args.repeat, args.budget_bytes).result()
+                except Exception as e:
+                    results[key] = {"error": f"{type(e).__name__}: {e}"}
+                r = results[key]
+                print(f"[PDFBENCH] {i}/{len(cases)} {key}: "
+                      + (f"{r['wall_s']:.3f}s wall, {r['cpu_s']:.3f}s cpu, +{r['peak_rss_mb']} MB, {r['output_bytes']} bytes"
+                         if "wall_s" in r else r["error"]), file=sys.stderr)
+
+    import pymupdf
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pymupdf": pymupdf.VersionBind,
+            "cpus": os.cpu_count(),
+            "max_chars": MAX_CHARS,
+            "max_pages": MAX_PAGES,
+            "budget_bytes": args.budget_bytes,
+            "repeat": args.repeat,
+            "documents": {name: os.path.relpath(path, ROOT) if path.startswith(ROOT) else "(generated)" for name, path in corpus},
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"[PDFBENCH] Wrote {args.out}", file=sys.stderr)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for key, metric, old, new in regressions:
+        print(f"REGRESSION {key} {metric}: {old} -> {new}")
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
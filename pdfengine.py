@@ -0,0 +1,864 @@
+"""Process-pool PDF engine for the TSM2 Submission Portal.
+
+Text extraction and page rendering are CPU-bound and hold the GIL, so
+running them on the request/job threads serialises every submission on one
+core. This module splits a document into page ranges and analyses all
+ranges at the same time on a pool of worker processes. Each range opens the
+PDF once with PyMuPDF and takes both the native text layer and the page
+images from that handle; pdfplumber is only used for pages whose native
+text is missing or garbled. Results are stitched back together into the
+same shapes server.extract_pdf_text and server.render_pdf_pages_to_images
+have always returned.
+
+The page-range functions are plain module-level functions so they can be
+pickled to workers; they are also what the single-process code paths use.
+"""
+
+import os
+import re
+import base64
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import logutil
+
+try:
+    import pdfplumber
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+
+PDF_WORKERS = int(os.environ.get("TSM2_PDF_WORKERS", str(os.cpu_count() or 1)))
+MIN_PAGES_PER_TASK = 4
+
+# Image budget mode. When TSM2_IMAGE_BUDGET_BYTES is set, the rendered
+# page images of one submission are held to that many encoded bytes (and
+# TSM2_IMAGE_BUDGET_PIXELS pixels) in total instead of lossless 200 DPI PNG.
+IMAGE_BUDGET_BYTES = int(os.environ.get("TSM2_IMAGE_BUDGET_BYTES", "0"))
+IMAGE_BUDGET_PIXELS = int(os.environ.get("TSM2_IMAGE_BUDGET_PIXELS", "0"))
+IMAGE_MIN_DPI = int(os.environ.get("TSM2_IMAGE_MIN_DPI", "72"))
+# Page selection. "all" renders the first max_pages pages as before;
+# "visual" renders only pages with figures, diagrams or equations and skips
+# blank and near-duplicate pages.
+PAGE_SELECTION = os.environ.get("TSM2_PAGE_SELECTION", "all")
+# Streamed rendering. When on, analyze() only plans which pages to render;
+# the images are rendered one at a time while the Grok request body is
+# being written (see iter_page_images and grokapi).
+STREAM_RENDER = os.environ.get("TSM2_STREAM_RENDER", "1") == "1"
+MATH_FONT_RE = re.compile(r"math|cmmi|cmsy|cmex|msam|msbm|stix|esint|mtextra", re.IGNORECASE)
+MATH_CHAR_THRESHOLD = 15
+FINGERPRINT_SIZE = (17, 16)
+DUPLICATE_MAX_BITS = 12
+BLANK_MAX_SPREAD = 6
+
+JPEG_QUALITIES = (80, 65, 50)
+DOWNSCALE_STEP = 0.8
+VISUAL_DRAWING_THRESHOLD = 8
+
+TRUNCATION_MARKER = "\n\n[--- PDF TEXT TRUNCATED AT CHARACTER LIMIT ---]"
+
+
+def count_pages(pdf_path):
+    """Page count, using PyMuPDF when available since it is far cheaper to open."""
+    if PYMUPDF_AVAILABLE:
+        with pymupdf.open(pdf_path) as doc:
+            return len(doc)
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_texts(pdf_path, start, end):
+    """pdfplumber text for pages [start, end); empty pages come back as ''."""
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or "")
+    return texts
+
+
+def render_page_images(pdf_path, start, end, dpi, page_budget=None):
+    """Data-URI image parts for pages [start, end) at the given DPI.
+
+    Without page_budget every page is lossless PNG, as before. With one,
+    see encode_page. Returns (images, page_settings).
+    """
+    images = []
+    settings = []
+    with pymupdf.open(pdf_path) as doc:
+        for page_num in range(start, end):
+            image, setting = encode_page(doc[page_num], dpi, page_budget)
+            images.append(image)
+            settings.append(dict(setting, page=page_num + 1))
+    return images, settings
+
+
+def make_budget(page_count, total_bytes=None, total_pixels=None, min_dpi=None):
+    """Split the per-submission image budget evenly across the rendered pages.
+
+    Returns None when budget mode is off.
+    """
+    total_bytes = IMAGE_BUDGET_BYTES if total_bytes is None else total_bytes
+    total_pixels = IMAGE_BUDGET_PIXELS if total_pixels is None else total_pixels
+    if page_count <= 0 or (total_bytes <= 0 and total_pixels <= 0):
+        return None
+    return {
+        "bytes": total_bytes // page_count if total_bytes > 0 else None,
+        "pixels": total_pixels // page_count if total_pixels > 0 else None,
+        "min_dpi": IMAGE_MIN_DPI if min_dpi is None else min_dpi,
+    }
+
+
+def page_has_visuals(page):
+    """True if the page carries embedded images or non-trivial vector drawings."""
+    if page.get_images(full=False):
+        return True
+    return len(page.get_drawings()) > VISUAL_DRAWING_THRESHOLD
+
+
+def _image_part(mime, data):
+    b64 = base64.b64encode(data).decode("ascii")
+    return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}}
+
+
+def encode_page(page, dpi, page_budget=None):
+    """Render one page to an image part, honouring an optional per-page budget.
+
+    Budget mode picks the largest DPI (up to `dpi`) that fits the pixel
+    budget, renders text-only pages in grayscale, and tries PNG and JPEG
+    at decreasing quality, keeping the first encoding under the byte budget
+    (PNG is preferred for pages with figures). If nothing fits, the page is
+    downscaled and retried until the minimum DPI is reached.
+
+    Returns (image_part, settings) where settings records dpi, format,
+    colorspace, quality, width, height and bytes.
+    """
+    if not page_budget:
+        pix = page.get_pixmap(dpi=dpi)
+        data = pix.tobytes("png")
+        return _image_part("image/png", data), {
+            "dpi": dpi, "format": "png", "colorspace": "rgb", "quality": None,
+            "width": pix.width, "height": pix.height, "bytes": len(data),
+        }
+
+    visual = page_has_visuals(page)
+    colorspace = pymupdf.csRGB if visual else pymupdf.csGRAY
+    min_dpi = page_budget["min_dpi"]
+    page_dpi = dpi
+    if page_budget.get("pixels"):
+        area_sq_in = (page.rect.width / 72.0) * (page.rect.height / 72.0)
+        fit_dpi = int((page_budget["pixels"] / max(area_sq_in, 1e-6)) ** 0.5)
+        page_dpi = max(min_dpi, min(dpi, fit_dpi))
+    max_bytes = page_budget.get("bytes")
+    if max_bytes and page_dpi > min_dpi:
+        # Cheap probe at the minimum DPI to learn this page's bytes per
+        # pixel, so the first full render already lands near the budget.
+        probe = page.get_pixmap(dpi=min_dpi, colorspace=colorspace)
+        probe_bytes = len(probe.tobytes("png"))
+        scale = (max_bytes / max(probe_bytes, 1)) ** 0.5
+        page_dpi = max(min_dpi, min(page_dpi, int(min_dpi * scale * 0.95)))
+
+    # Text pages get one mid-quality JPEG candidate; grayscale PNG is often
+    # smaller for them anyway, and legibility is governed by DPI.
+    qualities = JPEG_QUALITIES if visual else JPEG_QUALITIES[1:2]
+    while True:
+        pix = page.get_pixmap(dpi=page_dpi, colorspace=colorspace)
+        candidates = [("png", None, pix.tobytes("png"))]
+        if max_bytes is None or len(candidates[0][2]) > max_bytes or not visual:
+            for quality in qualities:
+                candidates.append(("jpeg", quality, pix.tobytes("jpeg", jpg_quality=quality)))
+                if visual and max_bytes is not None and len(candidates[-1][2]) <= max_bytes:
+                    break
+        if not visual:
+            candidates.sort(key=lambda c: len(c[2]))
+        fitting = [c for c in candidates if max_bytes is None or len(c[2]) <= max_bytes]
+        if fitting or page_dpi <= min_dpi:
+            fmt, quality, data = fitting[0] if fitting else min(candidates, key=lambda c: len(c[2]))
+            break
+        # Encoded size scales roughly with pixel count, i.e. DPI squared, so
+        # jump straight to the DPI the smallest candidate suggests.
+        smallest = min(len(c[2]) for c in candidates)
+        estimate = int(page_dpi * (max_bytes / smallest) ** 0.5 * 0.95)
+        page_dpi = max(min_dpi, min(estimate, int(page_dpi * DOWNSCALE_STEP)))
+
+    return _image_part(f"image/{fmt}", data), {
+        "dpi": page_dpi,
+        "format": fmt,
+        "colorspace": "rgb" if visual else "gray",
+        "quality": quality,
+        "width": pix.width,
+        "height": pix.height,
+        "bytes": len(data),
+    }
+
+
+def _is_math_char(ch):
+    code = ord(ch)
+    return (
+        0x2200 <= code <= 0x22FF      # mathematical operators
+        or 0x27C0 <= code <= 0x27EF   # misc mathematical symbols A
+        or 0x2980 <= code <= 0x2AFF   # misc symbols B, supplemental operators
+        or 0x1D400 <= code <= 0x1D7FF # mathematical alphanumerics
+        or 0x0391 <= code <= 0x03C9   # Greek letters
+        or ch in "=±×÷√∞≈≠≤≥∂∇∑∏∫^"
+    )
+
+
+def page_fingerprint(page):
+    """Tiny grayscale thumbnail -> (difference hash, brightness spread).
+
+    The dHash compares horizontally adjacent pixels of a 17x16 thumbnail,
+    giving a 256-bit perceptual hash; pages whose hashes differ in only a
+    few bits look the same at a glance.
+    """
+    cols, rows = FINGERPRINT_SIZE
+    matrix = pymupdf.Matrix(cols / page.rect.width, rows / page.rect.height)
+    pix = page.get_pixmap(matrix=matrix, colorspace=pymupdf.csGRAY, alpha=False)
+    samples = pix.samples
+    width, height, stride = pix.width, pix.height, pix.stride
+    bits = 0
+    for y in range(height):
+        row = samples[y * stride:y * stride + width]
+        for x in range(width - 1):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits, (max(samples) - min(samples)) if samples else 0
+
+
+def inspect_page(page, text):
+    """Classify a page for visual page selection.
+
+    Returns {"images", "drawings", "math_chars", "visual": [reasons],
+    "blank": bool, "fingerprint": Optional[int]}.
+    """
+    images = len(page.get_images(full=False))
+    drawings = len(page.get_drawings())
+    math_chars = 0
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                if MATH_FONT_RE.search(span["font"]):
+                    math_chars += len(span["text"].strip())
+                else:
+                    math_chars += sum(1 for ch in span["text"] if _is_math_char(ch))
+    reasons = []
+    if images:
+        reasons.append("figure")
+    if drawings > VISUAL_DRAWING_THRESHOLD:
+        reasons.append("diagram")
+    if math_chars >= MATH_CHAR_THRESHOLD:
+        reasons.append("equations")
+    info = {
+        "images": images,
+        "drawings": drawings,
+        "math_chars": math_chars,
+        "visual": reasons,
+        "blank": False,
+        "fingerprint": None,
+    }
+    if not text.strip() and not images and not drawings:
+        info["blank"] = True
+    elif reasons:
+        fingerprint, spread = page_fingerprint(page)
+        info["fingerprint"] = fingerprint
+        info["blank"] = spread <= BLANK_MAX_SPREAD
+    return info
+
+
+def select_pages(inspections, max_pages):
+    """Choose which pages to render in "visual" selection mode.
+
+    Returns (selected, report): selected is the list of 0-based page
+    indexes to render; report has one {"page", "sent", "reason"} entry per
+    page (1-based page numbers) explaining the decision.
+    """
+    selected = []
+    kept = []  # (page_index, fingerprint)
+    report = []
+    for index, info in enumerate(inspections):
+        if info["blank"]:
+            reason, sent = "blank", False
+        elif not info["visual"]:
+            reason, sent = "text only", False
+        else:
+            duplicate_of = None
+            for other, fingerprint in kept:
+                if bin(fingerprint ^ info["fingerprint"]).count("1") <= DUPLICATE_MAX_BITS:
+                    duplicate_of = other
+                    break
+            if duplicate_of is not None:
+                reason, sent = f"near-duplicate of page {duplicate_of + 1}", False
+            elif len(selected) >= max_pages:
+                reason, sent = "over page cap", False
+            else:
+                reason, sent = "+".join(info["visual"]), True
+                selected.append(index)
+                kept.append((index, info["fingerprint"]))
+        report.append({"page": index + 1, "sent": sent, "reason": reason})
+    return selected, report
+
+
+def render_page_list(pdf_path, page_indexes, dpi, page_budget=None):
+    """Render specific pages; returns [(image_part, settings), ...] in order."""
+    rendered = []
+    with pymupdf.open(pdf_path) as doc:
+        for page_num in page_indexes:
+            image, setting = encode_page(doc[page_num], dpi, page_budget)
+            rendered.append((image, dict(setting, page=page_num + 1)))
+    return rendered
+
+
+def looks_garbled(text):
+    """Heuristic for text layers that PyMuPDF decodes badly.
+
+    Broken font encodings show up as replacement characters, private-use
+    code points, stray control characters or "(cid:NN)" runs, and leave
+    very few letters in what should be prose.
+    """
+    if not text or not text.strip():
+        return True
+    bad = 0
+    letters = 0
+    for ch in text:
+        code = ord(ch)
+        if ch == "\ufffd" or 0xE000 <= code <= 0xF8FF or (code < 32 and ch not in "\n\r\t"):
+            bad += 1
+        elif ch.isalpha():
+            letters += 1
+    if bad / len(text) > 0.05 or text.count("(cid:") > 5:
+        return True
+    return len(text) >= 50 and letters / len(text) < 0.2
+
+
+def analyze_page_range(pdf_path, start, end, render_until, dpi, page_budget=None, inspect=False):
+    """Text and page images for pages [start, end) from one PyMuPDF handle.
+
+    Pages whose native text layer is empty or garbled are re-extracted with
+    pdfplumber. Pages below render_until are also rendered (see encode_page).
+
+    Returns a list of {"text", "engine", "image", "image_settings"} dicts,
+    one per page; engine is "pymupdf", "pdfplumber" or "none" (no usable
+    text at all). With inspect=True each entry also carries "inspection"
+    (see inspect_page) for visual page selection.
+    """
+    pages = []
+    fallback = []
+    with pymupdf.open(pdf_path) as doc:
+        for page_num in range(start, end):
+            page = doc[page_num]
+            text = page.get_text("text").rstrip()
+            entry = {"text": text, "engine": "pymupdf", "image": None, "image_settings": None}
+            if looks_garbled(text):
+                fallback.append(len(pages))
+            if page_num < render_until:
+                image, setting = encode_page(page, dpi, page_budget)
+                entry["image"] = image
+                entry["image_settings"] = dict(setting, page=page_num + 1)
+            if inspect:
+                entry["inspection"] = inspect_page(page, text)
+            pages.append(entry)
+
+    if fallback and PDFPLUMBER_AVAILABLE:
+        with pdfplumber.open(pdf_path) as pdf:
+            for i in fallback:
+                text = pdf.pages[start + i].extract_text() or ""
+                if text.strip():
+                    pages[i]["text"] = text
+                    pages[i]["engine"] = "pdfplumber"
+                elif not pages[i]["text"].strip():
+                    pages[i]["engine"] = "none"
+    else:
+        for i in fallback:
+            if not pages[i]["text"].strip():
+                pages[i]["engine"] = "none"
+    return pages
+
+
+def digest_page_range(pdf_path, start, end):
+    """Full text and figure digest for pages [start, end); see PdfEngine.digest."""
+    pages = []
+    with pymupdf.open(pdf_path) as doc:
+        for page_num in range(start, end):
+            page = doc[page_num]
+            pages.append({"text": page.get_text("text").rstrip(), "visual_hash": page_visual_hash(page)})
+    return pages
+
+
+def plumber_digest_page_range(pdf_path, start, end):
+    """digest_page_range without PyMuPDF: pdfplumber text, figures not compared."""
+    return [{"text": text, "visual_hash": None} for text in extract_page_texts(pdf_path, start, end)]
+
+
+def page_text_hash(text):
+    """Short digest of a page's text, whitespace-insensitive; used to diff revisions."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def page_visual_hash(page):
+    """Short digest of a page's figures (embedded image bytes and vector drawings), or None.
+
+    None means the page has no figures. Drawings are taken relative to
+    their joint bounding box, so a diagram that only moved down the page
+    with the text above it hashes the same. Text is left out;
+    page_text_hash covers it.
+    """
+    images = sorted({image[0] for image in page.get_images(full=True)})
+    drawings = page.get_cdrawings()
+    if not images and not drawings:
+        return None
+    digest = hashlib.sha256()
+    for xref in images:
+        digest.update(page.parent.xref_stream_raw(xref) or b"")
+    if drawings:
+        x0 = min(d["rect"][0] for d in drawings)
+        y0 = min(d["rect"][1] for d in drawings)
+        for d in drawings:
+            for item in d.get("items", ()):
+                points = [round(v - (x0, y0)[i % 2]) for i, v in enumerate(_coordinates(item[1:]))]
+                digest.update(f"{item[0]}{points}{d.get('color')}{d.get('fill')}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _coordinates(values):
+    """Flatten the points, rects and quads of a drawing item to x, y, x, y, ..."""
+    for value in values:
+        if isinstance(value, (tuple, list)):
+            yield from _coordinates(value)
+        elif isinstance(value, (int, float)):
+            yield value
+
+
+def join_page_texts(page_texts, max_chars):
+    """Join per-page text the way extract_pdf_text always has.
+
+    Returns (text, truncated). Empty pages are skipped; the page that
+    crosses max_chars is cut and a truncation marker appended.
+    """
+    text_parts = []
+    total_chars = 0
+    truncated = False
+    for page_text in page_texts:
+        if not page_text:
+            continue
+        if total_chars + len(page_text) > max_chars:
+            remaining = max_chars - total_chars
+            text_parts.append(page_text[:remaining])
+            text_parts.append(TRUNCATION_MARKER)
+            truncated = True
+            break
+        text_parts.append(page_text)
+        total_chars += len(page_text)
+    return "\n\n".join(text_parts), truncated
+
+
+def page_ranges(page_count, workers, min_pages=MIN_PAGES_PER_TASK):
+    """Split [0, page_count) into contiguous ranges, roughly one per worker."""
+    if page_count <= 0:
+        return []
+    per_task = max(min_pages, -(-page_count // max(1, workers)))
+    return [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+
+def iter_page_images(pdf_path, render, settings_out=None):
+    """Render the pages planned in render["deferred"] one at a time.
+
+    Yields image parts in page order; only the page being encoded and the
+    part just yielded are alive at once. Each page's settings are appended
+    to settings_out as it is rendered.
+    """
+    plan = render["deferred"]
+    with pymupdf.open(pdf_path) as doc:
+        for page_num in plan["pages"]:
+            image, setting = encode_page(doc[page_num], plan["dpi"], plan["page_budget"])
+            if settings_out is not None:
+                settings_out.append(dict(setting, page=page_num + 1))
+            yield image
+
+
+def has_page_images(render):
+    """True if the render result carries page images, rendered or planned."""
+    return bool(render.get("images") or (render.get("deferred") or {}).get("pages"))
+
+
+def record_streamed_pages(render, page_settings):
+    """Fill in page_settings (and the budget summary) after a streamed render."""
+    render["page_settings"] = page_settings
+    plan = render["deferred"]
+    if plan["page_budget"]:
+        render["budget"] = _budget_summary(plan["page_budget"], render["rendered_pages"], page_settings)
+
+
+def _render_range_flat(pdf_path, start, end, dpi, page_budget):
+    images, settings = render_page_images(pdf_path, start, end, dpi, page_budget)
+    return list(zip(images, settings))
+
+
+def render_result(images, page_settings, page_count, rendered_pages, max_pages, page_budget=None, selection=None,
+                  deferred_pages=None, dpi=None):
+    """Assemble the render_pdf_pages_to_images result dict.
+
+    page_settings records the encoding chosen for each rendered page; in
+    budget mode "budget" summarises the limits and what was actually used.
+    In "visual" selection mode, selection is the select_pages report and
+    truncated means selected pages were dropped by the page cap.
+    With deferred_pages (0-based indexes) nothing has been rendered yet:
+    images is empty and "deferred" holds the plan for iter_page_images.
+    """
+    result = {
+        "images": images,
+        "total_pages": page_count,
+        "rendered_pages": rendered_pages,
+        "truncated": page_count > max_pages,
+        "error": None,
+        "page_settings": page_settings,
+    }
+    if selection is not None:
+        result["truncated"] = any(entry["reason"] == "over page cap" for entry in selection)
+        result["selection"] = {"mode": "visual", "pages": selection}
+    if deferred_pages is not None:
+        result["deferred"] = {"pages": list(deferred_pages), "dpi": dpi, "page_budget": page_budget}
+    if page_budget:
+        result["budget"] = _budget_summary(page_budget, rendered_pages, page_settings)
+    return result
+
+
+def _budget_summary(page_budget, rendered_pages, page_settings):
+    return {
+        "max_bytes": page_budget["bytes"] * rendered_pages if page_budget["bytes"] else None,
+        "max_pixels": page_budget["pixels"] * rendered_pages if page_budget["pixels"] else None,
+        "bytes": sum(s["bytes"] for s in page_settings),
+        "pixels": sum(s["width"] * s["height"] for s in page_settings),
+    }
+
+
+def _reraise(e):
+    raise e
+
+
+def _analysis_error(e):
+    logutil.error("PDF ANALYSIS", f"Analysis failed: {e}")
+    return {
+        "text": None,
+        "truncated": False,
+        "page_count": 0,
+        "page_engines": [],
+        "render": {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": str(e)},
+    }
+
+
+class _Pending:
+    """Results of a set of range tasks, combined when result() is called."""
+
+    def __init__(self, engine, futures, combine, on_error, enough=None):
+        self._engine = engine
+        self._futures = futures
+        self._combine = combine
+        self._on_error = on_error
+        self._enough = enough
+
+    def result(self):
+        try:
+            parts = []
+            for i, future in enumerate(self._futures):
+                parts.extend(future.result())
+                if self._enough and self._enough(parts):
+                    for rest in self._futures[i + 1:]:
+                        rest.cancel()
+                    break
+            return self._combine(parts)
+        except Exception as e:
+            for future in self._futures:
+                future.cancel()
+            if isinstance(e, BrokenProcessPool):
+                self._engine.reset()
+            return self._on_error(e)
+
+
+class _Done:
+    def __init__(self, value):
+        self._value = value
+
+    def result(self):
+        return self._value
+
+
+class _Inline:
+    """Stand-in future used when the engine runs without worker processes."""
+
+    def __init__(self, fn, *args):
+        self._fn = fn
+        self._args = args
+
+    def result(self):
+        return self._fn(*self._args)
+
+    def cancel(self):
+        return False
+
+
+class PdfEngine:
+    """Runs page-range extraction and rendering tasks on a process pool.
+
+    workers=0 keeps everything in-process (useful where forking is not
+    allowed); the results are identical either way.
+    """
+
+    def __init__(self, workers=PDF_WORKERS):
+        self.workers = max(0, workers)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self.workers == 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the server is multi-threaded and forking
+                # a process that holds other threads' locks is unsafe.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _submit(self, fn, *args):
+        pool = self._executor()
+        if pool is None:
+            return _Inline(fn, *args)
+        return pool.submit(fn, *args)
+
+    def start_extract(self, pdf_path, max_chars=60000, page_count=None):
+        """Queue text extraction; .result() gives (text, truncated, page_count)."""
+        if not PDFPLUMBER_AVAILABLE:
+            logutil.warning("PDF EXTRACTION", "pdfplumber unavailable; skipping extraction.")
+            return _Done((None, False, 0))
+
+        def on_error(e):
+            logutil.error("PDF EXTRACTION", f"Extraction failed: {e}")
+            return None, False, 0
+
+        try:
+            if page_count is None:
+                page_count = count_pages(pdf_path)
+            futures = [
+                self._submit(extract_page_texts, pdf_path, start, end)
+                for start, end in page_ranges(page_count, self.workers)
+            ]
+        except Exception as e:
+            return _Done(on_error(e))
+
+        def combine(page_texts):
+            text, truncated = join_page_texts(page_texts, max_chars)
+            return text, truncated, page_count
+
+        def enough(page_texts):
+            # Later ranges cannot change the output once the limit is crossed.
+            return sum(len(t) for t in page_texts) > max_chars
+
+        return _Pending(self, futures, combine, on_error, enough)
+
+    def digest(self, pdf_path):
+        """Text and figure hashes of every page, for revision comparison (revisions.fingerprint).
+
+        Unlike start_extract nothing is truncated or cancelled early, so an
+        edit on the last page is seen however long the document is.
+        Returns {"text": str, "page_hashes": [str, ...],
+        "page_visual_hashes": [str or None, ...] or None}, or None when the
+        PDF could not be read. page_visual_hashes is None without PyMuPDF.
+        """
+        if PYMUPDF_AVAILABLE:
+            task = digest_page_range
+        elif PDFPLUMBER_AVAILABLE:
+            task = plumber_digest_page_range
+        else:
+            return None
+
+        def on_error(e):
+            logutil.error("PDF DIGEST", f"Digest failed: {e}")
+            return None
+
+        try:
+            futures = [
+                self._submit(task, pdf_path, start, end)
+                for start, end in page_ranges(count_pages(pdf_path), self.workers)
+            ]
+        except Exception as e:
+            return on_error(e)
+
+        def combine(pages):
+            return {
+                "text": "\n\n".join(p["text"] for p in pages if p["text"]),
+                "page_hashes": [page_text_hash(p["text"]) for p in pages],
+                "page_visual_hashes": [p["visual_hash"] for p in pages] if PYMUPDF_AVAILABLE else None,
+            }
+
+        return _Pending(self, futures, combine, on_error).result()
+
+    def start_render(self, pdf_path, max_pages=50, dpi=200, page_count=None, budget=None):
+        """Queue page rendering; .result() gives the render_pdf_pages_to_images dict.
+
+        budget is an optional (total_bytes, total_pixels) pair; see make_budget.
+        """
+        if not PYMUPDF_AVAILABLE:
+            return _Done({"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": "pymupdf unavailable"})
+
+        def on_error(e):
+            logutil.error("PDF RENDER", f"Failed to render PDF: {e}")
+            return {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": str(e)}
+
+        try:
+            if page_count is None:
+                page_count = count_pages(pdf_path)
+            pages_to_render = min(page_count, max_pages)
+            page_budget = make_budget(pages_to_render, *(budget or (None, None)))
+            futures = [
+                self._submit(_render_range_flat, pdf_path, start, end, dpi, page_budget)
+                for start, end in page_ranges(pages_to_render, self.workers)
+            ]
+        except Exception as e:
+            return _Done(on_error(e))
+
+        def combine(parts):
+            return render_result(
+                [image for image, _ in parts], [s for _, s in parts],
+                page_count, pages_to_render, max_pages, page_budget,
+            )
+
+        return _Pending(self, futures, combine, on_error)
+
+    def analyze(self, pdf_path, max_chars=60000, max_pages=50, dpi=200, budget=None, selection=None, stream=None):
+        """Extract text and render pages for one document.
+
+        With PyMuPDF available each page range is opened once and both text
+        and images come from the same handle, with pdfplumber used only for
+        pages whose native text is missing or garbled. Without PyMuPDF the
+        pdfplumber extraction path runs on its own.
+
+        budget is an optional (total_bytes, total_pixels) pair for image
+        budget mode; by default the TSM2_IMAGE_BUDGET_* settings apply.
+        selection is "all" or "visual" (default TSM2_PAGE_SELECTION); in
+        visual mode pages are inspected first and only the selected ones
+        are rendered, with the image budget shared among them.
+        stream (default TSM2_STREAM_RENDER) skips rendering altogether and
+        returns the render plan in render["deferred"] instead; the caller
+        renders the pages with iter_page_images as it uploads them.
+
+        Returns a dict:
+            {
+              "text": Optional[str], "truncated": bool, "page_count": int,
+              "page_engines": [str, ...],   # per page, see analyze_page_range
+              "render": {...},              # render_pdf_pages_to_images shape
+            }
+        """
+        if not PYMUPDF_AVAILABLE:
+            text, truncated, page_count = self.start_extract(pdf_path, max_chars).result()
+            return {
+                "text": text,
+                "truncated": truncated,
+                "page_count": page_count,
+                "page_engines": [],
+                "render": self.start_render(pdf_path, max_pages, dpi, budget=budget).result(),
+            }
+
+        selection = selection or PAGE_SELECTION
+        stream = STREAM_RENDER if stream is None else stream
+        if selection == "visual":
+            return self._analyze_visual(pdf_path, max_chars, max_pages, dpi, budget, stream)
+
+        try:
+            page_count = count_pages(pdf_path)
+            pages_to_render = min(page_count, max_pages)
+            page_budget = make_budget(pages_to_render, *(budget or (None, None)))
+            render_until = 0 if stream else pages_to_render
+            futures = [
+                self._submit(analyze_page_range, pdf_path, start, end, render_until, dpi, page_budget)
+                for start, end in page_ranges(page_count, self.workers)
+            ]
+        except Exception as e:
+            futures = None
+            error = e
+
+        def combine(pages):
+            text, truncated = join_page_texts([p["text"] for p in pages], max_chars)
+            if stream:
+                render = render_result(
+                    [], [], page_count, pages_to_render, max_pages, page_budget,
+                    deferred_pages=range(pages_to_render), dpi=dpi,
+                )
+            else:
+                render = render_result(
+                    [p["image"] for p in pages[:pages_to_render]],
+                    [p["image_settings"] for p in pages[:pages_to_render]],
+                    page_count, pages_to_render, max_pages, page_budget,
+                )
+            return {
+                "text": text,
+                "truncated": truncated,
+                "page_count": page_count,
+                "page_engines": [p["engine"] for p in pages],
+                "render": render,
+            }
+
+        def enough(pages):
+            return len(pages) >= pages_to_render and sum(len(p["text"]) for p in pages) > max_chars
+
+        if futures is None:
+            return _analysis_error(error)
+        return _Pending(self, futures, combine, _analysis_error, enough).result()
+
+    def _analyze_visual(self, pdf_path, max_chars, max_pages, dpi, budget, stream=False):
+        """Two passes: inspect every page (with text), then render the chosen ones.
+
+        With stream the second pass is left to iter_page_images.
+        """
+        try:
+            page_count = count_pages(pdf_path)
+            futures = [
+                self._submit(analyze_page_range, pdf_path, start, end, 0, dpi, None, True)
+                for start, end in page_ranges(page_count, self.workers)
+            ]
+            pages = _Pending(self, futures, lambda parts: parts, _reraise).result()
+            selected, report = select_pages([p["inspection"] for p in pages], max_pages)
+            page_budget = make_budget(len(selected), *(budget or (None, None)))
+            rendered = []
+            if not stream:
+                chunks = [selected[start:end] for start, end in page_ranges(len(selected), self.workers)]
+                futures = [self._submit(render_page_list, pdf_path, chunk, dpi, page_budget) for chunk in chunks]
+                rendered = _Pending(self, futures, lambda parts: parts, _reraise).result()
+        except Exception as e:
+            return _analysis_error(e)
+
+        text, truncated = join_page_texts([p["text"] for p in pages], max_chars)
+        return {
+            "text": text,
+            "truncated": truncated,
+            "page_count": page_count,
+            "page_engines": [p["engine"] for p in pages],
+            "render": render_result(
+                [image for image, _ in rendered], [s for _, s in rendered],
+                page_count, len(selected), max_pages, page_budget, selection=report,
+                deferred_pages=selected if stream else None, dpi=dpi,
+            ),
+        }
+
+    def reset(self):
+        """Drop a broken pool (e.g. a worker was OOM-killed); the next task starts a fresh one."""
+        logutil.warning("PDF ENGINE", "Worker pool broke; restarting it")
+        self.shutdown(wait=False)
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+
+PDF_ENGINE = PdfEngine()
@@ -0,0 +1,208 @@
+"""Range-aware, zero-copy downloads for /uploads/ and /pdfs/.
+
+SimpleHTTPRequestHandler copies files through Python in small chunks and
+ignores Range, so a PDF viewer seeking in a 100 MB upload fetched the whole
+file every time. Here:
+
+- single and multiple byte ranges (`multipart/byteranges`) are supported,
+  with `If-Range`, `ETag`/`Last-Modified` and 304 on `If-None-Match` /
+  `If-Modified-Since`;
+- file bytes go socket-to-socket with sendfile: `socket.sendfile` in the
+  threaded servers and `loop.sendfile` in the asyncio server. Both fall
+  back to plain reads where sendfile is unavailable.
+
+prepare() builds the status, headers and a list of body segments.
+Segments are literal bytes (multipart boundaries) or (offset, length)
+slices of the file, and send_blocking / send_async write them.
+"""
+
+import os
+import uuid
+import mimetypes
+import posixpath
+import email.utils
+import urllib.parse
+
+
+DOWNLOAD_PREFIXES = (("/uploads/", "uploads"), ("/pdfs/", "pdfs"))
+MAX_RANGES = 16
+
+
+class FileResponse:
+    def __init__(self, status, headers, segments=(), path=None):
+        self.status = status
+        self.headers = headers
+        self.segments = list(segments)
+        self.path = path
+
+    @property
+    def content_length(self):
+        return sum(len(s) if isinstance(s, bytes) else s[1] for s in self.segments)
+
+
+def resolve(url_path, root="."):
+    """Local file for a download URL, or None when the path is not one."""
+    for prefix, directory in DOWNLOAD_PREFIXES:
+        if url_path.startswith(prefix):
+            relative = posixpath.normpath(urllib.parse.unquote(url_path[len(prefix):]))
+            parts = [p for p in relative.split("/") if p and p not in (".", "..")]
+            if not parts:
+                return None
+            path = os.path.join(root, directory, *parts)
+            return path if os.path.isfile(path) else None
+    return None
+
+
+def parse_range(header, size):
+    """Byte ranges from a Range header as inclusive (start, end) pairs.
+
+    Returns None when the header is absent, malformed or asks for too many
+    ranges (the whole file is then sent), and [] when no range can be
+    satisfied (416). Overlapping and adjacent ranges are merged.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    ranges = []
+    for item in spec.split(","):
+        first, dash, last = item.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first == "":
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _etag_listed(header, etag):
+    if not header:
+        return False
+    return header.strip() == "*" or any(
+        candidate.strip().removeprefix("W/") == etag for candidate in header.split(",")
+    )
+
+
+def prepare(url_path, headers, root="."):
+    """FileResponse for a GET/HEAD of a download URL, or None if not one."""
+    path = resolve(url_path, root)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    size = stat.st_size
+    mtime = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = email.utils.formatdate(mtime, usegmt=True)
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    base = [
+        ("Accept-Ranges", "bytes"),
+        ("ETag", etag),
+        ("Last-Modified", last_modified),
+    ]
+
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match:
+        if _etag_listed(if_none_match, etag):
+            return FileResponse(304, base, path=path)
+    else:
+        since = _http_date(headers.get("If-Modified-Since"))
+        if since is not None and mtime <= since:
+            return FileResponse(304, base, path=path)
+
+    ranges = parse_range(headers.get("Range"), size)
+    if_range = headers.get("If-Range")
+    if ranges is not None and if_range:
+        # A changed file means the client's partial copy is stale: send it all.
+        if if_range.strip().startswith(('"', "W/")):
+            if if_range.strip() != etag:
+                ranges = None
+        elif _http_date(if_range) != mtime:
+            ranges = None
+
+    if ranges is None:
+        return FileResponse(
+            200, base + [("Content-Type", content_type)], [(0, size)] if size else [], path,
+        )
+    if not ranges:
+        return FileResponse(416, base + [("Content-Range", f"bytes */{size}")], path=path)
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return FileResponse(206, base + [
+            ("Content-Type", content_type),
+            ("Content-Range", f"bytes {start}-{end}/{size}"),
+        ], [(start, end - start + 1)], path)
+
+    boundary = uuid.uuid4().hex
+    segments = []
+    for start, end in ranges:
+        segments.append((
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode("latin-1"))
+        segments.append((start, end - start + 1))
+    segments.append(f"\r\n--{boundary}--\r\n".encode("latin-1"))
+    return FileResponse(206, base + [
+        ("Content-Type", f"multipart/byteranges; boundary={boundary}"),
+    ], segments, path)
+
+
+def send_blocking(sock, response):
+    """Write the body segments to a connected socket (threaded servers)."""
+    if not response.segments:
+        return
+    with open(response.path, "rb") as f:
+        for segment in response.segments:
+            if isinstance(segment, bytes):
+                sock.sendall(segment)
+            else:
+                offset, length = segment
+                sock.sendfile(f, offset, length)
+
+
+async def send_async(loop, writer, response):
+    """Write the body segments to an asyncio StreamWriter."""
+    if not response.segments:
+        return
+    await writer.drain()
+    with open(response.path, "rb") as f:
+        for segment in response.segments:
+            if isinstance(segment, bytes):
+                writer.write(segment)
+                await writer.drain()
+            else:
+                offset, length = segment
+                await loop.sendfile(writer.transport, f, offset, length)
+
@@ -0,0 +1,174 @@
+"""Content-addressed on-disk cache for expensive submission stages.
+
+Entries are keyed by the SHA-256 of the PDF bytes plus whatever else
+determines the stage output (extraction limits, render DPI, the exact Grok
+prompt and model). An identical resubmission therefore skips text
+extraction, page rendering, the GitHub upload and the Grok call.
+
+Layout: <cache_dir>/<namespace>/<key digest>.json. Total size is capped;
+when a write pushes the cache over the cap, the least recently used entries
+are evicted. File mtimes double as the LRU clock so ordering survives
+restarts.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+import logutil
+
+
+CACHE_DIR = os.environ.get("TSM2_CACHE_DIR", "cache")
+CACHE_MAX_BYTES = int(os.environ.get("TSM2_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+def key_digest(*parts):
+    """Stable digest for a tuple of key parts (str, bytes, numbers, None)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe, size-bounded LRU cache of JSON values on disk."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = max_bytes > 0
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> [size, last_used]
+        self._total = 0
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        if self.enabled:
+            self._load_index()
+
+    def _load_index(self):
+        if not os.path.isdir(self.root):
+            return
+        for namespace in os.listdir(self.root):
+            ns_dir = os.path.join(self.root, namespace)
+            if not os.path.isdir(ns_dir):
+                continue
+            for name in os.listdir(ns_dir):
+                path = os.path.join(ns_dir, name)
+                if name.endswith(".tmp"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                self._entries[path] = [st.st_size, st.st_mtime]
+                self._total += st.st_size
+
+    def _path(self, namespace, digest):
+        return os.path.join(self.root, namespace, digest + ".json")
+
+    def get(self, namespace, *key_parts):
+        """Return the cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(namespace, key_digest(*key_parts))
+        with self._lock:
+            known = path in self._entries
+        value = None
+        if known:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                self._forget(path)
+        with self._lock:
+            counter = self.hits if value is not None else self.misses
+            counter[namespace] = counter.get(namespace, 0) + 1
+            if value is not None and path in self._entries:
+                now = time.time()
+                self._entries[path][1] = now
+        if value is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return value
+
+    def put(self, namespace, value, *key_parts):
+        """Store a JSON-serialisable value and evict LRU entries if over the cap."""
+        if not self.enabled:
+            return
+        path = self._path(namespace, key_digest(*key_parts))
+        try:
+            data = json.dumps(value).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            logutil.warning("CACHE", f"Not caching {namespace}: {e}")
+            return
+        if len(data) > self.max_bytes:
+            return
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logutil.warning("CACHE", f"Write failed for {namespace}: {e}")
+            return
+        with self._lock:
+            old = self._entries.get(path)
+            if old:
+                self._total -= old[0]
+            self._entries[path] = [len(data), time.time()]
+            self._total += len(data)
+            victims = self._evict_locked()
+        for victim in victims:
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+
+    def _evict_locked(self):
+        victims = []
+        if self._total <= self.max_bytes:
+            return victims
+        for path, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            victims.append(path)
+            self._total -= size
+            self.evictions += 1
+        for path in victims:
+            del self._entries[path]
+        return victims
+
+    def _forget(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry:
+                self._total -= entry[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "evictions": self.evictions,
+            }
+
+
+RESULT_CACHE = ResultCache()
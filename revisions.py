@@ -0,0 +1,298 @@
+"""Incremental re-evaluation of revised resubmissions.
+
+A submitter who was asked to "revise and re-submit" can name the issue
+being revised ("Revision of issue #" on the form, formData
+resubmission_of). The earlier version is never re-read. Its document
+fingerprint, stored with its scorecard in scorestore, is built from the
+full text of every page (PdfEngine.digest), not from the truncated
+text the Grok prompt gets, and holds:
+
+- one hash per section (sectionindex.split_sections), with the criteria
+  that section is relevant to (sectionindex.build_index);
+- one hash per page of text (pdfengine.page_text_hash), and one per page
+  of its figures (pdfengine.page_visual_hash);
+- the form fields the Grok prompt shows (criteriaeval.PROMPT_FORM_FIELDS);
+- a salted digest of the submitter's email, so only the original
+  submitter can revise an issue. The address itself is never stored.
+
+plan() diffs the new fingerprint against the stored one. A criterion is
+re-evaluated when any of these hold:
+- a section relevant to it changed, appeared or disappeared;
+- no section is relevant to it and any section changed;
+- it is assessed from page images (criteriaeval.VISUAL_CRITERIA) and a
+  figure was added, changed or removed;
+- the prompt's form fields changed;
+- its earlier verdict was not PASS/NON_COMPLIANT;
+- either version had no extractable text, or was not fingerprinted from
+  its full text (stored before full-text fingerprints);
+- page text changed but no section did, i.e. the edit fell outside
+  anything compared section by section.
+Every other criterion keeps its stored verdict, marked carried_over_from.
+The change summary goes into the new issue and is posted as a comment on
+the original one.
+"""
+
+import re
+import hmac
+import hashlib
+import secrets
+
+import criteriaeval
+import logutil
+import pdfengine
+import scorestore
+import sectionindex
+
+
+FORM_KEYS = tuple(key for key, _ in criteriaeval.PROMPT_FORM_FIELDS)
+ISSUE_REF = re.compile(r"(?:#|/issues/)?\s*(\d{1,9})\s*/?$")
+MAX_LISTED = 12
+
+
+def parse_issue_ref(value):
+    """43, "#43" or an issue URL -> 43; anything else -> None."""
+    match = ISSUE_REF.search(str(value or "").strip())
+    return int(match.group(1)) if match else None
+
+
+def submitter_digest(email, salt=None):
+    """"salt$sha256(salt + email)", with a fresh random salt unless one is given."""
+    salt = salt or secrets.token_hex(8)
+    normalized = str(email or "").strip().lower()
+    return f"{salt}${hashlib.sha256((salt + normalized).encode('utf-8')).hexdigest()}"
+
+
+def same_submitter(stored, email):
+    """True if email is the address the stored submitter_digest was made from."""
+    salt, _, _ = str(stored or "").partition("$")
+    return bool(salt) and hmac.compare_digest(stored, submitter_digest(email, salt))
+
+
+def fingerprint(digest, form_data, user_info):
+    """The stored description of one submitted version (see module docstring).
+
+    digest is the PdfEngine.digest result, or None if the PDF could
+    not be read.
+    """
+    digest = digest or {}
+    pdf_text = digest.get("text")
+    sections = sectionindex.split_sections(pdf_text) if pdf_text else []
+    index = sectionindex.build_index(sections)
+    relevant = {i: [] for i in range(len(sections))}
+    for cid, scored in index.items():
+        for _, position in scored:
+            relevant[position].append(cid)
+    seen = {}
+    entries = []
+    for i, section in enumerate(sections):
+        heading = section["heading"]
+        # Repeated headings ("Example", "Proof") are told apart by occurrence.
+        name = " ".join(heading.lower().split())
+        seen[name] = seen.get(name, 0) + 1
+        entries.append({
+            "key": f"{name}#{seen[name]}",
+            "heading": heading[:120],
+            "hash": pdfengine.page_text_hash(section["text"]),
+            "chars": len(section["text"]),
+            "criteria": sorted(relevant[i]),
+        })
+    visuals = digest.get("page_visual_hashes")
+    return {
+        "text": bool(pdf_text),
+        "complete": True,
+        "sections": entries,
+        "pages": list(digest.get("page_hashes") or []),
+        # None when figures could not be hashed (no PyMuPDF).
+        "visuals": list(visuals) if visuals is not None else None,
+        "form": {key: (form_data or {}).get(key) for key in FORM_KEYS},
+        "submitter": submitter_digest((user_info or {}).get("email")),
+    }
+
+
+def diff(old, new):
+    """What changed between two fingerprints, and which criteria that touches.
+
+    Returns {"changed", "added", "removed": [headings], "unchanged": int,
+    "pages_changed": [1-based page numbers], "pages_added",
+    "pages_removed": int, "figures_changed": [1-based page numbers],
+    "figures_removed": int, "form_changed": [keys],
+    "stale": {criterion id: [reasons]}}. Figures are matched by content,
+    not position, so inserting a page does not count as changing the
+    figures after it.
+    """
+    old_sections = {s["key"]: s for s in old["sections"]}
+    new_sections = {s["key"]: s for s in new["sections"]}
+    stale = {}
+
+    def touch(criteria, reason):
+        for cid in criteria:
+            stale.setdefault(cid, []).append(reason)
+
+    changed, added, removed = [], [], []
+    for key, section in new_sections.items():
+        before = old_sections.get(key)
+        if before is None:
+            added.append(section["heading"])
+            touch(section["criteria"], f"section \"{section['heading']}\" added")
+        elif before["hash"] != section["hash"]:
+            changed.append(section["heading"])
+            touch(sorted(set(section["criteria"]) | set(before["criteria"])), f"section \"{section['heading']}\" changed")
+    for key, section in old_sections.items():
+        if key not in new_sections:
+            removed.append(section["heading"])
+            touch(section["criteria"], f"section \"{section['heading']}\" removed")
+
+    # A criterion no section scores for could be affected by any edit.
+    indexed = {cid for s in old["sections"] + new["sections"] for cid in s["criteria"]}
+    if changed or added or removed:
+        touch([cid for cid in criteriaeval.ALL_CRITERIA if cid not in indexed], "no section specific to it, and the text changed")
+
+    figures_changed, figures_removed = [], 0
+    if old.get("visuals") is None or new.get("visuals") is None:
+        touch(criteriaeval.VISUAL_CRITERIA, "figures could not be compared")
+    else:
+        old_figures = {h for h in old["visuals"] if h}
+        new_figures = {h for h in new["visuals"] if h}
+        figures_changed = [i + 1 for i, h in enumerate(new["visuals"]) if h and h not in old_figures]
+        figures_removed = len(old_figures - new_figures)
+        if figures_changed or figures_removed:
+            touch(criteriaeval.VISUAL_CRITERIA, "figures added, changed or removed")
+
+    form_changed = [key for key in FORM_KEYS if (old.get("form") or {}).get(key) != (new.get("form") or {}).get(key)]
+    if form_changed:
+        touch(criteriaeval.ALL_CRITERIA, f"form field {', '.join(form_changed)} changed")
+    if not old.get("text") or not new.get("text"):
+        touch(criteriaeval.ALL_CRITERIA, "PDF text unavailable for comparison")
+    if not old.get("complete") or not new.get("complete"):
+        touch(criteriaeval.ALL_CRITERIA, "earlier version was compared on truncated text")
+
+    old_pages, new_pages = old.get("pages") or [], new.get("pages") or []
+    pages_changed = [i + 1 for i, (a, b) in enumerate(zip(old_pages, new_pages)) if a != b]
+    pages_added = max(0, len(new_pages) - len(old_pages))
+    pages_removed = max(0, len(old_pages) - len(new_pages))
+    if (pages_changed or pages_added or pages_removed) and not (changed or added or removed):
+        touch(criteriaeval.ALL_CRITERIA, "page text changed outside the compared sections")
+    return {
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+        "unchanged": len(new_sections) - len(changed) - len(added),
+        "pages_changed": pages_changed,
+        "pages_added": pages_added,
+        "pages_removed": pages_removed,
+        "figures_changed": figures_changed,
+        "figures_removed": figures_removed,
+        "form_changed": form_changed,
+        "stale": {cid: reasons for cid, reasons in sorted(stale.items())},
+    }
+
+
+def plan(form_data, user_info, new_fingerprint):
+    """Work out an incremental re-evaluation, or None for a full one.
+
+    Returns None unless form_data names an earlier issue whose scorecard
+    and fingerprint are stored and which was submitted from the same
+    email address. Otherwise returns {"base_issue", "changes" (see diff),
+    "reevaluate": [criterion ids], "reuse": {criterion id: stored
+    criterion}}.
+    """
+    base_issue = parse_issue_ref((form_data or {}).get("resubmission_of"))
+    if base_issue is None:
+        return None
+    scorecard = scorestore.SCORECARDS.get(base_issue)
+    old = scorestore.SCORECARDS.fingerprint(base_issue)
+    if scorecard is None or old is None:
+        logutil.info("REVISION", f"No stored fingerprint for issue #{base_issue}; evaluating in full", issue=base_issue)
+        return None
+    if not same_submitter(old.get("submitter"), (user_info or {}).get("email")):
+        logutil.warning("REVISION", f"Submitter does not match issue #{base_issue}; evaluating in full", issue=base_issue)
+        return None
+
+    changes = diff(old, new_fingerprint)
+    prior = {c.get("id"): c for c in scorecard.get("criteria") or []}
+    for cid in criteriaeval.ALL_CRITERIA:
+        if prior.get(cid, {}).get("status") not in criteriaeval.STATUSES:
+            changes["stale"].setdefault(cid, []).append("no earlier verdict")
+    changes["stale"] = {cid: reasons for cid, reasons in sorted(changes["stale"].items())}
+    reuse = {
+        cid: dict(prior[cid], carried_over_from=prior[cid].get("carried_over_from") or base_issue)
+        for cid in criteriaeval.ALL_CRITERIA if cid not in changes["stale"]
+    }
+    revision = {
+        "base_issue": base_issue,
+        "base_status": scorecard.get("overall_status"),
+        "changes": changes,
+        "reevaluate": list(changes["stale"]),
+        "reuse": reuse,
+    }
+    logutil.info("REVISION", f"Revision of #{base_issue}: re-evaluating {revision['reevaluate']}, reusing {sorted(reuse)}",
+                 issue=base_issue)
+    return revision
+
+
+def _listing(items):
+    if not items:
+        return "none"
+    shown = ", ".join(f"“{item}”" for item in items[:MAX_LISTED])
+    return shown + (f" and {len(items) - MAX_LISTED} more" if len(items) > MAX_LISTED else "")
+
+
+def _criteria_names(ids):
+    return ", ".join(f"{cid}. {sectionindex.CRITERION_NAMES.get(cid, '?')}" for cid in ids) or "none"
+
+
+def changes_markdown(revision, compliance_result):
+    """The change summary shared by the new issue body and the comment on the original."""
+    changes = revision["changes"]
+    pages = ", ".join(str(p) for p in changes["pages_changed"][:MAX_LISTED * 2]) or "none"
+    if changes["pages_added"]:
+        pages += f"; {changes['pages_added']} page(s) added"
+    if changes["pages_removed"]:
+        pages += f"; {changes['pages_removed']} page(s) removed"
+    lines = [
+        f"- **Sections changed:** {_listing(changes['changed'])}",
+        f"- **Sections added:** {_listing(changes['added'])}",
+        f"- **Sections removed:** {_listing(changes['removed'])}",
+        f"- **Sections unchanged:** {changes['unchanged']}",
+        f"- **Pages with changed text:** {pages}",
+    ]
+    if changes.get("figures_changed") or changes.get("figures_removed"):
+        figures = ", ".join(str(p) for p in changes["figures_changed"][:MAX_LISTED * 2]) or "none"
+        if changes["figures_removed"]:
+            figures += f"; {changes['figures_removed']} figure(s) removed"
+        lines.append(f"- **Pages with new or changed figures:** {figures}")
+    if changes["form_changed"]:
+        lines.append(f"- **Form fields changed:** {', '.join(changes['form_changed'])}")
+    lines.append("")
+    lines.append(f"**Re-evaluated:** {_criteria_names(revision['reevaluate'])}")
+    for cid, reasons in changes["stale"].items():
+        lines.append(f"- {cid}: {'; '.join(reasons[:3])}{' …' if len(reasons) > 3 else ''}")
+    lines.append("")
+    lines.append(f"**Carried over unchanged:** {_criteria_names(sorted(revision['reuse']))}")
+    if compliance_result:
+        lines.append("")
+        lines.append(f"**AI pre-check:** {compliance_result.get('overall_status', 'UNAVAILABLE')} "
+                     f"(previously {revision.get('base_status') or 'UNAVAILABLE'})")
+    return "\n".join(lines) + "\n"
+
+
+def issue_section(revision, compliance_result):
+    """Markdown appended to the revised submission's issue body."""
+    return f"""
+
+---
+
+### Revision of #{revision['base_issue']}
+
+Compared with the version submitted in #{revision['base_issue']}. Criteria whose supporting sections did not change keep their earlier verdicts.
+
+{changes_markdown(revision, compliance_result)}"""
+
+
+def comment_body(revision, compliance_result, issue_number, issue_url):
+    """The comment posted on the original issue."""
+    return f"""### Revised version submitted: #{issue_number}
+
+A revised version of this submission was received as [#{issue_number}]({issue_url}).
+
+{changes_markdown(revision, compliance_result)}"""
@@ -0,0 +1,392 @@
+"""Local, indexed store of compliance scorecards (SQLite).
+
+Every evaluated submission is written here once its GitHub issue exists,
+keyed by issue number. Reporting therefore never has to scrape issue
+bodies. Rows are indexed by PDF hash, scale, overall status and submission
+time. Per-criterion verdicts live in their own indexed table, so "every
+submission failing Falsifiability" is one lookup.
+
+Aggregates are maintained incrementally by triggers in the same
+transaction as each write: counts by overall status and by scale, plus
+evaluated/failed counts per criterion. GET /api/scorecards/stats reads
+them directly rather than scanning the table.
+
+Alongside each portal scorecard the store keeps its document fingerprint
+(section and page hashes, see revisions.py). A later revision can then
+be diffed against it without the old PDF.
+
+Older scorecards exported as JSON (scorecards/<n>.json, which uses
+number/overall_verdict instead of id/overall_status) are imported when a
+new database is created, or on demand:
+
+    python scorestore.py import scorecards/*.json
+    python scorestore.py stats
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import sqlite3
+import threading
+
+import logutil
+import sectionindex
+
+
+DEFAULT_PATH = os.path.join(logutil.DATA_DIR, "scorecards.db")
+STORE_PATH = os.environ.get("TSM2_SCORECARD_DB", DEFAULT_PATH)
+# Where the database used to be created: inside the served working directory.
+LEGACY_PATH = "scorecards.db"
+IMPORT_DIR = "scorecards"
+MAX_PAGE = 200
+FAILED = "NON_COMPLIANT"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scorecards (
+    issue_number INTEGER PRIMARY KEY,
+    title TEXT,
+    scale TEXT,
+    overall_status TEXT NOT NULL,
+    pdf_sha256 TEXT,
+    pdf_url TEXT,
+    submitted_at TEXT,
+    source TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scorecards_pdf ON scorecards (pdf_sha256);
+CREATE INDEX IF NOT EXISTS scorecards_scale ON scorecards (scale, submitted_at);
+CREATE INDEX IF NOT EXISTS scorecards_status ON scorecards (overall_status, submitted_at);
+CREATE INDEX IF NOT EXISTS scorecards_submitted ON scorecards (submitted_at);
+
+CREATE TABLE IF NOT EXISTS criteria (
+    issue_number INTEGER NOT NULL,
+    criterion_id INTEGER NOT NULL,
+    name TEXT,
+    status TEXT NOT NULL,
+    PRIMARY KEY (issue_number, criterion_id)
+);
+CREATE INDEX IF NOT EXISTS criteria_status ON criteria (criterion_id, status);
+
+CREATE TABLE IF NOT EXISTS documents (
+    issue_number INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS totals (
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (dimension, value)
+);
+CREATE TABLE IF NOT EXISTS criterion_totals (
+    criterion_id INTEGER PRIMARY KEY,
+    evaluated INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS scorecard_added AFTER INSERT ON scorecards BEGIN
+    INSERT INTO totals VALUES ('overall_status', NEW.overall_status, 1)
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+    INSERT INTO totals VALUES ('scale', COALESCE(NEW.scale, ''), 1)
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS scorecard_removed AFTER DELETE ON scorecards BEGIN
+    UPDATE totals SET count = count - 1 WHERE dimension = 'overall_status' AND value = OLD.overall_status;
+    UPDATE totals SET count = count - 1 WHERE dimension = 'scale' AND value = COALESCE(OLD.scale, '');
+END;
+CREATE TRIGGER IF NOT EXISTS criterion_added AFTER INSERT ON criteria BEGIN
+    INSERT INTO criterion_totals VALUES (NEW.criterion_id, 1, NEW.status = 'NON_COMPLIANT')
+        ON CONFLICT (criterion_id) DO UPDATE SET
+            evaluated = evaluated + 1, failed = failed + (NEW.status = 'NON_COMPLIANT');
+END;
+CREATE TRIGGER IF NOT EXISTS criterion_removed AFTER DELETE ON criteria BEGIN
+    UPDATE criterion_totals SET
+        evaluated = evaluated - 1, failed = failed - (OLD.status = 'NON_COMPLIANT')
+    WHERE criterion_id = OLD.criterion_id;
+END;
+"""
+
+
+def utc_now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+def from_compliance(issue_number, compliance_result, form_data=None, pdf_sha256=None, pdf_url=None, revision=None):
+    """A scorecard dict from the server's compliance result (criteria with id/status).
+
+    revision is the revisions.plan() result when this submission revised
+    an earlier issue.
+    """
+    form_data = form_data or {}
+    scorecard = {
+        "issue_number": issue_number,
+        "submission_title": form_data.get("submission_title"),
+        "primary_scale": form_data.get("primary_scale"),
+        "core_claim": form_data.get("core_claim"),
+        "overall_status": compliance_result.get("overall_status", "UNAVAILABLE"),
+        "summary": compliance_result.get("message"),
+        "criteria": [
+            {
+                "id": c.get("id"),
+                "name": c.get("name") or sectionindex.CRITERION_NAMES.get(c.get("id")),
+                "status": c.get("status"),
+                "reason": c.get("reason"),
+                "required_correction": c.get("required_correction"),
+                "carried_over_from": c.get("carried_over_from"),
+            }
+            for c in compliance_result.get("criteria") or []
+        ],
+        "minimum_corrections": compliance_result.get("minimum_corrections") or [],
+        "pdf_sha256": pdf_sha256,
+        "pdf_url": pdf_url,
+        "submitted_at": utc_now(),
+    }
+    if revision:
+        scorecard["revision_of"] = revision["base_issue"]
+        scorecard["revision"] = revision["changes"]
+    return scorecard
+
+
+def from_exported(data):
+    """Convert an exported scorecards/<n>.json (number/overall_verdict, separate corrections)."""
+    corrections = {c.get("number"): c.get("correction") for c in data.get("corrections") or []}
+    return {
+        "issue_number": data["issue_number"],
+        "submission_title": data.get("submission_title"),
+        "primary_scale": data.get("primary_scale"),
+        "core_claim": data.get("core_claim"),
+        "overall_status": data.get("overall_verdict") or data.get("overall_status") or "UNAVAILABLE",
+        "summary": data.get("summary"),
+        "criteria": [
+            {
+                "id": c.get("number", c.get("id")),
+                "name": c.get("name"),
+                "status": c.get("status"),
+                "reason": c.get("reason"),
+                "required_correction": corrections.get(c.get("number", c.get("id"))),
+            }
+            for c in data.get("criteria") or []
+        ],
+        "minimum_corrections": [c.get("correction") for c in data.get("corrections") or []],
+        "pdf_sha256": data.get("pdf_sha256"),
+        "pdf_url": data.get("pdf_url"),
+        "submitted_at": data.get("submitted_at"),
+        "examiner_status": data.get("examiner_status"),
+        "registration_number": data.get("registration_number"),
+    }
+
+
+class ScorecardStore:
+    """One SQLite connection shared by all threads behind a lock."""
+
+    def __init__(self, path=STORE_PATH, import_dir=IMPORT_DIR):
+        self.path = path
+        self.import_dir = import_dir
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.path == DEFAULT_PATH and not os.path.exists(self.path) and os.path.exists(LEGACY_PATH):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(LEGACY_PATH + suffix):
+                    os.replace(LEGACY_PATH + suffix, self.path + suffix)
+            logutil.info("SCORECARDS", f"Moved {LEGACY_PATH} to {self.path}")
+        created = not os.path.exists(self.path)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        self._db = db
+        if created and self.import_dir and os.path.isdir(self.import_dir):
+            imported = sum(1 for path in sorted(glob.glob(os.path.join(self.import_dir, "*.json")))
+                           if self._import_locked(path))
+            logutil.info("SCORECARDS", f"Created {self.path}; imported {imported} scorecard(s) from {self.import_dir}/")
+        return db
+
+    def record(self, scorecard, source="portal", fingerprint=None):
+        """Insert or replace the scorecard (and document fingerprint, if given) for its issue number."""
+        with self._lock:
+            self._write_locked(scorecard, source, fingerprint)
+
+    def _write_locked(self, scorecard, source, fingerprint=None):
+        db = self._connect()
+        issue_number = int(scorecard["issue_number"])
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Delete then insert, so the triggers retract the old row's counts.
+            db.execute("DELETE FROM criteria WHERE issue_number = ?", (issue_number,))
+            db.execute("DELETE FROM scorecards WHERE issue_number = ?", (issue_number,))
+            db.execute(
+                "INSERT INTO scorecards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    issue_number, scorecard.get("submission_title"), scorecard.get("primary_scale"),
+                    scorecard.get("overall_status") or "UNAVAILABLE", scorecard.get("pdf_sha256"),
+                    scorecard.get("pdf_url"), scorecard.get("submitted_at"), source,
+                    json.dumps(scorecard),
+                ),
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO criteria VALUES (?, ?, ?, ?)",
+                [
+                    (issue_number, int(c["id"]), c.get("name"), c.get("status") or "UNAVAILABLE")
+                    for c in scorecard.get("criteria") or [] if str(c.get("id", "")).isdigit()
+                ],
+            )
+            if fingerprint is not None:
+                db.execute("INSERT OR REPLACE INTO documents VALUES (?, ?)", (issue_number, json.dumps(fingerprint)))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def import_file(self, path):
+        """Import one exported scorecard JSON file; returns True on success."""
+        with self._lock:
+            self._connect()
+            return self._import_locked(path)
+
+    def _import_locked(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                scorecard = from_exported(json.load(f))
+            self._write_locked(scorecard, "import")
+            return True
+        except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            logutil.warning("SCORECARDS", f"Could not import {path}: {e}")
+            return False
+
+    def get(self, issue_number):
+        """The full stored scorecard, or None."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT data FROM scorecards WHERE issue_number = ?", (issue_number,)
+            ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def fingerprint(self, issue_number):
+        """The stored document fingerprint for an issue, or None."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT fingerprint FROM documents WHERE issue_number = ?", (issue_number,)
+            ).fetchone()
+        return json.loads(row["fingerprint"]) if row else None
+
+    def query(self, status=None, scale=None, pdf_sha256=None, criterion=None, criterion_status=FAILED,
+              since=None, until=None, limit=50, offset=0):
+        """Scorecard summaries matching every given filter, newest first.
+
+        criterion selects scorecards whose verdict on that criterion id is
+        criterion_status (NON_COMPLIANT by default). since/until compare
+        ISO-8601 submission times.
+
+        Returns:
+            {'total': matching rows, 'scorecards': [summary dicts]}
+        """
+        where, params = [], []
+        for column, value in (("overall_status", status), ("scale", scale), ("pdf_sha256", pdf_sha256)):
+            if value:
+                where.append(f"s.{column} = ?")
+                params.append(value)
+        if since:
+            where.append("s.submitted_at >= ?")
+            params.append(since)
+        if until:
+            where.append("s.submitted_at < ?")
+            params.append(until)
+        if criterion is not None:
+            where.append("s.issue_number IN (SELECT issue_number FROM criteria WHERE criterion_id = ? AND status = ?)")
+            params.extend([criterion, criterion_status])
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        limit = max(1, min(int(limit), MAX_PAGE))
+        offset = max(0, int(offset))
+        with self._lock:
+            db = self._connect()
+            total = db.execute(f"SELECT COUNT(*) FROM scorecards s {clause}", params).fetchone()[0]
+            rows = db.execute(
+                f"""SELECT s.issue_number, s.title, s.scale, s.overall_status, s.pdf_sha256, s.pdf_url,
+                           s.submitted_at, s.source,
+                           (SELECT group_concat(criterion_id) FROM criteria c
+                            WHERE c.issue_number = s.issue_number AND c.status = '{FAILED}') AS failed
+                    FROM scorecards s {clause}
+                    ORDER BY s.submitted_at DESC, s.issue_number DESC LIMIT ? OFFSET ?""",
+                params + [limit, offset],
+            ).fetchall()
+        scorecards = []
+        for row in rows:
+            item = {key: row[key] for key in row.keys() if key != "failed"}
+            item["failed_criteria"] = sorted(int(cid) for cid in row["failed"].split(",")) if row["failed"] else []
+            scorecards.append(item)
+        return {"total": total, "scorecards": scorecards}
+
+    def stats(self):
+        """Aggregate counts kept by the triggers: by status, by scale, and per-criterion failure rates."""
+        with self._lock:
+            db = self._connect()
+            totals = db.execute("SELECT dimension, value, count FROM totals WHERE count > 0").fetchall()
+            criteria = db.execute(
+                "SELECT criterion_id, evaluated, failed FROM criterion_totals WHERE evaluated > 0 ORDER BY criterion_id"
+            ).fetchall()
+        by_status = {row["value"]: row["count"] for row in totals if row["dimension"] == "overall_status"}
+        by_scale = {row["value"] or "Not specified": row["count"] for row in totals if row["dimension"] == "scale"}
+        return {
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_scale": by_scale,
+            "criteria": [
+                {
+                    "id": row["criterion_id"],
+                    "name": sectionindex.CRITERION_NAMES.get(row["criterion_id"]),
+                    "evaluated": row["evaluated"],
+                    "failed": row["failed"],
+                    "failure_rate": round(row["failed"] / row["evaluated"], 4),
+                }
+                for row in criteria
+            ],
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+SCORECARDS = ScorecardStore()
+
+
+def record_submission(issue_number, compliance_result, form_data, pdf_sha256, pdf_url, fingerprint=None, revision=None):
+    """Store a new submission's scorecard and fingerprint; a failure is logged, never raised."""
+    try:
+        SCORECARDS.record(
+            from_compliance(issue_number, compliance_result, form_data, pdf_sha256, pdf_url, revision),
+            fingerprint=fingerprint,
+        )
+    except (sqlite3.Error, OSError, ValueError, TypeError) as e:
+        logutil.error("SCORECARDS", f"Could not store scorecard for issue #{issue_number}: {e}", issue=issue_number)
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == "import":
+        paths = [p for pattern in argv[1:] for p in sorted(glob.glob(pattern))]
+        imported = sum(1 for path in paths if SCORECARDS.import_file(path))
+        print(f"Imported {imported}/{len(paths)} scorecard(s) into {SCORECARDS.path}")
+        return 0 if imported == len(paths) else 1
+    if argv == ["stats"]:
+        print(json.dumps(SCORECARDS.stats(), indent=2))
+        return 0
+    print("usage: python scorestore.py import FILE... | stats", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    code = main(sys.argv[1:])
+    logutil.WRITER.shutdown()
+    sys.exit(code)
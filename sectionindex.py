@@ -0,0 +1,259 @@
+"""Criterion-aware section index for the Grok compliance prompt.
+
+The extracted PDF text (up to 60,000 characters) used to go into the prompt
+verbatim. Here it is split into headed sections, and each section is
+scored against the nine criteria by keyword hints in its heading and body.
+A compact version of the text is then assembled within a token budget:
+
+- the front matter (title, abstract) is always kept, as orientation;
+- sections are then picked round-robin across the criteria, best match
+  first, so every criterion gets its most relevant evidence before any
+  criterion gets a second section;
+- long sections are cut to a share of the budget;
+- the kept sections are emitted in document order. Each run of omitted
+  sections is replaced by a one-line list of their headings, so the model
+  still sees the outline around the evidence.
+
+Text that already fits the budget is passed through unchanged. Token counts
+are estimated at about 4 characters per token; no tokenizer is needed.
+TSM2_PROMPT_TOKEN_BUDGET=0 disables compaction.
+"""
+
+import os
+import re
+import threading
+
+
+TOKEN_BUDGET = int(os.environ.get("TSM2_PROMPT_TOKEN_BUDGET", "8000"))
+CHARS_PER_TOKEN = 4
+FRONT_MATTER_SHARE = 0.15
+MAX_SECTION_SHARE = 0.25
+# Kept back from the section budget for the omitted-section outline lines.
+OUTLINE_SHARE = 0.08
+OUTLINE_HEADINGS = 6
+
+# (id, name, heading hints, body hints). Hints are lowercase substrings.
+CRITERIA = [
+    (1, "Clear Core Claim",
+     ("abstract", "introduction", "summary", "overview", "thesis", "claim", "problem statement", "conclusion"),
+     ("we propose", "this paper", "we argue", "central claim", "core claim", "hypothesis", "we show")),
+    (2, "Defined Terms",
+     ("definition", "glossary", "terminology", "notation", "primitive", "concepts"),
+     ("defined as", "we define", "definition", "refers to", "denote", "is the term")),
+    (3, "Mechanism",
+     ("mechanism", "framework", "model", "generative", "derivation", "theory", "development"),
+     ("mechanism", "generat", "gives rise", "leads to", "causal", "pathway", "produces")),
+    (4, "Test Path",
+     ("test", "experiment", "procedure", "protocol", "validation", "verification", "method"),
+     ("experiment", "procedure", "protocol", "measure", "simulation", "test", "observation")),
+    (5, "Falsifiability",
+     ("falsif", "refut", "failure", "disconfirm"),
+     ("falsif", "refute", "would be rejected", "would fail", "disprove", "ruled out", "contradict")),
+    (6, "Dependency Transparency",
+     ("limitation", "scope", "assumption", "caveat", "does not claim", "boundaries"),
+     ("assum", "limitation", "scope", "does not claim", "caveat", "not intended", "beyond the scope")),
+    (7, "Non-Arbitrary Selection",
+     ("why these", "justification", "alternative", "choice", "selection", "rationale"),
+     ("justif", "alternative", "rather than", "chosen", "why these", "instead of", "rationale")),
+    (8, "Predictive Capability",
+     ("prediction", "result", "consequence", "implication", "signature", "outlook"),
+     ("predict", "scaling", "expect", "numerical", "observable", "signature", "estimate")),
+    (9, "Reproducibility",
+     ("method", "reproduc", "data", "appendix", "reference", "materials", "code"),
+     ("reproduc", "replicat", "equation", "dataset", "source code", "independent", "available")),
+]
+
+CRITERION_NAMES = {cid: name for cid, name, _, _ in CRITERIA}
+
+NUMBERED_HEADING = re.compile(r"^(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?|[IVX]{1,5}\.|(?:Appendix|Section)\s+[A-Z0-9]+[.:]?)\s+[A-Z\"'(]")
+KNOWN_HEADINGS = {
+    "abstract", "introduction", "background", "method", "methods", "methodology", "results",
+    "discussion", "conclusion", "conclusions", "limitations", "references", "bibliography",
+    "acknowledgments", "acknowledgements", "appendix", "definitions", "glossary", "predictions",
+    "falsifiability", "falsifiers", "summary", "scope", "assumptions", "keywords",
+}
+# Entries in these sections look like numbered headings; don't split them.
+TRAILING_HEADINGS = ("references", "bibliography", "works cited")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_heading(line):
+    line = line.strip()
+    if not line or len(line) > 100:
+        return False
+    if line.lower().rstrip(":") in KNOWN_HEADINGS:
+        return True
+    if NUMBERED_HEADING.match(line):
+        title = line.split(None, 1)[1]
+        # Numbered list items and sentences are not headings.
+        return not line.endswith((".", ",", ";")) and ". " not in title and len(title.split()) <= 14
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and len(line) <= 60 and all(c.isupper() for c in letters)
+
+
+def split_sections(text):
+    """Split text into [{"heading", "text"}]; the first holds the front matter."""
+    sections = [{"heading": "(front matter)", "lines": []}]
+    in_references = False
+    for line in text.splitlines():
+        if not in_references and is_heading(line):
+            sections.append({"heading": line.strip(), "lines": [line]})
+            in_references = line.strip().lower().rstrip(":").split()[-1] in TRAILING_HEADINGS
+        else:
+            sections[-1]["lines"].append(line)
+    result = []
+    for section in sections:
+        body = "\n".join(section["lines"]).strip()
+        if body:
+            result.append({"heading": section["heading"], "text": body})
+    return result
+
+
+def score_section(section, heading_hints, body_hints):
+    heading = section["heading"].lower()
+    body = section["text"].lower()
+    score = sum(4 for hint in heading_hints if hint in heading)
+    score += min(10, sum(body.count(hint) for hint in body_hints))
+    return score
+
+
+def build_index(sections):
+    """criterion id -> [(score, section position)], best first, scores > 0."""
+    index = {}
+    for cid, _, heading_hints, body_hints in CRITERIA:
+        scored = [(score_section(s, heading_hints, body_hints), i) for i, s in enumerate(sections)]
+        index[cid] = sorted(((score, i) for score, i in scored if score > 0), key=lambda x: (-x[0], x[1]))
+    return index
+
+
+def _clip(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit("\n", 1)[0] + "\n[… section shortened …]"
+
+
+def _outline(headings):
+    shown = "; ".join(headings[:OUTLINE_HEADINGS])
+    more = f"; +{len(headings) - OUTLINE_HEADINGS} more" if len(headings) > OUTLINE_HEADINGS else ""
+    return f"[… {len(headings)} section(s) omitted: {shown}{more} …]"
+
+
+def assemble(sections, index, criteria_ids, token_budget):
+    """Compact text for criteria_ids within token_budget.
+
+    Returns (text, kept, sections kept) where kept maps criterion id ->
+    headings kept for it.
+    """
+    budget = int(token_budget * CHARS_PER_TOKEN * (1 - OUTLINE_SHARE))
+    max_section = max(1500, int(budget * MAX_SECTION_SHARE))
+    chosen = {}
+    used = 0
+
+    if sections:
+        front = _clip(sections[0]["text"], max(800, int(budget * FRONT_MATTER_SHARE)))
+        chosen[0] = front
+        used += len(front)
+
+    kept = {cid: [] for cid in criteria_ids}
+    queues = {cid: [i for _, i in index.get(cid, [])] for cid in criteria_ids}
+    progress = True
+    while progress and used < budget:
+        progress = False
+        for cid in criteria_ids:
+            while queues[cid]:
+                i = queues[cid].pop(0)
+                if i in chosen:
+                    kept[cid].append(sections[i]["heading"])
+                    continue
+                text = _clip(sections[i]["text"], min(max_section, budget - used))
+                if len(text) < 200 and len(sections[i]["text"]) > len(text):
+                    continue
+                chosen[i] = text
+                used += len(text)
+                kept[cid].append(sections[i]["heading"])
+                progress = True
+                break
+
+    parts = []
+    omitted = []
+    for i, section in enumerate(sections):
+        if i in chosen:
+            if omitted:
+                parts.append(_outline(omitted))
+                omitted = []
+            parts.append(chosen[i])
+        else:
+            omitted.append(section["heading"][:60])
+    if omitted:
+        parts.append(_outline(omitted))
+    return "\n\n".join(parts), kept, len(chosen)
+
+
+def compact_pdf_text(text, token_budget=None, criteria_ids=None):
+    """(prompt text, report) for the extracted PDF text.
+
+    report = {"original_tokens", "prompt_tokens", "tokens_saved",
+    "sections", "sections_kept", "compacted", "criteria": {id: [headings]}}.
+    """
+    token_budget = TOKEN_BUDGET if token_budget is None else token_budget
+    criteria_ids = criteria_ids or [cid for cid, _, _, _ in CRITERIA]
+    original_tokens = estimate_tokens(text)
+    sections = split_sections(text)
+    report = {
+        "original_tokens": original_tokens,
+        "prompt_tokens": original_tokens,
+        "tokens_saved": 0,
+        "sections": len(sections),
+        "sections_kept": len(sections),
+        "compacted": False,
+        "criteria": {},
+    }
+    if token_budget <= 0 or original_tokens <= token_budget or len(sections) < 2:
+        return text, report
+    compact, kept, sections_kept = assemble(sections, build_index(sections), criteria_ids, token_budget)
+    prompt_tokens = estimate_tokens(compact)
+    if prompt_tokens >= original_tokens:
+        return text, report
+    report.update({
+        "prompt_tokens": prompt_tokens,
+        "tokens_saved": original_tokens - prompt_tokens,
+        "sections_kept": sections_kept,
+        "compacted": True,
+        "criteria": kept,
+    })
+    return compact, report
+
+
+class PromptStats:
+    """Running totals of prompt compaction for /api/status."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.compacted = 0
+        self.original_tokens = 0
+        self.prompt_tokens = 0
+
+    def record(self, report):
+        with self._lock:
+            self.prompts += 1
+            self.compacted += 1 if report["compacted"] else 0
+            self.original_tokens += report["original_tokens"]
+            self.prompt_tokens += report["prompt_tokens"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "compacted": self.compacted,
+                "original_tokens": self.original_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "tokens_saved": self.original_tokens - self.prompt_tokens,
+                "token_budget": TOKEN_BUDGET,
+            }
+
+
+PROMPT_STATS = PromptStats()
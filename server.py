@@ -5,35 +5,58 @@ from http.server import HTTPServer, SimpleHTTPRequestHandler
 from socketserver import ThreadingMixIn
 import json
 import os
-import urllib.request
-import urllib.error
+import http.client
 import sys
 import uuid
 import cgi
 import io
 import time
 import base64
+import urllib.parse
 import emailutil
+import jobs
+import multipart
+import resultcache
+import pdfengine
+import flows
+import grokapi
+import httppool
+import admission
+import staticassets
+import rangefiles
+import gitupload
+import githubclient
+import sectionindex
+import criteriaeval
+import metrics
+import logutil
+import scorestore
+import revisions
 
 try:
     import pdfplumber
     PDFPLUMBER_AVAILABLE = True
 except ImportError:
     PDFPLUMBER_AVAILABLE = False
-    print("[STARTUP] pdfplumber not installed; PDF text extraction will be disabled.", file=sys.stderr)
+    logutil.info("STARTUP", "pdfplumber not installed; PDF text extraction will be disabled.")
 
 try:
     import pymupdf
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
-    print("[STARTUP] pymupdf not installed; PDF page-to-image rendering will be disabled.", file=sys.stderr)
+    logutil.info("STARTUP", "pymupdf not installed; PDF page-to-image rendering will be disabled.")
 
 
 GITHUB_REPO = "TSM2Institute/submissions"
 GITHUB_PDF_BRANCH = "main"
 GITHUB_PDF_DIR = "pdfs"
 
+MAX_PDF_SIZE = 100 * 1024 * 1024
+PDF_TEXT_MAX_CHARS = 60000
+RENDER_MAX_PAGES = 50
+RENDER_DPI = 200
+
 SCALE_LABELS = {
     "Laboratory": "Scale: Laboratory",
     "Planetary": "Scale: Planetary",
@@ -46,6 +69,22 @@ SCALE_LABELS = {
 def upload_pdf_to_github(local_path, filename, github_pat):
     """Upload a PDF to the GitHub repo and return the permanent raw URL.
 
+    Blocking wrapper around upload_pdf_to_github_flow.
+    """
+    return flows.run(upload_pdf_to_github_flow(local_path, filename, github_pat))
+
+
+def read_base64(path):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def upload_pdf_to_github_flow(local_path, filename, github_pat):
+    """Upload a PDF to the GitHub repo and return the permanent raw URL (flow).
+
+    Uses the Git Data API with a streamed blob and batched commits
+    (gitupload) unless TSM2_GITHUB_UPLOAD=contents selects the Contents API.
+
     Args:
         local_path: path to the PDF file on local disk
         filename: the sanitized filename (with unique prefix)
@@ -55,7 +94,7 @@ def upload_pdf_to_github(local_path, filename, github_pat):
         (permanent_url, success) tuple. permanent_url is None on failure.
     """
     if not github_pat:
-        print("[GITHUB PDF ERROR] Submissions_PAT_21May not configured; skipping upload", file=sys.stderr)
+        logutil.error("GITHUB PDF", "Submissions_PAT_21May not configured; skipping upload")
         return None, False
 
     fallback_raw_url = (
@@ -63,56 +102,54 @@ def upload_pdf_to_github(local_path, filename, github_pat):
         f"{GITHUB_PDF_BRANCH}/{GITHUB_PDF_DIR}/{filename}"
     )
 
+    if gitupload.UPLOAD_MODE == "gitdata":
+        try:
+            commit_sha, error = yield from gitupload.upload_flow(
+                GITHUB_REPO, GITHUB_PDF_BRANCH, f"{GITHUB_PDF_DIR}/{filename}", local_path, github_pat
+            )
+        except httppool.HTTPError as e:
+            logutil.error("GITHUB PDF", f"HTTP {e.code} creating blob for {filename}: {e.text(500)}")
+            return None, False
+        except Exception as e:
+            logutil.error("GITHUB PDF", f"Failed to upload {filename}: {e}")
+            return None, False
+        if not commit_sha:
+            logutil.error("GITHUB PDF", f"Failed to commit {filename}: {error}")
+            return None, False
+        logutil.info("GITHUB PDF", f"Uploaded: {fallback_raw_url}")
+        return fallback_raw_url, True
+
     try:
-        with open(local_path, "rb") as f:
-            content_b64 = base64.b64encode(f.read()).decode("utf-8")
+        content_b64 = yield flows.Blocking(read_base64, local_path)
 
-        api_url = (
-            f"https://api.github.com/repos/{GITHUB_REPO}/"
-            f"contents/{GITHUB_PDF_DIR}/{filename}"
-        )
+        api_path = f"/repos/{GITHUB_REPO}/contents/{GITHUB_PDF_DIR}/{filename}"
 
-        payload = json.dumps({
+        payload = {
             "message": f"Upload submission PDF: {filename}",
             "content": content_b64,
             "branch": GITHUB_PDF_BRANCH,
-        }).encode("utf-8")
-
-        req = urllib.request.Request(
-            api_url,
-            data=payload,
-            method="PUT",
-            headers={
-                "Authorization": f"token {github_pat}",
-                "Content-Type": "application/json",
-                "User-Agent": "TSM2-Submission-Portal",
-                "Accept": "application/vnd.github.v3+json",
-            },
-        )
+        }
 
-        with urllib.request.urlopen(req, timeout=60) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            permanent_url = result.get("content", {}).get("download_url") or fallback_raw_url
-            print(f"[GITHUB PDF] Uploaded: {permanent_url}", file=sys.stderr)
-            return permanent_url, True
+        result = yield from githubclient.GITHUB.request_flow(
+            "PUT", api_path, payload, timeout=60, token=github_pat
+        )
+        permanent_url = result.get("content", {}).get("download_url") or fallback_raw_url
+        logutil.info("GITHUB PDF", f"Uploaded: {permanent_url}")
+        return permanent_url, True
 
-    except urllib.error.HTTPError as e:
+    except httppool.HTTPError as e:
         if e.code == 422:
-            print(f"[GITHUB PDF] File already exists, using existing URL: {fallback_raw_url}", file=sys.stderr)
+            logutil.info("GITHUB PDF", f"File already exists, using existing URL: {fallback_raw_url}")
             return fallback_raw_url, True
-        try:
-            body = e.read().decode("utf-8", errors="ignore")[:500]
-        except Exception:
-            body = ""
-        print(f"[GITHUB PDF ERROR] HTTP {e.code} for {filename}: {body}", file=sys.stderr)
+        logutil.error("GITHUB PDF", f"HTTP {e.code} for {filename}: {e.text(500)}")
         return None, False
 
     except Exception as e:
-        print(f"[GITHUB PDF ERROR] Failed to upload {filename}: {e}", file=sys.stderr)
+        logutil.error("GITHUB PDF", f"Failed to upload {filename}: {e}")
         return None, False
 
 
-def render_pdf_pages_to_images(pdf_path, max_pages=50, dpi=200):
+def render_pdf_pages_to_images(pdf_path, max_pages=50, dpi=200, budget=None, selection="all"):
     """Render each page of a PDF to a PNG image and return as base64 data URIs.
 
     Returns a dict:
@@ -122,41 +159,49 @@ def render_pdf_pages_to_images(pdf_path, max_pages=50, dpi=200):
           "rendered_pages": int,
           "truncated": bool,
           "error": Optional[str],
+          "page_settings": [{"page", "dpi", "format", "colorspace", "quality", "width", "height", "bytes"}, ...],
         }
     On failure, returns a dict with empty images and an "error" message.
+    budget=(total_bytes, total_pixels) turns on image budget mode: DPI,
+    format (PNG/JPEG) and colour are then chosen per page to fit, and the
+    result carries a "budget" summary.
+    selection="visual" renders only pages with figures, diagrams or
+    equations (up to max_pages), skipping blank and near-duplicate pages;
+    the result then carries a "selection" report of which pages were sent
+    and why.
+    Runs in the calling process; process_submission uses pdfengine to
+    render page ranges in parallel with the same result shape.
     """
     if not PYMUPDF_AVAILABLE:
         return {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": "pymupdf unavailable"}
     try:
-        doc = pymupdf.open(pdf_path)
-        total_pages = len(doc)
+        if selection == "visual":
+            inspections = []
+            with pymupdf.open(pdf_path) as doc:
+                total_pages = len(doc)
+                for page in doc:
+                    inspections.append(pdfengine.inspect_page(page, page.get_text("text")))
+            selected, report = pdfengine.select_pages(inspections, max_pages)
+            page_budget = pdfengine.make_budget(len(selected), *budget) if budget else None
+            rendered = pdfengine.render_page_list(pdf_path, selected, dpi, page_budget)
+            return pdfengine.render_result(
+                [image for image, _ in rendered], [s for _, s in rendered],
+                total_pages, len(selected), max_pages, page_budget, selection=report,
+            )
+        total_pages = pdfengine.count_pages(pdf_path)
         pages_to_render = min(total_pages, max_pages)
-        images = []
-        for page_num in range(pages_to_render):
-            page = doc[page_num]
-            pix = page.get_pixmap(dpi=dpi)
-            png_bytes = pix.tobytes("png")
-            b64 = base64.b64encode(png_bytes).decode("ascii")
-            images.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{b64}"},
-            })
-        doc.close()
-        return {
-            "images": images,
-            "total_pages": total_pages,
-            "rendered_pages": pages_to_render,
-            "truncated": total_pages > max_pages,
-            "error": None,
-        }
+        page_budget = pdfengine.make_budget(pages_to_render, *budget) if budget else None
+        images, page_settings = pdfengine.render_page_images(pdf_path, 0, pages_to_render, dpi, page_budget)
+        return pdfengine.render_result(images, page_settings, total_pages, pages_to_render, max_pages, page_budget)
     except Exception as e:
-        print(f"[PDF RENDER] Failed to render PDF: {e}", file=sys.stderr)
+        logutil.info("PDF RENDER", f"Failed to render PDF: {e}")
         return {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": str(e)}
 
 
 STATUS_DISPLAY = {
     "PASS": "✅ Pass",
     "NON_COMPLIANT": "❌ Non-Compliant",
+    "UNAVAILABLE": "⚠️ Not assessed",
 }
 
 
@@ -169,450 +214,82 @@ def extract_pdf_text(pdf_path, max_chars=60000):
     - page_count: total pages in the PDF (0 on error)
     """
     if not PDFPLUMBER_AVAILABLE:
-        print("[PDF EXTRACTION] pdfplumber unavailable; skipping extraction.", file=sys.stderr)
+        logutil.info("PDF EXTRACTION", "pdfplumber unavailable; skipping extraction.")
         return None, False, 0
     try:
-        text_parts = []
+        page_texts = []
         total_chars = 0
-        truncated = False
         with pdfplumber.open(pdf_path) as pdf:
             page_count = len(pdf.pages)
             for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    if total_chars + len(page_text) > max_chars:
-                        remaining = max_chars - total_chars
-                        text_parts.append(page_text[:remaining])
-                        text_parts.append("\n\n[--- PDF TEXT TRUNCATED AT CHARACTER LIMIT ---]")
-                        truncated = True
-                        break
-                    text_parts.append(page_text)
-                    total_chars += len(page_text)
-        return "\n\n".join(text_parts), truncated, page_count
+                page_text = page.extract_text() or ""
+                page_texts.append(page_text)
+                total_chars += len(page_text)
+                if total_chars > max_chars:
+                    break
+        text, truncated = pdfengine.join_page_texts(page_texts, max_chars)
+        return text, truncated, page_count
     except Exception as e:
-        print(f"[PDF EXTRACTION ERROR] {e}", file=sys.stderr)
+        logutil.error("PDF EXTRACTION", f"{e}")
         return None, False, 0
 
 
-class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
-    daemon_threads = True
-
-
-class RequestHandler(SimpleHTTPRequestHandler):
-    def do_GET(self):
-        path = self.path.split('?')[0]
-        if path == '/' or path == '' or path == '/index.html':
-            file_path = 'index.html'
-            try:
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.send_header('Content-Length', str(len(content)))
-                self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-                self.send_header('Pragma', 'no-cache')
-                self.send_header('Expires', '0')
-                self.end_headers()
-                self.wfile.write(content)
-            except FileNotFoundError:
-                self.send_error(404, 'File not found')
-        else:
-            super().do_GET()
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-    
-    def do_POST(self):
-        if self.path == '/api/submit':
-            try:
-                content_type = self.headers.get('Content-Type', '')
-                
-                if 'multipart/form-data' in content_type:
-                    self.handle_multipart_submission()
-                else:
-                    self.handle_json_submission()
-                    
-            except Exception as e:
-                print(f"Unhandled exception: {type(e).__name__}: {str(e)}", file=sys.stderr)
-                import traceback
-                traceback.print_exc(file=sys.stderr)
-                self.send_json_response(500, {'error': f'Server error: {str(e)}'})
-        else:
-            self.send_json_response(404, {'error': 'Not found'})
-    
-    def sanitize_filename(self, filename):
-        import re
-        filename = os.path.basename(filename)
-        filename = re.sub(r'[^\w\s\-\.]', '', filename)
-        filename = re.sub(r'\s+', '_', filename)
-        if len(filename) > 100:
-            name, ext = os.path.splitext(filename)
-            filename = name[:96] + ext
-        return filename if filename else 'document.pdf'
-    
-    def validate_pdf(self, content, filename):
-        MAX_FILE_SIZE = 100 * 1024 * 1024
-        if len(content) > MAX_FILE_SIZE:
-            return False, f'File size exceeds 100MB limit (got {len(content) / 1024 / 1024:.1f}MB)'
-        
-        if not filename.lower().endswith('.pdf'):
-            return False, 'File must be a PDF document (.pdf extension required)'
-        
-        if len(content) < 4 or content[:4] != b'%PDF':
-            return False, 'Invalid PDF file (file does not appear to be a valid PDF)'
-        
-        return True, None
-    
-    def handle_multipart_submission(self):
-        content_type = self.headers['Content-Type']
-        content_length = int(self.headers.get('Content-Length', 0))
-        
-        body = self.rfile.read(content_length)
-        
-        boundary = content_type.split('boundary=')[1].encode()
-        parts = body.split(b'--' + boundary)
-        
-        title = ''
-        body_text = ''
-        pdf_filename = None
-        pdf_content = None
-        pdf_url = None
-        user_info = {}
-        form_data = {}
-        
-        for part in parts:
-            if b'Content-Disposition' not in part:
-                continue
-                
-            header_end = part.find(b'\r\n\r\n')
-            if header_end == -1:
-                continue
-                
-            header = part[:header_end].decode('utf-8', errors='ignore')
-            content = part[header_end + 4:]
-            
-            if content.endswith(b'\r\n'):
-                content = content[:-2]
-            
-            if 'name="title"' in header:
-                title = content.decode('utf-8', errors='ignore').strip()
-            elif 'name="body"' in header:
-                body_text = content.decode('utf-8', errors='ignore').strip()
-            elif 'name="userInfo"' in header:
-                try:
-                    user_info = json.loads(content.decode('utf-8', errors='ignore').strip())
-                except:
-                    pass
-            elif 'name="formData"' in header:
-                try:
-                    form_data = json.loads(content.decode('utf-8', errors='ignore').strip())
-                except:
-                    pass
-            elif 'name="pdf"' in header and 'filename=' in header:
-                filename_start = header.find('filename="') + 10
-                filename_end = header.find('"', filename_start)
-                pdf_filename = header[filename_start:filename_end]
-                pdf_content = content
-        
-        if not pdf_filename or not pdf_content or len(pdf_content) == 0:
-            self.send_json_response(400, {'error': 'PDF document is required. Please attach a PDF file.'})
-            return
-        
-        is_valid, error_msg = self.validate_pdf(pdf_content, pdf_filename)
-        if not is_valid:
-            self.send_json_response(400, {'error': error_msg})
-            return
-        
-        safe_filename = self.sanitize_filename(pdf_filename)
-        unique_id = str(uuid.uuid4())[:8]
-        final_filename = f"{unique_id}_{safe_filename}"
-        pdf_path = os.path.join('uploads', final_filename)
-        
-        os.makedirs('uploads', exist_ok=True)
-        
-        with open(pdf_path, 'wb') as f:
-            f.write(pdf_content)
-        
-        domain = os.environ.get('REPLIT_DEV_DOMAIN', '')
-        if domain:
-            local_pdf_url = f"https://{domain}/uploads/{final_filename}"
-        else:
-            local_pdf_url = f"/uploads/{final_filename}"
-        pdf_url = local_pdf_url
-
-        print(f"PDF saved: {pdf_path} ({len(pdf_content)} bytes)", file=sys.stderr)
-        print(f"Processing submission: {title}", file=sys.stderr)
-        
-        # Extract PDF text for AI assessment
-        pdf_text, pdf_truncated, pdf_page_count = extract_pdf_text(pdf_path)
-        pdf_extraction_failed = False
-        if pdf_text is None:
-            pdf_extraction_failed = True
-        elif len(pdf_text.strip()) == 0:
-            pdf_text = None
-            pdf_extraction_failed = True
-            print(f"[PDF EXTRACTION] PDF appears image-based; no extractable text.", file=sys.stderr)
-        else:
-            print(f"[PDF EXTRACTION] {pdf_page_count} pages, {len(pdf_text)} chars, truncated={pdf_truncated}", file=sys.stderr)
-
-        # Render PDF pages to images for multimodal vision analysis
-        render_result = render_pdf_pages_to_images(pdf_path)
-        if render_result.get("error"):
-            print(f"[PDF RENDER] Vision unavailable: {render_result['error']}", file=sys.stderr)
-        else:
-            print(f"[PDF RENDER] Rendered {render_result['rendered_pages']}/{render_result['total_pages']} pages at 200 DPI", file=sys.stderr)
-
-        # Upload PDF to GitHub for permanent storage (after extraction + render, before issue creation)
-        permanent_pdf_url, pdf_upload_success = upload_pdf_to_github(
-            local_path=pdf_path,
-            filename=final_filename,
-            github_pat=os.environ.get("Submissions_PAT_21May", ""),
-        )
-        if pdf_upload_success and permanent_pdf_url:
-            pdf_url = permanent_pdf_url
-        else:
-            print("[GITHUB PDF] Falling back to local Replit URL for PDF link", file=sys.stderr)
-
-        compliance_result = None
-        if form_data:
-            compliance_result = self.check_compliance_with_grok(
-                form_data,
-                pdf_text=pdf_text,
-                pdf_extraction_failed=pdf_extraction_failed,
-                render_result=render_result,
-            )
-
-        if pdf_url:
-            body_text = body_text.replace(
-                f'- **PDF Attached:** {pdf_filename}',
-                f'- **PDF Attached:** [{pdf_filename}]({pdf_url})'
-            )
+def check_compliance_with_grok(form_data, pdf_text=None, pdf_extraction_failed=False, render_result=None, pdf_sha256=None, pdf_path=None):
+    """Blocking wrapper around check_compliance_with_grok_flow."""
+    return flows.run(check_compliance_with_grok_flow(
+        form_data, pdf_text, pdf_extraction_failed, render_result, pdf_sha256, pdf_path
+    ))
 
-            if compliance_result:
-                criteria_list = compliance_result.get('criteria', [])
-                overall_status = compliance_result.get('overall_status', 'UNAVAILABLE')
-                summary = compliance_result.get('message', 'No summary provided.')
-                minimum_corrections = compliance_result.get('minimum_corrections', [])
-                is_error = compliance_result.get('error', False)
-
-                extraction_note = ""
-                if pdf_extraction_failed:
-                    extraction_note = "\n> ⚠️ Note: PDF text extraction failed. The AI assessment is based on form-field metadata only, with reduced confidence.\n"
-                elif pdf_truncated:
-                    extraction_note = f"\n> ⚠️ Note: The PDF text was truncated at approximately 60,000 characters ({pdf_page_count} pages total). The AI assessment is based on the content up to the truncation point.\n"
-
-                if render_result.get("error") or not render_result.get("images"):
-                    extraction_note += "\n> ⚠️ **Visual analysis unavailable for this submission.** The PDF could not be rendered to images. The pre-check assessment is based on extracted text only.\n"
-                else:
-                    rp = render_result['rendered_pages']
-                    tp = render_result['total_pages']
-                    vis_note = f"\n> 🔬 **Visual analysis:** {rp} of {tp} pages rendered to images at 200 DPI and analyzed alongside extracted text."
-                    if render_result.get("truncated"):
-                        vis_note += f" Pages beyond page {rp} were not rendered visually but their text was still extracted."
-                    extraction_note += vis_note + "\n"
 
-                if is_error or overall_status == "UNAVAILABLE":
-                    compliance_section = f"""
-
----
-
-### AI Structural Pre-Check (9-Criteria Scorecard, PDF-grounded)
-
-> **This is an automated structural screening, not a scientific evaluation.**
-
-**Overall Status:** UNAVAILABLE
-
-The AI pre-check could not be completed. This does not affect the submission — it proceeds to manual review.
-
-**Reason:** {summary}
-"""
-                elif criteria_list:
-                    scorecard_rows = ""
-                    for c in criteria_list:
-                        rendered_status = STATUS_DISPLAY.get(c.get('status', ''), c.get('status', ''))
-                        scorecard_rows += f"| {c.get('id', '')} | {c.get('name', '')} | {rendered_status} | {c.get('reason', '')} |\n"
-
-                    compliance_section = f"""
-
----
-
-### AI Structural Pre-Check (9-Criteria Scorecard, PDF-grounded)
-
-> **This is an automated structural screening, not a scientific evaluation.**
-> The AI pre-check evaluates structure, not scientific truth.
-> A submission that contradicts TSM2 can still pass; a submission that agrees with TSM2 can still fail.
-> Final compliance determination is made by a qualified examiner.
-
-**Overall Status:** {overall_status}
-
-| # | Criterion | Status | Reason |
-| --- | --- | --- | --- |
-{scorecard_rows}{extraction_note}
-**Summary:** {summary}
-"""
+def check_compliance_with_grok_flow(form_data, pdf_text=None, pdf_extraction_failed=False, render_result=None, pdf_sha256=None, pdf_path=None,
+                                    on_criterion=None, reuse=None):
+    """Flow: the 9-criteria Grok pre-check.
 
-                    if overall_status == "NON_COMPLIANT":
-                        non_compliant_criteria = [c for c in criteria_list if c.get('status') == 'NON_COMPLIANT']
-                        if non_compliant_criteria:
-                            corrections_md = ""
-                            for c in non_compliant_criteria:
-                                correction = c.get('required_correction') or 'No correction provided.'
-                                corrections_md += f"\n**{c.get('id', '?')}. {c.get('name', 'Unknown')}**\n\n{correction}\n"
-                            compliance_section += f"""
----
-
-### Minimum Corrections Required for Compliance
-
-The following corrections must be addressed for this submission to meet structural compliance. Each criterion below failed; the prescribed correction is shown.
-{corrections_md}
-Once these corrections are addressed, the submission may be revised and re-submitted for re-evaluation.
-"""
-                else:
-                    compliance_section = f"""
-
----
-
-### AI Structural Pre-Check (9-Criteria Scorecard, PDF-grounded)
-
-> **This is an automated structural screening, not a scientific evaluation.**
-
-**Overall Status:** {overall_status}
-{extraction_note}
-**Summary:** {summary}
-"""
-                body_text += compliance_section
-        
-        result = self.create_github_issue(title, body_text)
-        
-        if result.get('success'):
-            print(f"User info received (private): {user_info.get('name', 'Unknown')} - {user_info.get('email', 'No email')}", file=sys.stderr)
-            
-            issue_number = result.get('number')
-            issue_url = result.get('html_url')
-            
-            self.apply_github_labels(issue_number, compliance_result, form_data)
-            self.send_examiner_notification(user_info, form_data, title, issue_url, issue_number, compliance_result)
-            self.send_submitter_email(user_info, form_data, issue_number, issue_url, compliance_result)
-            
-            response_data = {
-                'success': True,
-                'html_url': result.get('html_url'),
-                'number': result.get('number')
-            }
-            if compliance_result:
-                frontend_check = {k: v for k, v in compliance_result.items() if k != 'error'}
-                response_data['complianceCheck'] = frontend_check
-            
-            self.send_json_response(200, response_data)
-        else:
-            self.send_json_response(result.get('code', 500), {'error': result.get('error')})
-    
-    def handle_json_submission(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
-        
-        print(f"Received POST request, content length: {content_length}", file=sys.stderr)
-        
-        try:
-            data = json.loads(post_data.decode('utf-8'))
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {str(e)}", file=sys.stderr)
-            self.send_json_response(400, {'error': 'Invalid JSON in request'})
-            return
-            
-        title = data.get('title', '')
-        body = data.get('body', '')
-        
-        print(f"Parsed request - Title: {title[:50]}...", file=sys.stderr)
-        
-        result = self.create_github_issue(title, body)
-        
-        if result.get('success'):
-            self.send_json_response(200, {
-                'success': True,
-                'html_url': result.get('html_url'),
-                'number': result.get('number')
-            })
-        else:
-            self.send_json_response(result.get('code', 500), {'error': result.get('error')})
-    
-    def check_compliance_with_grok(self, form_data, pdf_text=None, pdf_extraction_failed=False, render_result=None):
-        grok_api_key = os.environ.get('GROK_API_KEY')
-        if not grok_api_key:
-            print("GROK_API_KEY not configured, skipping compliance check", file=sys.stderr)
-            return {
-                "compliant": False,
-                "message": "AI pre-check not configured.",
-                "overall_status": "UNAVAILABLE",
-                "criteria": [],
-                "minimum_corrections": [],
-                "error": True,
-            }
-
-        try:
-            submission_title = form_data.get('submission_title', 'Not provided')
-            core_claim = form_data.get('core_claim', 'Not provided')
-            primary_scale = form_data.get('primary_scale', 'Not provided')
+    on_criterion, if given, receives each criterion verdict (id, name,
+    status, reason, required_correction) as soon as it has streamed in,
+    before the whole reply is complete. reuse holds the verdicts a revised
+    resubmission carries over; only the other criteria are evaluated.
+    """
+    grok_api_key = os.environ.get('GROK_API_KEY')
+    if not grok_api_key:
+        logutil.warning("GROK", "GROK_API_KEY not configured, skipping compliance check")
+        return {
+            "compliant": False,
+            "message": "AI pre-check not configured.",
+            "overall_status": "UNAVAILABLE",
+            "criteria": [],
+            "minimum_corrections": [],
+            "error": True,
+        }
 
-            if pdf_extraction_failed or not pdf_text:
-                pdf_section = "[PDF text could not be extracted. Assess based on the metadata fields above only. Note in your summary that the assessment is limited to form fields due to PDF extraction failure.]"
-            else:
-                pdf_section = pdf_text
+    try:
+        if criteriaeval.EVAL_MODE == "parallel" or reuse:
+            return (yield from criteriaeval.evaluate_flow(
+                grok_api_key, form_data, pdf_text, pdf_extraction_failed, render_result, pdf_sha256, pdf_path, on_criterion,
+                reuse,
+            ))
 
-            render_result = render_result or {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": "no render"}
-            vision_images = render_result.get("images", [])
-            vision_truncated = render_result.get("truncated", False)
-            vision_total = render_result.get("total_pages", 0)
-            vision_rendered = render_result.get("rendered_pages", 0)
-            vision_error = render_result.get("error")
+        pdf_label, pdf_section, text_coverage, prompt_report = criteriaeval.pdf_context(pdf_text, pdf_extraction_failed)
 
-            prompt = f"""You are screening a submission to the TSM2 Institute for Cosmology against 9 structural criteria. Evaluate structure, methodology, and epistemic discipline only — do NOT judge scientific merit, correctness, or alignment with any framework.
+        render_result = render_result or {"images": [], "total_pages": 0, "rendered_pages": 0, "truncated": False, "error": "no render"}
+        vision_images = render_result.get("images", [])
+        vision_deferred = render_result.get("deferred") if pdf_path else None
+        has_vision = bool(vision_images) or bool(vision_deferred and vision_deferred["pages"])
+        vision_truncated = render_result.get("truncated", False)
+        vision_error = render_result.get("error")
 
-SUBMISSION METADATA (provided for orientation only — assess from PDF text below, not from these fields):
-CRITICAL INSTRUCTION: The metadata fields above are the submitter's SELF-DESCRIPTION of their work. They may be more polished than what the PDF actually contains. Always assess from the PDF text. If the PDF does not contain what the form field claims, score based on what is in the PDF, not what the form field says.
-- Title: {submission_title}
-- Submitter's stated core claim: {core_claim}
-- Submitter's stated primary scale: {primary_scale}
+        prompt = f"""{criteriaeval.screening_header(form_data, "9 structural criteria")}
 
-PDF TEXT:
+{pdf_label}
 ---
 {pdf_section}
 ---
 
 EVALUATE AGAINST THESE 9 CRITERIA, using BINARY status only: PASS or NON_COMPLIANT.
 
-1. CLEAR CORE CLAIM — Is there an identifiable, consistent central proposition? The claim should be stated clearly enough that a reader can identify what the manuscript is asserting. It does not need to be reducible to a single sentence — coherent restatements across the document are acceptable. PASS if a clear central claim is identifiable. NON_COMPLIANT if the claim is incoherent, contradictory across sections, or cannot be extracted.
-
-2. DEFINED TERMS — Are the key technical terms operationally defined and consistently applied? Definitions can be in a glossary, a definitions section, or inline at first use. PASS if the primary technical vocabulary is defined and used consistently. NON_COMPLIANT if core terms are undefined, used inconsistently, or rely on metaphor without operational grounding.
-
-3. MECHANISM — Is there a coherent mechanism pathway that explains how the claim leads to its consequences? The mechanism can be conceptual rather than formally axiomatized — what matters is that a generative sequence exists (e.g., "polarity → distinction → relation → order → number → operations"). PASS if a coherent mechanism pathway is present, even if conceptual. NON_COMPLIANT if no mechanism is offered, or if the paper explicitly disclaims any generative/causal pathway.
-
-4. TEST PATH — Does the manuscript provide at least one explicit testable procedure? Tests can be experimental, computational, mathematical, or observational. Each test must include: (a) a prediction or expected outcome, (b) a procedure for evaluating it, and (c) a condition under which the test would fail. PASS if at least one testable procedure meeting all three elements is present. NON_COMPLIANT if "tests" consist only of compatibility observations, interpretive mappings, or post-hoc pattern matching without a defined failure condition.
-
-5. FALSIFIABILITY — Does the manuscript contain explicit falsifiers — conditions under which the claim or framework would be rejected? Falsifiers should be identifiable failure conditions (e.g., "discovery of a fundamental equation lacking frequency-mode representation"). They do not need to be expressed as binary numerical thresholds. PASS if at least one identifiable falsifier is stated. NON_COMPLIANT if the framework can absorb any contradictory observation through reinterpretation, or no failure conditions are articulated.
-
-6. DEPENDENCY TRANSPARENCY — Does the author explicitly acknowledge assumptions, conceptual scope, limitations, and what the framework does not claim? PASS if a dedicated limitations/scope/assumptions section is present, or if these acknowledgments are clearly distributed and identifiable. NON_COMPLIANT if assumptions are hidden, unstated, or the manuscript overreaches its own scope.
-
-7. NON-ARBITRARY SELECTION — Is the selection of primitives, categories, or analytical units justified? The manuscript should explain why these specific elements were chosen and why alternatives were rejected or considered. PASS if a justification section or argument is present (e.g., a "Why these primitives?" section comparing alternatives). NON_COMPLIANT if selection is post-hoc or unjustified.
-
-8. PREDICTIVE CAPABILITY — Does the manuscript produce at least one measurable prediction, scaling relation, or numerical consequence derived from the framework? Predictions can be quantitative scaling relations, numerical values, observational signatures, or model-specific expected outcomes. PASS if at least one explicit prediction is derivable from the framework. NON_COMPLIANT if the manuscript only re-describes or re-interprets existing data without generating new predictions.
+{criteriaeval.criteria_rules(criteriaeval.ALL_CRITERIA)}
 
-9. REPRODUCIBILITY — Could an independent reviewer reproduce the analysis using the methodology, sources, and procedures described? PASS if the logical framework, cited equations, and procedures are independently traceable. NON_COMPLIANT if the methodology cannot be replicated from the manuscript alone.
-
-For each criterion, return:
-- status: either "PASS" or "NON_COMPLIANT" (binary only — no conditional states)
-- reason: one short paragraph (1-3 sentences) describing what is present or absent in the PDF that supports this verdict. Cite specific sections, figures, or terms where possible.
-- required_correction: ONLY populated when status is NON_COMPLIANT. This must be a PRESCRIPTIVE INSTRUCTION telling the submitter what to add, not a diagnostic description of the gap. Use Geoff's voice:
-  - Start with a concrete action: "Add a dedicated section titled X" or "Provide at least one Y" or "Justify the selection of Z by..."
-  - Include 2-4 bulleted examples of what the corrected content might look like
-  - End with a clear quality bar: "These must include a prediction, procedure, and failure condition" or similar
-  - Set required_correction to null when status is PASS
-
-CRITICAL: The required_correction is the submitter's repair instruction. They should be able to action it directly. Do NOT write generic feedback like "consider improving X" — write specific instructions like "Add a section titled 'Potential Falsifiers' listing at least three failure conditions. Examples may include: (a) discovery of foundational equations irreducible to oscillatory representation, (b) proof that polarity cannot generate required mathematical structures, (c) observational signatures incompatible with the framework. Each falsifier must be an identifiable failure condition the framework could not absorb."
+{criteriaeval.RESPONSE_RULES}
 
 Compute one overall verdict:
 
@@ -626,210 +303,224 @@ Respond in this exact JSON format only — no markdown, no preamble, no trailing
 
 {{
   "criteria": [
-    {{"id": 1, "name": "Clear Core Claim", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 2, "name": "Defined Terms", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 3, "name": "Mechanism", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 4, "name": "Test Path", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 5, "name": "Falsifiability", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 6, "name": "Dependency Transparency", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 7, "name": "Non-Arbitrary Selection", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 8, "name": "Predictive Capability", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}},
-    {{"id": 9, "name": "Reproducibility", "status": "PASS|NON_COMPLIANT", "reason": "...", "required_correction": "..." or null}}
+{criteriaeval.schema_lines(criteriaeval.ALL_CRITERIA)}
   ],
   "overall_status": "COMPLIANT|NON_COMPLIANT",
   "minimum_corrections": ["...", "..."],
   "summary": "One short paragraph (2-4 sentences) summarizing the submission's structural standing. If COMPLIANT, state that all 9 criteria are met and note any recommended improvements. If NON_COMPLIANT, state which criteria failed and reference the minimum corrections list."
 }}"""
 
-            user_prompt_text = prompt
-            if vision_images and vision_truncated:
-                truncation_note = (
-                    f"NOTE: This PDF has {vision_total} pages. "
-                    f"Only the first {vision_rendered} pages have been "
-                    f"rendered as images for visual analysis. The text extraction "
-                    f"covers the full document."
-                )
-                user_prompt_text = truncation_note + "\n\n" + user_prompt_text
+        user_prompt_text = prompt
+        note = criteriaeval.vision_note(render_result, text_coverage) if has_vision else None
+        if note:
+            user_prompt_text = note + "\n\n" + user_prompt_text
+
+        model_name = "grok-4" if has_vision else "grok-3-mini"
+        system_text = criteriaeval.SYSTEM_TEXT
+        temperature = 0.3
+        max_tokens = 4000
+
+        cache_key = None
+        if pdf_sha256:
+            cache_key = (
+                pdf_sha256,
+                model_name,
+                system_text,
+                user_prompt_text,
+                criteriaeval.images_digest(vision_deferred, vision_images),
+                temperature,
+                max_tokens,
+            )
+            cached = resultcache.RESULT_CACHE.get("compliance", *cache_key)
+            if cached is not None:
+                logutil.info("CACHE", f"Compliance result hit for {pdf_sha256[:12]} (model={model_name})")
+                return cached
+
+        # The request body is streamed: with a deferred render plan each page
+        # is rendered just before its image part is written to the socket.
+        images = None
+        streamed_settings = []
+        if vision_deferred:
+            images = pdfengine.iter_page_images(pdf_path, render_result, streamed_settings)
+        elif vision_images:
+            images = vision_images
+
+        scanner = criteriaeval.CriteriaScanner(criteriaeval.ALL_CRITERIA, on_criterion) if on_criterion else None
+        start_time = time.time()
+        try:
+            result = yield from grokapi.chat_completion_flow(
+                grok_api_key, model_name, system_text, user_prompt_text, images,
+                temperature=temperature, max_tokens=max_tokens, timeout=300,
+                on_text=scanner.feed if scanner else None,
+            )
+        finally:
+            if vision_deferred:
+                pdfengine.record_streamed_pages(render_result, streamed_settings)
+        elapsed = time.time() - start_time
+        content = criteriaeval.reply_content(result)
+        pdf_chars = len(pdf_section) if pdf_section else 0
+        image_count = len(streamed_settings) if vision_deferred else len(vision_images)
+        logutil.info("GROK", f"Model: {model_name}, Response time: {elapsed:.1f}s, PDF chars: {pdf_chars}, Vision images: {image_count} (streamed={bool(vision_deferred)}, truncated={vision_truncated}, error={vision_error})",
+                     model=model_name, seconds=round(elapsed, 3), pdf_chars=pdf_chars, images=image_count)
 
-            if vision_images:
-                user_content = list(vision_images)
-                user_content.append({"type": "text", "text": user_prompt_text})
-                model_name = "grok-4"
+        try:
+            ai_result = json.loads(content)
+            logutil.debug("GROK", "Compliance check parsed OK")
+
+            if "criteria" not in ai_result and "compliant" in ai_result:
+                # Legacy format fallback
+                overall_status = "COMPLIANT" if ai_result["compliant"] else "NON_COMPLIANT"
+                summary = ai_result.get("message", "Legacy format response.")
+                criteria = []
+                minimum_corrections = []
             else:
-                user_content = user_prompt_text
-                model_name = "grok-3-mini"
-
-            request_data = {
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": "You are a structural compliance screener for the TSM2 Institute for Cosmology. Your task is to assess scientific submissions against 9 structural criteria covering claim clarity, mechanism, falsifiability, methodology, predictive capability, and reproducibility. You assess structure and methodological discipline, not scientific truth, and not agreement with any particular theoretical framework. A submission can be excellent structurally while contradicting TSM2, or be aligned with TSM2 while failing structurally. Judge structure only. Respond only with valid JSON in the schema specified."},
-                    {"role": "user", "content": user_content},
-                ],
-                "temperature": 0.3,
-                "max_tokens": 4000,
+                criteria = ai_result.get("criteria", [])
+                overall_status = ai_result.get("overall_status", "NON_COMPLIANT")
+                summary = ai_result.get("summary", "No summary provided.")
+                minimum_corrections = ai_result.get("minimum_corrections", [])
+
+            compliant = (overall_status == "COMPLIANT")
+
+            compliance = {
+                "compliant": compliant,
+                "message": summary,
+                "overall_status": overall_status,
+                "criteria": criteria,
+                "minimum_corrections": minimum_corrections,
             }
-
-            req = urllib.request.Request(
-                'https://api.x.ai/v1/chat/completions',
-                data=json.dumps(request_data).encode('utf-8'),
-                headers={
-                    'Authorization': f'Bearer {grok_api_key}',
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'TSM2-Submission-Portal',
-                },
-                method='POST',
-            )
-
-            start_time = time.time()
-            with urllib.request.urlopen(req, timeout=300) as response:
-                elapsed = time.time() - start_time
-                result = json.loads(response.read().decode('utf-8'))
-                content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-                pdf_chars = len(pdf_section) if pdf_section else 0
-                print(f"[GROK] Model: {model_name}, Response time: {elapsed:.1f}s, PDF chars: {pdf_chars}, Vision images: {len(vision_images)} (truncated={vision_truncated}, error={vision_error})", file=sys.stderr)
-
-                content = content.strip()
-                if content.startswith('```json'):
-                    content = content[7:]
-                if content.startswith('```'):
-                    content = content[3:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                content = content.strip()
-
-                try:
-                    ai_result = json.loads(content)
-                    print(f"Grok compliance check parsed OK", file=sys.stderr)
-
-                    if "criteria" not in ai_result and "compliant" in ai_result:
-                        # Legacy format fallback
-                        overall_status = "COMPLIANT" if ai_result["compliant"] else "NON_COMPLIANT"
-                        summary = ai_result.get("message", "Legacy format response.")
-                        criteria = []
-                        minimum_corrections = []
-                    else:
-                        criteria = ai_result.get("criteria", [])
-                        overall_status = ai_result.get("overall_status", "NON_COMPLIANT")
-                        summary = ai_result.get("summary", "No summary provided.")
-                        minimum_corrections = ai_result.get("minimum_corrections", [])
-
-                    compliant = (overall_status == "COMPLIANT")
-
-                    return {
-                        "compliant": compliant,
-                        "message": summary,
-                        "overall_status": overall_status,
-                        "criteria": criteria,
-                        "minimum_corrections": minimum_corrections,
-                    }
-                except (json.JSONDecodeError, KeyError, TypeError):
-                    print(f"Could not parse Grok response: {content[:500]}", file=sys.stderr)
-                    return {
-                        "compliant": False,
-                        "message": "AI pre-check returned an unexpected format. Manual review required.",
-                        "overall_status": "UNAVAILABLE",
-                        "criteria": [],
-                        "minimum_corrections": [],
-                        "error": True,
-                    }
-
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode()
-            print(f"[GROK ERROR] Status: {e.code}, Body: {error_msg[:500]}", file=sys.stderr)
-            sys.stderr.flush()
+            if prompt_report:
+                compliance["prompt"] = prompt_report
+            if cache_key:
+                resultcache.RESULT_CACHE.put("compliance", compliance, *cache_key)
+            return compliance
+        except (json.JSONDecodeError, KeyError, TypeError):
+            logutil.error("GROK", f"Could not parse Grok response: {content[:500]}")
             return {
                 "compliant": False,
-                "message": f"Grok API error (HTTP {e.code}). Manual review required.",
+                "message": "AI pre-check returned an unexpected format. Manual review required.",
                 "overall_status": "UNAVAILABLE",
                 "criteria": [],
                 "minimum_corrections": [],
                 "error": True,
             }
+
+    except httppool.HTTPError as e:
+        error_msg = e.text()
+        logutil.error("GROK", f"Status: {e.code}, Body: {error_msg[:500]}", status=e.code)
+        return {
+            "compliant": False,
+            "message": f"Grok API error (HTTP {e.code}). Manual review required.",
+            "overall_status": "UNAVAILABLE",
+            "criteria": [],
+            "minimum_corrections": [],
+            "error": True,
+        }
+    except Exception as e:
+        logutil.exception("GROK", f"Compliance check error: {e}")
+        return {
+            "compliant": False,
+            "message": f"AI pre-check error: {str(e)}. Manual review required.",
+            "overall_status": "UNAVAILABLE",
+            "criteria": [],
+            "minimum_corrections": [],
+            "error": True,
+        }
+
+def issue_labels(compliance_result, form_data=None):
+    """Labels for a submission issue: review state, AI verdict and scale."""
+    overall_status = compliance_result.get('overall_status', 'UNAVAILABLE') if compliance_result else 'UNAVAILABLE'
+
+    labels = ["Pending Review"]
+    if overall_status == "COMPLIANT":
+        labels.append("AI Pre-Check: Compliant")
+    elif overall_status == "NON_COMPLIANT":
+        labels.append("AI Pre-Check: Non-Compliant")
+    else:
+        labels.append("Screening: Unavailable")
+
+    primary_scale = (form_data or {}).get("primary_scale", "")
+    scale_label = SCALE_LABELS.get(primary_scale)
+    if scale_label:
+        labels.append(scale_label)
+    return labels
+
+
+def apply_github_labels(issue_number, labels):
+    """Label the issue in the background; never blocks the submission."""
+    flows.Background(apply_github_labels_flow(issue_number, labels), "labels").run()
+
+
+def apply_github_labels_flow(issue_number, labels):
+    """Add labels to an existing issue.
+
+    Issues are created with their labels in one request; this is only
+    needed when GitHub dropped some of them.
+    """
+    github_token = os.environ.get('Submissions_PAT_21May')
+    if not github_token:
+        logutil.error("GITHUB", "Cannot apply labels: Submissions_PAT_21May not configured")
+        return
+
+    with metrics.span("labels") as span:
+        try:
+            yield from githubclient.GITHUB.request_flow(
+                'POST', f'/repos/{GITHUB_REPO}/issues/{issue_number}/labels', {"labels": labels}, timeout=15
+            )
+            logutil.info("GITHUB", f"Labels applied to issue #{issue_number}: {labels}", issue=issue_number)
         except Exception as e:
-            print(f"Grok compliance check error: {str(e)}", file=sys.stderr)
-            return {
-                "compliant": False,
-                "message": f"AI pre-check error: {str(e)}. Manual review required.",
-                "overall_status": "UNAVAILABLE",
-                "criteria": [],
-                "minimum_corrections": [],
-                "error": True,
-            }
-    
-    def apply_github_labels(self, issue_number, compliance_result, form_data=None):
-        import threading
+            span.fail()
+            logutil.error("GITHUB", f"Failed to apply labels to issue #{issue_number}: {e}", issue=issue_number)
 
-        def _apply():
-            github_token = os.environ.get('Submissions_PAT_21May')
-            if not github_token:
-                print("Cannot apply labels: Submissions_PAT_21May not configured", file=sys.stderr)
-                return
-            
-            overall_status = compliance_result.get('overall_status', 'UNAVAILABLE') if compliance_result else 'UNAVAILABLE'
 
-            labels = ["Pending Review"]
-            if overall_status == "COMPLIANT":
-                labels.append("AI Pre-Check: Compliant")
-            elif overall_status == "NON_COMPLIANT":
-                labels.append("AI Pre-Check: Non-Compliant")
-            else:
-                labels.append("Screening: Unavailable")
+def post_revision_comment_flow(revision, compliance_result, issue_number, issue_url):
+    """Post the change summary of a revised submission on the issue it revises."""
+    github_token = os.environ.get('Submissions_PAT_21May')
+    base_issue = revision['base_issue']
+    if not github_token:
+        logutil.error("GITHUB", "Cannot comment on revised issue: Submissions_PAT_21May not configured")
+        return
 
-            primary_scale = (form_data or {}).get("primary_scale", "")
-            scale_label = SCALE_LABELS.get(primary_scale)
-            if scale_label:
-                labels.append(scale_label)
-            
-            try:
-                url = f'https://api.github.com/repos/TSM2Institute/submissions/issues/{issue_number}/labels'
-                req = urllib.request.Request(
-                    url,
-                    data=json.dumps({"labels": labels}).encode('utf-8'),
-                    headers={
-                        'Authorization': f'token {github_token}',
-                        'Accept': 'application/vnd.github.v3+json',
-                        'Content-Type': 'application/json',
-                        'User-Agent': 'TSM2-Submission-Portal'
-                    },
-                    method='POST'
-                )
-                with urllib.request.urlopen(req, timeout=15) as response:
-                    print(f"Labels applied to issue #{issue_number}: {labels}", file=sys.stderr)
-            except Exception as e:
-                print(f"Failed to apply labels to issue #{issue_number}: {str(e)}", file=sys.stderr)
-        
-        t = threading.Thread(target=_apply, daemon=True)
-        t.start()
-    
-    def send_examiner_notification(self, user_info, form_data, title, issue_url, issue_number, compliance_result):
+    with metrics.span("revision_comment") as span:
         try:
-            name = user_info.get('name', 'Not provided')
-            email = user_info.get('email', 'Not provided')
-            organization = user_info.get('organization', 'Not provided')
-            phone = user_info.get('phone', 'Not provided')
-            website = user_info.get('website', 'Not provided')
-
-            primary_scale = form_data.get('primary_scale', 'Not specified')
-            core_claim = form_data.get('core_claim', 'Not provided')
-
-            overall_status = (compliance_result or {}).get('overall_status', 'UNAVAILABLE')
-            summary = (compliance_result or {}).get('message') or (compliance_result or {}).get('summary') or 'No AI summary available.'
-            criteria = (compliance_result or {}).get('criteria', []) if compliance_result else []
-
-            failed_section = ""
-            if overall_status == "NON_COMPLIANT":
-                lines = []
-                for c in criteria:
-                    if c.get('status') == 'NON_COMPLIANT':
-                        cname = c.get('name') or f"Criterion {c.get('id', '?')}"
-                        creason = c.get('reason', 'No details')
-                        lines.append(f"- {cname}: {creason}")
-                if lines:
-                    failed_section = "Failed criteria:\n" + "\n".join(lines) + "\n\n"
-
-            email_subject = f"[TSM2-SUB] New Submission: {title} — {overall_status}"
-
-            email_body = f"""New submission received.
+            yield from githubclient.GITHUB.request_flow(
+                'POST', f'/repos/{GITHUB_REPO}/issues/{base_issue}/comments',
+                {"body": revisions.comment_body(revision, compliance_result, issue_number, issue_url)}, timeout=15
+            )
+            logutil.info("GITHUB", f"Revision summary posted on issue #{base_issue}", issue=issue_number)
+        except Exception as e:
+            span.fail()
+            logutil.error("GITHUB", f"Failed to comment on issue #{base_issue}: {e}", issue=issue_number)
+
+
+def send_examiner_notification(user_info, form_data, title, issue_url, issue_number, compliance_result):
+    try:
+        name = user_info.get('name', 'Not provided')
+        email = user_info.get('email', 'Not provided')
+        organization = user_info.get('organization', 'Not provided')
+        phone = user_info.get('phone', 'Not provided')
+        website = user_info.get('website', 'Not provided')
+
+        primary_scale = form_data.get('primary_scale', 'Not specified')
+        core_claim = form_data.get('core_claim', 'Not provided')
+
+        overall_status = (compliance_result or {}).get('overall_status', 'UNAVAILABLE')
+        summary = (compliance_result or {}).get('message') or (compliance_result or {}).get('summary') or 'No AI summary available.'
+        criteria = (compliance_result or {}).get('criteria', []) if compliance_result else []
+
+        failed_section = ""
+        if overall_status == "NON_COMPLIANT":
+            lines = []
+            for c in criteria:
+                if c.get('status') == 'NON_COMPLIANT':
+                    cname = c.get('name') or f"Criterion {c.get('id', '?')}"
+                    creason = c.get('reason', 'No details')
+                    lines.append(f"- {cname}: {creason}")
+            if lines:
+                failed_section = "Failed criteria:\n" + "\n".join(lines) + "\n\n"
+
+        email_subject = f"[TSM2-SUB] New Submission: {title} — {overall_status}"
+
+        email_body = f"""New submission received.
 
 SUBMISSION DETAILS
 Title: {title}
@@ -851,39 +542,39 @@ AI PRE-CHECK RESULT: {overall_status}
 View full issue: {issue_url}
 """
 
-            emailutil.send_email_async(
-                to_address="info@tsm2.org",
-                subject=email_subject,
-                body_text=email_body,
-            )
-        except Exception as e:
-            print(f"Examiner email notification error: {str(e)}", file=sys.stderr)
-    
-    def send_submitter_email(self, user_info, form_data, issue_number, issue_url, compliance_result):
-        from datetime import datetime
+        emailutil.send_email_async(
+            to_address="info@tsm2.org",
+            subject=email_subject,
+            body_text=email_body,
+        )
+    except Exception as e:
+        logutil.exception("EXAMINER EMAIL", f"Notification error: {e}")
 
-        try:
-            submitter_name = user_info.get('name', 'Submitter')
-            submitter_email = user_info.get('email', '')
-            if not submitter_email:
-                print("No submitter email provided, skipping submitter notification", file=sys.stderr)
-                return
+def send_submitter_email(user_info, form_data, issue_number, issue_url, compliance_result):
+    from datetime import datetime
+
+    try:
+        submitter_name = user_info.get('name', 'Submitter')
+        submitter_email = user_info.get('email', '')
+        if not submitter_email:
+            logutil.info("SUBMITTER EMAIL", "No submitter email provided, skipping submitter notification")
+            return
 
-            submission_title = form_data.get('submission_title', 'Untitled')
-            primary_scale = form_data.get('primary_scale', 'Not specified')
-            date_str = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
+        submission_title = form_data.get('submission_title', 'Untitled')
+        primary_scale = form_data.get('primary_scale', 'Not specified')
+        date_str = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
 
-            overall_status = (compliance_result or {}).get('overall_status', 'UNAVAILABLE')
-            criteria = (compliance_result or {}).get('criteria', []) if compliance_result else []
+        overall_status = (compliance_result or {}).get('overall_status', 'UNAVAILABLE')
+        criteria = (compliance_result or {}).get('criteria', []) if compliance_result else []
 
-            reference_block = f"""SUBMISSION REFERENCE
+        reference_block = f"""SUBMISSION REFERENCE
 GitHub Issue: #{issue_number}
 Title: {submission_title}
 Primary Scale: {primary_scale}
 Date: {date_str}"""
 
-            if overall_status == "COMPLIANT":
-                middle_section = f"""{reference_block}
+        if overall_status == "COMPLIANT":
+            middle_section = f"""{reference_block}
 
 AI STRUCTURAL PRE-CHECK: COMPLIANT
 All 9 structural criteria were met.
@@ -897,20 +588,20 @@ Please note:
 You can view your submission at:
 {issue_url}"""
 
-            elif overall_status == "NON_COMPLIANT":
-                failed_lines = []
-                corrections = []
-                for c in criteria:
-                    if c.get('status') == 'NON_COMPLIANT':
-                        name = c.get('name', f"Criterion {c.get('id', '?')}")
-                        reason = c.get('reason', 'No details')
-                        correction = c.get('required_correction') or 'See GitHub issue for the full prescribed correction.'
-                        failed_lines.append(f"- {name}: {reason}\n  Correction required: {correction}")
-                        corrections.append(f"- {correction}")
-                failed_text = "\n".join(failed_lines) if failed_lines else "- Details unavailable. See the GitHub issue for the full scorecard."
-                corrections_text = "\n".join(corrections) if corrections else "- See the GitHub issue for the full list of corrections."
-
-                middle_section = f"""{reference_block}
+        elif overall_status == "NON_COMPLIANT":
+            failed_lines = []
+            corrections = []
+            for c in criteria:
+                if c.get('status') == 'NON_COMPLIANT':
+                    name = c.get('name', f"Criterion {c.get('id', '?')}")
+                    reason = c.get('reason', 'No details')
+                    correction = c.get('required_correction') or 'See GitHub issue for the full prescribed correction.'
+                    failed_lines.append(f"- {name}: {reason}\n  Correction required: {correction}")
+                    corrections.append(f"- {correction}")
+            failed_text = "\n".join(failed_lines) if failed_lines else "- Details unavailable. See the GitHub issue for the full scorecard."
+            corrections_text = "\n".join(corrections) if corrections else "- See the GitHub issue for the full list of corrections."
+
+            middle_section = f"""{reference_block}
 
 AI STRUCTURAL PRE-CHECK: NON-COMPLIANT
 The automated screening identified structural gaps in the following criteria:
@@ -924,13 +615,13 @@ Please note:
 - This is an automated structural screening, not a scientific evaluation.
 - Your submission will still proceed to examiner review.
 - The corrections listed above are structural requirements, not judgements on scientific merit.
-- You may revise and resubmit at any time.
+- You may revise and resubmit at any time. Enter {issue_number} as "Revision of Earlier Submission" and only the criteria affected by your changes are re-checked.
 
 You can view the full assessment at:
 {issue_url}"""
 
-            else:
-                middle_section = f"""{reference_block}
+        else:
+            middle_section = f"""{reference_block}
 
 AI STRUCTURAL PRE-CHECK: UNAVAILABLE
 The automated screening could not be completed at this time. This does not affect your submission — it will proceed directly to examiner review.
@@ -938,7 +629,7 @@ The automated screening could not be completed at this time. This does not affec
 You can view your submission at:
 {issue_url}"""
 
-            email_body = f"""Dear {submitter_name},
+        email_body = f"""Dear {submitter_name},
 
 Your submission "{submission_title}" has been received by the TSM2 Institute for Cosmology.
 
@@ -950,70 +641,861 @@ TSM2 Institute for Cosmology
 info@tsm2.org
 """
 
-            email_subject = f"TSM2 Institute — Submission Received: {submission_title}"
+        email_subject = f"TSM2 Institute — Submission Received: {submission_title}"
+
+        emailutil.send_email_async(
+            to_address=submitter_email,
+            subject=email_subject,
+            body_text=email_body,
+        )
+        logutil.info("SUBMITTER EMAIL", f"Queued for {submitter_email} (status={overall_status})")
+
+    except Exception as e:
+        logutil.exception("SUBMITTER EMAIL", f"Error: {e}")
+
+def create_github_issue(title, body, labels=None):
+    """Blocking wrapper around create_github_issue_flow."""
+    return flows.run(create_github_issue_flow(title, body, labels))
+
+
+def create_github_issue_flow(title, body, labels=None):
+    """Create the submission issue, with its labels, in one API request.
+
+    Returns:
+        {'success': True, 'html_url', 'number', 'labels'} where labels are
+        the names GitHub actually applied, or {'success': False, 'code',
+        'error'}.
+    """
+    github_token = os.environ.get('Submissions_PAT_21May')
+    if not github_token:
+        logutil.error("GITHUB", "Submissions_PAT_21May not configured")
+        return {'success': False, 'code': 500, 'error': 'GitHub PAT not configured. Please add Submissions_PAT_21May to Replit Secrets.'}
+
+    logutil.info("GITHUB", f"Creating issue in {GITHUB_REPO} with labels {labels or []}")
+
+    try:
+        result = yield from githubclient.GITHUB.create_issue_flow(GITHUB_REPO, title, body, labels)
+        logutil.info("GITHUB", f"Issue created - {result.get('html_url')}", issue=result.get('number'))
+        return {
+            'success': True,
+            'html_url': result.get('html_url'),
+            'number': result.get('number'),
+            'labels': [label.get('name') for label in result.get('labels') or []],
+        }
+    except httppool.HTTPError as e:
+        error_body = e.text()
+        logutil.error("GITHUB", f"API HTTPError {e.code}: {error_body}", status=e.code)
+        try:
+            error_json = json.loads(error_body)
+            error_msg = error_json.get('message', error_body)
+        except:
+            error_msg = error_body
+        return {'success': False, 'code': e.code, 'error': f'GitHub API error: {error_msg}'}
+    except githubclient.RateLimited as e:
+        logutil.warning("GITHUB", f"Rate limited: {e}")
+        return {'success': False, 'code': 503, 'error': f'{e}. Please try again later.'}
+    except (OSError, http.client.HTTPException) as e:
+        logutil.error("GITHUB", f"Network error: {e}")
+        return {'success': False, 'code': 500, 'error': f'Network error: {str(e)}'}
+
+
+def describe_render_resolution(render_result):
+    """'200 DPI', or a DPI range when image budget mode varied it per page."""
+    dpis = sorted({s["dpi"] for s in render_result.get("page_settings") or [] if s})
+    if not dpis:
+        return f"{(render_result.get('deferred') or {}).get('dpi') or RENDER_DPI} DPI"
+    if len(dpis) == 1:
+        return f"{dpis[0]} DPI"
+    return f"{dpis[0]}–{dpis[-1]} DPI"
+
+
+def build_compliance_section(compliance_result, pdf_extraction_failed, pdf_truncated, pdf_page_count, render_result):
+    """Render the AI pre-check markdown that is appended to the GitHub issue body."""
+    criteria_list = compliance_result.get('criteria', [])
+    overall_status = compliance_result.get('overall_status', 'UNAVAILABLE')
+    summary = compliance_result.get('message', 'No summary provided.')
+    is_error = compliance_result.get('error', False)
+
+    extraction_note = ""
+    if pdf_extraction_failed:
+        extraction_note = "\n> ⚠️ Note: PDF text extraction failed. The AI assessment is based on form-field metadata only, with reduced confidence.\n"
+    elif pdf_truncated:
+        extraction_note = f"\n> ⚠️ Note: The PDF text was truncated at approximately 60,000 characters ({pdf_page_count} pages total). The AI assessment is based on the content up to the truncation point.\n"
+
+    selection = render_result.get("selection")
+    has_images = pdfengine.has_page_images(render_result)
+    if selection and not render_result.get("error") and not has_images:
+        extraction_note += "\n> 🔬 **Visual analysis:** No pages with figures, diagrams or equations were found, so no page images were analyzed. The pre-check assessment is based on extracted text only.\n"
+    elif render_result.get("error") or not has_images:
+        extraction_note += "\n> ⚠️ **Visual analysis unavailable for this submission.** The PDF could not be rendered to images. The pre-check assessment is based on extracted text only.\n"
+    elif selection:
+        sent = [str(p["page"]) for p in selection["pages"] if p["sent"]]
+        vis_note = f"\n> 🔬 **Visual analysis:** pages {', '.join(sent)} of {render_result['total_pages']} contain figures, diagrams or equations and were rendered at {describe_render_resolution(render_result)} and analyzed alongside extracted text. Text-only, blank and duplicate pages were assessed from extracted text."
+        if render_result.get("truncated"):
+            vis_note += f" Further visual pages beyond the {render_result['rendered_pages']}-page cap were not rendered."
+        extraction_note += vis_note + "\n"
+    else:
+        rp = render_result['rendered_pages']
+        tp = render_result['total_pages']
+        vis_note = f"\n> 🔬 **Visual analysis:** {rp} of {tp} pages rendered to images at {describe_render_resolution(render_result)} and analyzed alongside extracted text."
+        if render_result.get("truncated"):
+            vis_note += f" Pages beyond page {rp} were not rendered visually but their text was still extracted."
+        extraction_note += vis_note + "\n"
+
+    # A partial parallel evaluation (UNAVAILABLE with criteria) still shows its scorecard.
+    if is_error or (overall_status == "UNAVAILABLE" and not criteria_list):
+        return f"""
+
+---
+
+### AI Structural Pre-Check (9-Criteria Scorecard, PDF-grounded)
+
+> **This is an automated structural screening, not a scientific evaluation.**
+
+**Overall Status:** UNAVAILABLE
+
+The AI pre-check could not be completed. This does not affect the submission — it proceeds to manual review.
+
+**Reason:** {summary}
+"""
+
+    if not criteria_list:
+        return f"""
+
+---
+
+### AI Structural Pre-Check (9-Criteria Scorecard, PDF-grounded)
+
+> **This is an automated structural screening, not a scientific evaluation.**
+
+**Overall Status:** {overall_status}
+{extraction_note}
+**Summary:** {summary}
+"""
+
+    scorecard_rows = ""
+    for c in criteria_list:
+        rendered_status = STATUS_DISPLAY.get(c.get('status', ''), c.get('status', ''))
+        reason = c.get('reason', '')
+        if c.get('carried_over_from'):
+            reason += f" *(carried over from #{c['carried_over_from']})*"
+        scorecard_rows += f"| {c.get('id', '')} | {c.get('name', '')} | {rendered_status} | {reason} |\n"
+
+    compliance_section = f"""
+
+---
+
+### AI Structural Pre-Check (9-Criteria Scorecard, PDF-grounded)
+
+> **This is an automated structural screening, not a scientific evaluation.**
+> The AI pre-check evaluates structure, not scientific truth.
+> A submission that contradicts TSM2 can still pass; a submission that agrees with TSM2 can still fail.
+> Final compliance determination is made by a qualified examiner.
+
+**Overall Status:** {overall_status}
+
+| # | Criterion | Status | Reason |
+| --- | --- | --- | --- |
+{scorecard_rows}{extraction_note}
+**Summary:** {summary}
+"""
+
+    if overall_status == "NON_COMPLIANT":
+        non_compliant_criteria = [c for c in criteria_list if c.get('status') == 'NON_COMPLIANT']
+        if non_compliant_criteria:
+            corrections_md = ""
+            for c in non_compliant_criteria:
+                correction = c.get('required_correction') or 'No correction provided.'
+                corrections_md += f"\n**{c.get('id', '?')}. {c.get('name', 'Unknown')}**\n\n{correction}\n"
+            compliance_section += f"""
+---
+
+### Minimum Corrections Required for Compliance
+
+The following corrections must be addressed for this submission to meet structural compliance. Each criterion below failed; the prescribed correction is shown.
+{corrections_md}
+Once these corrections are addressed, the submission may be revised and re-submitted for re-evaluation, naming this issue as the one it revises.
+"""
+    return compliance_section
+
+
+def cached_stage(namespace, key_parts, compute, store_if=None):
+    """Return a stage result from the content-addressed cache, computing it on a miss.
+
+    key_parts must start with the PDF's SHA-256; when that is unknown the
+    cache is bypassed. Tuples come back from the JSON cache as lists, so
+    list results are converted back to tuples to match the uncached shape.
+    """
+    cached = cache_lookup(namespace, key_parts)
+    if cached is not None:
+        return cached
+    result = compute()
+    if store_if is None or store_if(result):
+        cache_store(namespace, key_parts, result)
+    return result
+
+
+def cached_flow(namespace, key_parts, flow, store_if=None):
+    """cached_stage for a stage written as a flow; the flow only runs on a miss."""
+    cached = cache_lookup(namespace, key_parts)
+    if cached is not None:
+        flow.close()
+        return cached
+    result = yield from flow
+    if store_if is None or store_if(result):
+        cache_store(namespace, key_parts, result)
+    return result
+
+
+def cache_lookup(namespace, key_parts):
+    if not key_parts[0]:
+        return None
+    cached = resultcache.RESULT_CACHE.get(namespace, *key_parts)
+    if cached is None:
+        return None
+    logutil.info("CACHE", f"{namespace} hit for {key_parts[0][:12]}")
+    return tuple(cached) if isinstance(cached, list) else cached
+
+
+def cache_store(namespace, key_parts, value):
+    if key_parts[0]:
+        resultcache.RESULT_CACHE.put(namespace, value, *key_parts)
+
+
+def process_submission(submission, job=None):
+    """Run every stage of a multipart submission after the PDF has been stored.
+
+    Blocking wrapper around process_submission_flow; see there.
+    """
+    return flows.run(process_submission_flow(submission, job))
+
+
+def describe_analysis(analysis):
+    """Short stage detail for the browser, e.g. "12 pages, 48,210 characters extracted; 5 page images"."""
+    render = analysis["render"]
+    if analysis["text"]:
+        detail = f"{analysis['page_count']} pages, {len(analysis['text']):,} characters extracted"
+    else:
+        detail = "no extractable text"
+    if not render.get("error"):
+        verb = "planned" if render.get("deferred") else "rendered"
+        detail += f"; {render['rendered_pages']} page images {verb}"
+    return detail
+
+
+def process_submission_flow(submission, job=None):
+    """Run every stage of a multipart submission after the PDF has been stored.
+
+    Args:
+        submission: dict built by the request handler with keys title,
+            body_text, pdf_filename, pdf_path, final_filename, pdf_url,
+            user_info and form_data
+        job: optional jobs.Job; when given, stage progress is recorded on it
 
-            emailutil.send_email_async(
-                to_address=submitter_email,
-                subject=email_subject,
-                body_text=email_body,
+    Returns:
+        (http_status, response_data) tuple — the same payload /api/submit
+        returns in synchronous mode.
+    """
+    title = submission['title']
+    body_text = submission['body_text']
+    pdf_filename = submission['pdf_filename']
+    pdf_path = submission['pdf_path']
+    final_filename = submission['final_filename']
+    pdf_url = submission['pdf_url']
+    user_info = submission['user_info']
+    form_data = submission['form_data']
+
+    pdf_sha256 = submission.get('pdf_sha256')
+    started = time.perf_counter()
+
+    # Extract PDF text for AI assessment and render pages for multimodal
+    # vision analysis in one pass over the document on the PDF engine.
+    analysis_key = (
+        pdf_sha256, PDF_TEXT_MAX_CHARS, RENDER_MAX_PAGES, RENDER_DPI,
+        pdfengine.IMAGE_BUDGET_BYTES, pdfengine.IMAGE_BUDGET_PIXELS, pdfengine.IMAGE_MIN_DPI,
+        pdfengine.PAGE_SELECTION, pdfengine.STREAM_RENDER,
+    )
+    with jobs.track(job, "analyzing") as span:
+        analysis = yield flows.Blocking(
+            cached_stage, "analysis", analysis_key,
+            lambda: pdfengine.PDF_ENGINE.analyze(
+                pdf_path, max_chars=PDF_TEXT_MAX_CHARS, max_pages=RENDER_MAX_PAGES, dpi=RENDER_DPI
+            ),
+            store_if=lambda a: a["text"] is not None and not a["render"].get("error"),
+        )
+    pdf_text = analysis["text"]
+    pdf_truncated = analysis["truncated"]
+    pdf_page_count = analysis["page_count"]
+    render_result = analysis["render"]
+    metrics.PDF_ANALYSIS_SECONDS.observe(span.seconds, pages=metrics.page_bucket(pdf_page_count))
+    if job is not None:
+        job.note("analyzing", describe_analysis(analysis))
+
+    pdf_extraction_failed = False
+    if pdf_text is None:
+        pdf_extraction_failed = True
+    elif len(pdf_text.strip()) == 0:
+        pdf_text = None
+        pdf_extraction_failed = True
+        logutil.info("PDF EXTRACTION", f"PDF appears image-based; no extractable text.")
+    else:
+        engines = analysis["page_engines"]
+        engine_counts = {name: engines.count(name) for name in sorted(set(engines))}
+        logutil.info("PDF EXTRACTION", f"{pdf_page_count} pages, {len(pdf_text)} chars, truncated={pdf_truncated}, engines={engine_counts}")
+
+    if render_result.get("error"):
+        logutil.info("PDF RENDER", f"Vision unavailable: {render_result['error']}")
+    else:
+        if render_result.get("deferred"):
+            logutil.info("PDF RENDER", f"Planned {render_result['rendered_pages']}/{render_result['total_pages']} pages at {describe_render_resolution(render_result)}; rendering streams into the Grok upload")
+        else:
+            logutil.info("PDF RENDER", f"Rendered {render_result['rendered_pages']}/{render_result['total_pages']} pages at {describe_render_resolution(render_result)}")
+        if render_result.get("budget") and not render_result.get("deferred"):
+            logutil.info("PDF RENDER", f"Image budget: {render_result['budget']}")
+        if render_result.get("selection"):
+            skipped = {}
+            for p in render_result["selection"]["pages"]:
+                if not p["sent"]:
+                    key = "near-duplicate" if p["reason"].startswith("near-duplicate") else p["reason"]
+                    skipped[key] = skipped.get(key, 0) + 1
+            sent = [p["page"] for p in render_result["selection"]["pages"] if p["sent"]]
+            logutil.info("PDF RENDER", f"Visual selection sent pages {sent}; skipped {skipped}")
+
+    # Upload PDF to GitHub for permanent storage (after extraction + render, before issue creation)
+    with jobs.track(job, "uploading") as span:
+        permanent_pdf_url, pdf_upload_success = yield from cached_flow(
+            "upload", (pdf_sha256, GITHUB_REPO, GITHUB_PDF_BRANCH, GITHUB_PDF_DIR),
+            upload_pdf_to_github_flow(
+                local_path=pdf_path,
+                filename=final_filename,
+                github_pat=os.environ.get("Submissions_PAT_21May", ""),
+            ),
+            store_if=lambda r: r[1] and r[0],
+        )
+        if not pdf_upload_success:
+            span.fail()
+    if pdf_upload_success and permanent_pdf_url:
+        pdf_url = permanent_pdf_url
+    else:
+        logutil.info("GITHUB PDF", "Falling back to local Replit URL for PDF link")
+
+    # A revision of an earlier issue re-evaluates only the criteria whose
+    # supporting sections changed (revisions.py). The fingerprint covers
+    # every page, not just the PDF_TEXT_MAX_CHARS the prompt gets.
+    fingerprint = None
+    revision = None
+    if form_data:
+        digest = yield flows.Blocking(pdfengine.PDF_ENGINE.digest, pdf_path)
+        fingerprint = revisions.fingerprint(digest, form_data, user_info)
+        revision = yield flows.Blocking(revisions.plan, form_data, user_info, fingerprint)
+    if revision and job is not None:
+        job.note("evaluating", f"Revision of #{revision['base_issue']}: re-evaluating {len(revision['reevaluate'])} of 9 criteria")
+
+    compliance_result = None
+    if form_data:
+        with jobs.track(job, "evaluating") as span:
+            compliance_result = yield from check_compliance_with_grok_flow(
+                form_data,
+                pdf_text=pdf_text,
+                pdf_extraction_failed=pdf_extraction_failed,
+                render_result=render_result,
+                pdf_sha256=pdf_sha256,
+                pdf_path=pdf_path,
+                on_criterion=job.publish_criterion if job is not None else None,
+                reuse=revision['reuse'] if revision else None,
             )
-            print(f"[SUBMITTER EMAIL] Queued for {submitter_email} (status={overall_status})", file=sys.stderr)
+            if compliance_result.get('error'):
+                span.fail()
+        if job is not None:
+            # Cached or non-streamed results: send what was not streamed.
+            for criterion in compliance_result.get('criteria', []):
+                job.publish_criterion(criterion)
+
+    logutil.debug("CACHE", f"{resultcache.RESULT_CACHE.stats()}")
+
+    if pdf_url:
+        body_text = body_text.replace(
+            f'- **PDF Attached:** {pdf_filename}',
+            f'- **PDF Attached:** [{pdf_filename}]({pdf_url})'
+        )
 
-        except Exception as e:
-            print(f"Submitter email error: {str(e)}", file=sys.stderr)
+        if compliance_result:
+            body_text += build_compliance_section(
+                compliance_result, pdf_extraction_failed, pdf_truncated, pdf_page_count, render_result
+            )
+
+    if revision:
+        body_text += revisions.issue_section(revision, compliance_result)
+
+    labels = issue_labels(compliance_result, form_data)
+    with jobs.track(job, "creating_issue") as span:
+        result = yield from create_github_issue_flow(title, body_text, labels)
+        if not result.get('success'):
+            span.fail()
+    logutil.debug("HTTP POOL", f"{httppool.HTTP_POOL.stats()} async={httppool.ASYNC_HTTP_POOL.stats()}")
+    logutil.debug("GITHUB", f"{githubclient.GITHUB.stats()}")
+
+    if not result.get('success'):
+        metrics.record_submission("error", pdf_page_count, time.perf_counter() - started)
+        return result.get('code', 500), {'error': result.get('error')}
+
+    logutil.debug("SUBMISSION", f"User info received for issue #{result.get('number')}", fields=sorted(user_info))
+
+    issue_number = result.get('number')
+    issue_url = result.get('html_url')
+
+    if compliance_result:
+        yield flows.Blocking(
+            scorestore.record_submission, issue_number, compliance_result, form_data, pdf_sha256, pdf_url,
+            fingerprint, revision,
+        )
+
+    with jobs.track(job, "notifying"):
+        missing_labels = [label for label in labels if label not in result.get('labels', [])]
+        if missing_labels:
+            logutil.info("GITHUB", f"Issue #{issue_number} created without {missing_labels}; adding them")
+            yield flows.Background(apply_github_labels_flow(issue_number, missing_labels), "labels")
+        if revision:
+            yield flows.Background(post_revision_comment_flow(revision, compliance_result, issue_number, issue_url), "revision_comment")
+        send_examiner_notification(user_info, form_data, title, issue_url, issue_number, compliance_result)
+        send_submitter_email(user_info, form_data, issue_number, issue_url, compliance_result)
+
+    response_data = {
+        'success': True,
+        'html_url': result.get('html_url'),
+        'number': result.get('number')
+    }
+    if compliance_result:
+        frontend_check = {k: v for k, v in compliance_result.items() if k not in ('error', 'prompt', 'evaluation')}
+        response_data['complianceCheck'] = frontend_check
+
+    metrics.record_submission("ok", pdf_page_count, time.perf_counter() - started)
+    return 200, response_data
+
+
+def sanitize_filename(filename):
+    import re
+    filename = os.path.basename(filename)
+    filename = re.sub(r'[^\w\s\-\.]', '', filename)
+    filename = re.sub(r'\s+', '_', filename)
+    if len(filename) > 100:
+        name, ext = os.path.splitext(filename)
+        filename = name[:96] + ext
+    return filename if filename else 'document.pdf'
+
+
+def validate_pdf(size, head, filename):
+    if size > MAX_PDF_SIZE:
+        return False, f'File size exceeds 100MB limit (got {size / 1024 / 1024:.1f}MB)'
+
+    if not filename.lower().endswith('.pdf'):
+        return False, 'File must be a PDF document (.pdf extension required)'
+
+    if size < 4 or head[:4] != b'%PDF':
+        return False, 'Invalid PDF file (file does not appear to be a valid PDF)'
+
+    return True, None
+
+
+def wants_job_mode(path, headers):
+    """Job mode is requested with ?mode=async or a `Prefer: respond-async` header."""
+    query = path.split('?', 1)[1] if '?' in path else ''
+    if 'mode=async' in query.split('&'):
+        return True
+    return 'respond-async' in headers.get('Prefer', '')
+
+
+def prepare_submission(fields, files):
+    """Validate a parsed multipart submission and move its PDF into uploads/.
+
+    Args:
+        fields: text fields from multipart.parse_multipart
+        files: spooled file parts from multipart.parse_multipart
+
+    Returns:
+        (submission, error) tuple. submission is the dict process_submission
+        takes; on a validation failure it is None, error is the message for
+        a 400 response and every spooled file has been removed.
+    """
+    title = fields.get('title', '').strip()
+    body_text = fields.get('body', '').strip()
+    user_info = {}
+    form_data = {}
+    try:
+        user_info = json.loads(fields.get('userInfo', '').strip())
+    except ValueError:
+        pass
+    logutil.protect(user_info)
+    try:
+        form_data = json.loads(fields.get('formData', '').strip())
+    except ValueError:
+        pass
+
+    for name, upload in files.items():
+        if name != 'pdf':
+            upload.discard()
+    upload = files.get('pdf')
+    pdf_filename = upload.filename if upload else None
+
+    if not pdf_filename or upload.size == 0:
+        if upload:
+            upload.discard()
+        return None, 'PDF document is required. Please attach a PDF file.'
+
+    is_valid, error_msg = validate_pdf(upload.size, upload.head, pdf_filename)
+    if not is_valid:
+        upload.discard()
+        return None, error_msg
+
+    safe_filename = sanitize_filename(pdf_filename)
+    unique_id = str(uuid.uuid4())[:8]
+    final_filename = f"{unique_id}_{safe_filename}"
+    pdf_path = os.path.join('uploads', final_filename)
+
+    os.replace(upload.path, pdf_path)
+
+    domain = os.environ.get('REPLIT_DEV_DOMAIN', '')
+    if domain:
+        local_pdf_url = f"https://{domain}/uploads/{final_filename}"
+    else:
+        local_pdf_url = f"/uploads/{final_filename}"
+    pdf_url = local_pdf_url
+
+    logutil.info("SUBMISSION", f"PDF saved: {pdf_path} ({upload.size} bytes)", sha256=upload.sha256, title=title)
+
+    return {
+        'title': title,
+        'body_text': body_text,
+        'pdf_filename': pdf_filename,
+        'pdf_path': pdf_path,
+        'pdf_sha256': upload.sha256,
+        'final_filename': final_filename,
+        'pdf_url': pdf_url,
+        'user_info': user_info,
+        'form_data': form_data,
+    }, None
+
+
+SCORECARD_FILTERS = ('status', 'scale', 'pdf_sha256', 'criterion_status', 'since', 'until')
+
+
+def scorecard_response(path, query):
+    """(http_status, data) for GET /api/scorecards, /api/scorecards/stats and /api/scorecards/<issue>."""
+    rest = path[len('/api/scorecards'):].strip('/')
+    if rest == 'stats':
+        return 200, scorestore.SCORECARDS.stats()
+    if rest:
+        if not rest.isdigit():
+            return 404, {'error': 'Not found'}
+        scorecard = scorestore.SCORECARDS.get(int(rest))
+        if scorecard is None:
+            return 404, {'error': f'No scorecard stored for issue #{rest}'}
+        return 200, scorecard
+    filters = {name: query[name][0] for name in SCORECARD_FILTERS if query.get(name)}
+    try:
+        for name in ('criterion', 'limit', 'offset'):
+            if query.get(name):
+                filters[name] = int(query[name][0])
+    except ValueError:
+        return 400, {'error': 'criterion, limit and offset must be integers'}
+    return 200, scorestore.SCORECARDS.query(**filters)
+
+
+def server_status(server_stats):
+    """Live load figures for GET /api/status."""
+    return {
+        'server': server_stats,
+        'submissions': SUBMISSION_ADMISSION.stats(),
+        'jobs': JOB_MANAGER.stats(),
+        'event_streams': jobs.EVENT_STREAMS.stats(),
+        'static': staticassets.STATIC_ASSETS.stats(),
+        'github_uploads': gitupload.COMMIT_BATCHER.stats(),
+        'github': githubclient.GITHUB.stats(),
+        'prompt': sectionindex.PROMPT_STATS.stats(),
+        'evaluation': criteriaeval.EVAL_STATS.stats(),
+        'logging': logutil.WRITER.stats(),
+    }
+
+
+JOB_MANAGER = jobs.JobManager()
+SUBMISSION_ADMISSION = admission.AdmissionControl()
+
+metrics.reading("tsm2_submissions_in_flight", "Submissions being processed (sync requests plus unfinished jobs).",
+                lambda: SUBMISSION_ADMISSION.stats()['in_flight'])
+metrics.reading("tsm2_submissions_rejected_total", "Submissions refused with 503.",
+                lambda: SUBMISSION_ADMISSION.stats()['rejected'], kind="counter")
+metrics.reading("tsm2_jobs", "Background submission jobs held in memory, by status.",
+                lambda: {(status,): count for status, count in JOB_MANAGER.stats().items()}, ("status",))
+metrics.reading("tsm2_email_queue_depth", "Emails waiting for an SMTP worker.",
+                lambda: emailutil.EMAIL_QUEUE.stats()['queue_depth'])
+metrics.reading("tsm2_github_rate_remaining", "Remaining GitHub API quota, by rate-limit resource.",
+                lambda: {(name,): limit.get('remaining') for name, limit in githubclient.GITHUB.stats()['limits'].items()},
+                ("resource",))
+
+
+def process_admitted_submission(submission, job=None):
+    """process_submission for a job that holds an admission slot; frees it when done."""
+    try:
+        return process_submission(submission, job=job)
+    finally:
+        SUBMISSION_ADMISSION.release()
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PooledHTTPServer(admission.PooledMixIn, HTTPServer):
+    """Fixed handler pool with a bounded accept queue (TSM2_SERVER_MODE=pooled)."""
+
+
+def make_server(address, mode=None):
+    """Build the HTTP server for TSM2_SERVER_MODE: "pooled" (default) or "threading"."""
+    mode = mode or admission.SERVER_MODE
+    if mode == "threading":
+        return ThreadingHTTPServer(address, RequestHandler)
+    server = PooledHTTPServer(address, RequestHandler)
+    # Synchronous submissions and event streams each hold a handler thread
+    # for minutes; the pool must outnumber both caps together.
+    server.handler_threads = admission.handler_threads_for(
+        SUBMISSION_ADMISSION.max_in_flight + jobs.EVENT_STREAMS.max_in_flight)
+    return server
+
+
+class RequestHandler(SimpleHTTPRequestHandler):
+    # Socket timeout for every read and write: a client that stalls frees its thread.
+    timeout = admission.REQUEST_TIMEOUT
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path.startswith('/api/submissions/') and path.endswith('/events'):
+            self.handle_job_events(path[len('/api/submissions/'):-len('/events')].strip('/'))
+        elif path.startswith('/api/submissions/'):
+            self.handle_job_status(path[len('/api/submissions/'):].strip('/'))
+        elif path == '/api/scorecards' or path.startswith('/api/scorecards/'):
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            self.send_json_response(*scorecard_response(path, query))
+        elif path == '/api/status':
+            self.handle_server_status()
+        elif path == '/metrics':
+            self.handle_metrics()
+        elif not self.send_static_asset(path):
+            if path in ('/', '', '/index.html'):
+                self.send_error(404, 'File not found')
+            elif not self.send_download(path):
+                if staticassets.is_private(path):
+                    self.send_error(404, 'File not found')
+                else:
+                    super().do_GET()
+
+    def do_HEAD(self):
+        path = self.path.split('?')[0]
+        if not self.send_static_asset(path, head_only=True) and not self.send_download(path, head_only=True):
+            if staticassets.is_private(path):
+                self.send_error(404, 'File not found')
+            else:
+                super().do_HEAD()
+
+    def send_static_asset(self, path, head_only=False):
+        """Serve index.html or public/files/* from memory; False if path is not an asset."""
+        response = staticassets.STATIC_ASSETS.respond(path, self.headers)
+        if response is None:
+            return False
+        code, headers, body = response
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if body and not head_only:
+            self.wfile.write(body)
+        return True
+
+    def send_download(self, path, head_only=False):
+        """Serve /uploads/ and /pdfs/ files with Range support via sendfile."""
+        response = rangefiles.prepare(path, self.headers)
+        if response is None:
+            return False
+        self.send_response(response.status)
+        for name, value in response.headers:
+            self.send_header(name, value)
+        if response.status != 304:
+            self.send_header('Content-Length', str(response.content_length))
+        self.end_headers()
+        if not head_only:
+            rangefiles.send_blocking(self.connection, response)
+        return True
     
-    def create_github_issue(self, title, body):
-        github_token = os.environ.get('Submissions_PAT_21May')
-        if not github_token:
-            print("ERROR: Submissions_PAT_21May not configured", file=sys.stderr)
-            return {'success': False, 'code': 500, 'error': 'GitHub PAT not configured. Please add Submissions_PAT_21May to Replit Secrets.'}
-        
-        repo_owner = 'TSM2Institute'
-        repo_name = 'submissions'
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Prefer')
+        self.end_headers()
+    
+    def do_POST(self):
+        if self.path.split('?')[0] == '/api/submit':
+            # Refuse before reading the upload when too many submissions are
+            # already in flight; the body is left unread, so close afterwards.
+            if not SUBMISSION_ADMISSION.try_acquire():
+                logutil.info("ADMISSION", f"Rejecting submission: {SUBMISSION_ADMISSION.stats()}")
+                self.close_connection = True
+                self.send_json_response(503, {'error': admission.BUSY_MESSAGE},
+                                        extra_headers={'Retry-After': str(admission.RETRY_AFTER_SECONDS)})
+                return
+            self.admission_handed_off = False
+            try:
+                content_type = self.headers.get('Content-Type', '')
+                
+                if 'multipart/form-data' in content_type:
+                    self.handle_multipart_submission()
+                else:
+                    self.handle_json_submission()
+                    
+            except Exception as e:
+                logutil.exception("SUBMISSION", f"Unhandled exception: {type(e).__name__}: {e}")
+                self.send_json_response(500, {'error': f'Server error: {str(e)}'})
+            finally:
+                if not self.admission_handed_off:
+                    SUBMISSION_ADMISSION.release()
+        else:
+            self.send_json_response(404, {'error': 'Not found'})
+    
+    def sanitize_filename(self, filename):
+        return sanitize_filename(filename)
+    
+    def validate_pdf(self, size, head, filename):
+        return validate_pdf(size, head, filename)
+    
+    def handle_multipart_submission(self):
+        content_type = self.headers['Content-Type']
+        content_length = int(self.headers.get('Content-Length', 0))
         
-        issue_data = {
-            'title': title,
-            'body': body
-        }
+        try:
+            with metrics.span("multipart"):
+                fields, files = multipart.parse_multipart(
+                    self.rfile,
+                    content_type,
+                    content_length,
+                    upload_dir='uploads',
+                    max_file_size=MAX_PDF_SIZE,
+                )
+        except multipart.MultipartError as e:
+            # The rest of the body was not consumed; don't reuse the connection.
+            self.close_connection = True
+            self.send_json_response(e.status, {'error': str(e)})
+            return
         
-        url = f'https://api.github.com/repos/{repo_owner}/{repo_name}/issues'
-        print(f"Making request to: {url}", file=sys.stderr)
+        submission, error = prepare_submission(fields, files)
+        if error:
+            self.send_json_response(400, {'error': error})
+            return
+
+        if self.wants_job_mode():
+            job = JOB_MANAGER.create()
+            JOB_MANAGER.submit(job, process_admitted_submission, submission)
+            self.admission_handed_off = True
+            status_url = f"/api/submissions/{job.job_id}"
+            logutil.info("JOB", f"Queued {job.job_id} for: {submission['title']}")
+            self.send_json_response(202, {
+                'success': True,
+                'job_id': job.job_id,
+                'status': job.status,
+                'status_url': status_url,
+            }, extra_headers={'Location': status_url})
+            return
+
+        code, response_data = process_submission(submission)
+        self.send_json_response(code, response_data)
+
+    def wants_job_mode(self):
+        return wants_job_mode(self.path, self.headers)
+
+    def handle_job_status(self, job_id):
+        job = JOB_MANAGER.get(job_id)
+        if job is None:
+            self.send_json_response(404, {'error': 'Unknown submission job'})
+            return
+        self.send_json_response(200, job.to_dict())
+    
+    def handle_job_events(self, job_id):
+        """Server-Sent Events for a job (see jobs); holds this handler thread until the job is done."""
+        job = JOB_MANAGER.get(job_id)
+        if job is None:
+            self.send_json_response(404, {'error': 'Unknown submission job'})
+            return
+        if not jobs.EVENT_STREAMS.try_acquire():
+            self.send_json_response(503, {'error': 'Too many live progress streams; poll the status URL instead.'},
+                                    extra_headers={'Retry-After': str(admission.RETRY_AFTER_SECONDS)})
+            return
+        try:
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            last_id = jobs.last_event_id(self.headers, query)
+            self.close_connection = True
+            self.send_response(200)
+            for name, value in jobs.EVENT_STREAM_HEADERS.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(jobs.stream_preamble())
+            self.wfile.flush()
+            while True:
+                events, done = job.events_after(last_id, jobs.EVENT_HEARTBEAT)
+                for event in events:
+                    self.wfile.write(jobs.format_event(event))
+                    last_id = event[0]
+                if not events and not done:
+                    self.wfile.write(jobs.HEARTBEAT)
+                self.wfile.flush()
+                if done and not events:
+                    break
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            jobs.EVENT_STREAMS.release()
+
+    def handle_server_status(self):
+        """Live load figures: handler pool, submission admission and jobs."""
+        pool_stats = getattr(self.server, 'pool_stats', None)
+        self.send_json_response(200, server_status(pool_stats() if pool_stats else {'mode': 'threading'}))
+
+    def handle_metrics(self):
+        """Prometheus text exposition of metrics.REGISTRY."""
+        body = metrics.REGISTRY.render()
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_json_submission(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        post_data = self.rfile.read(content_length)
         
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(issue_data).encode('utf-8'),
-            headers={
-                'Authorization': f'token {github_token}',
-                'Accept': 'application/vnd.github.v3+json',
-                'Content-Type': 'application/json',
-                'User-Agent': 'TSM2-Submission-Portal'
-            },
-            method='POST'
-        )
+        logutil.debug("SUBMISSION", f"Received JSON submission, content length: {content_length}")
         
         try:
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                print(f"SUCCESS: Issue created - {result.get('html_url')}", file=sys.stderr)
-                return {
-                    'success': True,
-                    'html_url': result.get('html_url'),
-                    'number': result.get('number')
-                }
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
-            print(f"GitHub API HTTPError {e.code}: {error_body}", file=sys.stderr)
-            try:
-                error_json = json.loads(error_body)
-                error_msg = error_json.get('message', error_body)
-            except:
-                error_msg = error_body
-            return {'success': False, 'code': e.code, 'error': f'GitHub API error: {error_msg}'}
-        except urllib.error.URLError as e:
-            print(f"Network URLError: {str(e)}", file=sys.stderr)
-            return {'success': False, 'code': 500, 'error': f'Network error: {str(e)}'}
+            data = json.loads(post_data.decode('utf-8'))
+        except json.JSONDecodeError as e:
+            logutil.warning("SUBMISSION", f"JSON decode error: {e}")
+            self.send_json_response(400, {'error': 'Invalid JSON in request'})
+            return
+            
+        title = data.get('title', '')
+        body = data.get('body', '')
+        
+        logutil.debug("SUBMISSION", f"Parsed request - Title: {title[:50]}...")
+        
+        result = create_github_issue(title, body)
+        
+        if result.get('success'):
+            self.send_json_response(200, {
+                'success': True,
+                'html_url': result.get('html_url'),
+                'number': result.get('number')
+            })
+        else:
+            self.send_json_response(result.get('code', 500), {'error': result.get('error')})
     
-    def send_json_response(self, code, data):
+    def send_json_response(self, code, data, extra_headers=None):
         try:
             response_body = json.dumps(data).encode('utf-8')
             self.send_response(code)
@@ -1021,61 +1503,75 @@ info@tsm2.org
             self.send_header('Content-Length', str(len(response_body)))
             self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
             self.send_header('Access-Control-Allow-Origin', '*')
+            for name, value in (extra_headers or {}).items():
+                self.send_header(name, value)
             self.end_headers()
             self.wfile.write(response_body)
             self.wfile.flush()
-            print(f"Response sent: {code} - {data}", file=sys.stderr)
+            # The body can hold a full scorecard; only worth writing when debugging.
+            logutil.debug("HTTP", f"Response sent: {code}", status=code, response=data)
         except Exception as e:
-            print(f"Error sending response: {str(e)}", file=sys.stderr)
+            logutil.warning("HTTP", f"Error sending response: {e}")
     
     def end_headers(self):
+        self.send_header('X-Request-ID', logutil.get('request_id'))
         super().end_headers()
     
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if self.headers.get('X-Request-ID'):
+            logutil.update(request_id=logutil.new_request_id(self.headers['X-Request-ID']))
+        return True
+
+    def log_request(self, code='-', size='-'):
+        logutil.info("HTTP", f'"{self.requestline}" {code} {size}', client=self.client_address[0], status=code)
+
     def log_message(self, format, *args):
-        sys.stderr.write("%s - - [%s] %s\n" %
-                         (self.client_address[0],
-                          self.log_date_time_string(),
-                          format % args))
-        sys.stderr.flush()
+        logutil.info("HTTP", format % args, client=self.client_address[0])
 
     def handle_one_request(self):
-        try:
-            super().handle_one_request()
-        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
-            pass
-        except Exception as e:
-            print(f"Request handling error: {type(e).__name__}: {e}", file=sys.stderr)
+        with logutil.scope(request_id=logutil.new_request_id()):
+            try:
+                super().handle_one_request()
+            except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+                pass
+            except Exception as e:
+                logutil.error("HTTP", f"Request handling error: {type(e).__name__}: {e}")
 
 if __name__ == '__main__':
     import signal
     
     is_production = os.environ.get('REPLIT_DEPLOYMENT') is not None
-    port = 80 if is_production else 5000
-    
-    print(f'Starting server on port {port}...', file=sys.stderr)
-    sys.stderr.flush()
-    server = ThreadingHTTPServer(('0.0.0.0', port), RequestHandler)
+    port = int(os.environ.get('TSM2_PORT', 80 if is_production else 5000))
+
+    if admission.SERVER_MODE == 'asyncio':
+        import asyncserver
+        asyncserver.main(port)
+        sys.exit(0)
+
+    logutil.info("STARTUP", f"Starting server on port {port}...")
+    staticassets.STATIC_ASSETS.preload()
+    server = make_server(('0.0.0.0', port))
     
     def handle_shutdown(signum, frame):
-        print(f"Received signal {signum}, shutting down...", file=sys.stderr)
-        sys.stderr.flush()
+        logutil.info("SHUTDOWN", f"Received signal {signum}, shutting down...")
         server.shutdown()
     
     def handle_sighup(signum, frame):
-        print(f"Received SIGHUP, ignoring...", file=sys.stderr)
-        sys.stderr.flush()
+        logutil.info("SHUTDOWN", "Received SIGHUP, ignoring...")
     
     signal.signal(signal.SIGTERM, handle_shutdown)
     signal.signal(signal.SIGHUP, handle_sighup)
     
-    print(f'Server running on port {port}', file=sys.stderr)
-    sys.stderr.flush()
+    logutil.info("STARTUP", f"Server running on port {port}")
     
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
-        print("Server stopped", file=sys.stderr)
-        sys.stderr.flush()
+        logutil.info("SHUTDOWN", "Server stopped")
         server.server_close()
+        emailutil.EMAIL_QUEUE.shutdown(timeout=10)
+        logutil.WRITER.shutdown()
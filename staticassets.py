@@ -0,0 +1,250 @@
+"""In-memory, precompressed static assets for the portal.
+
+index.html and everything under public/files/ are read once and kept in
+memory together with gzip (and, when the optional `brotli` package is
+installed, brotli) variants. Responses carry a strong ETag per encoding,
+honour If-None-Match with 304 Not Modified, negotiate Accept-Encoding and
+send `Vary: Accept-Encoding`. Each request stats the file, and an asset is
+rebuilt when its mtime or size changes, so edits show up without a restart.
+
+is_private() names the paths under the working directory that are never
+served, whichever server is running: the default log directory and the
+result cache, and any SQLite database file (scorecards.db from an older
+deployment, with its -wal/-shm/-journal companions).
+
+index.html used to be sent with `no-cache, no-store`, which forbids the
+browser from keeping a copy at all. It is now `no-cache`: the browser
+revalidates on every load and normally gets a bodiless 304.
+"""
+
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+import email.utils
+import posixpath
+import urllib.parse
+
+import logutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MAX_ASSET_BYTES = 2 * 1024 * 1024
+MIN_COMPRESS_BYTES = 256
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+INDEX_CACHE_CONTROL = "no-cache"
+FILES_CACHE_CONTROL = "public, max-age=300"
+
+# Preferred first when the client accepts several encodings equally.
+ENCODINGS = ("br", "gzip", "identity")
+
+PRIVATE_DIRS = ("logs", "cache")
+PRIVATE_SUFFIXES = (".db", ".db-wal", ".db-shm", ".db-journal", ".sqlite", ".sqlite3")
+
+
+def is_private(path):
+    """True for a request path that must never be served from the working directory."""
+    words = [w for w in posixpath.normpath(urllib.parse.unquote(path.split("?", 1)[0])).split("/")
+             if w and w not in (os.curdir, os.pardir)]
+    return bool(words) and (words[0] in PRIVATE_DIRS or words[-1].lower().endswith(PRIVATE_SUFFIXES))
+
+
+class Asset:
+    """One file held in memory with its encoded variants."""
+
+    def __init__(self, path, data, mtime, content_type, cache_control):
+        self.path = path
+        self.mtime = mtime
+        self.size = len(data)
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        self.variants = {"identity": (data, f'"{digest}"')}
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(data) >= MIN_COMPRESS_BYTES:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                self.variants["gzip"] = (compressed, f'"{digest}-gzip"')
+            if brotli is not None:
+                compressed = brotli.compress(data)
+                if len(compressed) < len(data):
+                    self.variants["br"] = (compressed, f'"{digest}-br"')
+
+    def etags(self):
+        return {etag for _, etag in self.variants.values()}
+
+
+def parse_accept_encoding(header):
+    """Map of coding -> q-value from an Accept-Encoding header."""
+    accepted = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header, available):
+    """Best coding in `available` for an Accept-Encoding header."""
+    accepted = parse_accept_encoding(header)
+    best, best_q = "identity", -1.0
+    for coding in ENCODINGS:
+        if coding not in available:
+            continue
+        if coding in accepted:
+            q = accepted[coding]
+        elif "*" in accepted:
+            q = accepted["*"]
+        else:
+            # identity is acceptable unless explicitly refused.
+            q = 0.001 if coding == "identity" else 0.0
+        if q > best_q and q > 0:
+            best, best_q = coding, q
+    return best
+
+
+def etag_matches(if_none_match, etags):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+
+class AssetStore:
+    """URL path -> in-memory Asset, reloaded when the file changes on disk."""
+
+    def __init__(self, root=".", index="index.html", file_prefixes=(("/public/files/", "public/files"),)):
+        self.root = root
+        self.index = index
+        self.file_prefixes = file_prefixes
+        self._lock = threading.Lock()
+        self._assets = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.reloads = 0
+
+    def resolve(self, url_path):
+        """(file path, cache control) for a URL, or (None, None) if not ours."""
+        if url_path in ("/", "", "/index.html"):
+            return os.path.join(self.root, self.index), INDEX_CACHE_CONTROL
+        for prefix, directory in self.file_prefixes:
+            if url_path.startswith(prefix):
+                relative = posixpath.normpath(urllib.parse.unquote(url_path[len(prefix):]))
+                parts = [p for p in relative.split("/") if p and p not in (".", "..")]
+                if not parts:
+                    return None, None
+                return os.path.join(self.root, directory, *parts), FILES_CACHE_CONTROL
+        return None, None
+
+    def preload(self):
+        """Load index.html and every file under the prefixed directories."""
+        paths = ["/"]
+        for prefix, directory in self.file_prefixes:
+            base = os.path.join(self.root, directory)
+            for dirpath, _, filenames in os.walk(base):
+                for name in filenames:
+                    relative = os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, "/")
+                    paths.append(prefix + relative)
+        loaded = [asset for asset in map(self.get, paths) if asset is not None]
+        logutil.info(
+            "STATIC",
+            f"Preloaded {len(loaded)} assets "
+            f"({sum(a.size for a in loaded)} bytes, brotli {'on' if brotli else 'unavailable'})",
+        )
+        return loaded
+
+    def get(self, url_path):
+        """Current Asset for url_path, or None if it is not a managed file."""
+        path, cache_control = self.resolve(url_path)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path) or stat.st_size > MAX_ASSET_BYTES:
+            return None
+        with self._lock:
+            asset = self._assets.get(path)
+        if asset is not None and asset.mtime == stat.st_mtime and asset.size == stat.st_size:
+            return asset
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        fresh = Asset(path, data, stat.st_mtime, content_type, cache_control)
+        with self._lock:
+            if asset is not None:
+                self.reloads += 1
+                logutil.info("STATIC", f"Reloaded {path} (changed on disk)")
+            self._assets[path] = fresh
+        return fresh
+
+    def respond(self, url_path, headers):
+        """(status, header list, body) for a GET/HEAD, or None if not ours.
+
+        headers is the request's header mapping; the caller writes the
+        response and drops the body for HEAD.
+        """
+        asset = self.get(url_path)
+        if asset is None:
+            return None
+        encoding = choose_encoding(headers.get("Accept-Encoding"), asset.variants)
+        body, etag = asset.variants[encoding]
+        response_headers = [
+            ("ETag", etag),
+            ("Cache-Control", asset.cache_control),
+            ("Last-Modified", asset.last_modified),
+            ("Vary", "Accept-Encoding"),
+        ]
+        with self._lock:
+            self.hits += 1
+        if etag_matches(headers.get("If-None-Match"), asset.etags()):
+            with self._lock:
+                self.not_modified += 1
+            return 304, response_headers, b""
+        response_headers.append(("Content-Type", asset.content_type))
+        if encoding != "identity":
+            response_headers.append(("Content-Encoding", encoding))
+        response_headers.append(("Content-Length", str(len(body))))
+        return 200, response_headers, body
+
+    def stats(self):
+        with self._lock:
+            return {
+                "assets": len(self._assets),
+                "bytes": sum(a.size for a in self._assets.values()),
+                "hits": self.hits,
+                "not_modified": self.not_modified,
+                "reloads": self.reloads,
+                "brotli": brotli is not None,
+            }
+
+
+STATIC_ASSETS = AssetStore()
@@ -0,0 +1,107 @@
+"""The pool may replay a request on a fresh connection only when that is safe."""
+
+import asyncio
+import http.client
+import socket
+import threading
+import unittest
+
+import httppool
+
+
+class DroppingServer:
+    """Keep-alive HTTP server. /ok answers; /drop reads the request and hangs up;
+    /partial sends part of a streamed body and hangs up."""
+
+    def __init__(self):
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        self.seen = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = conn.makefile("rb")
+        with conn, reader:
+            while True:
+                request_line = reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode().split(" ", 2)
+                length = 0
+                while (line := reader.readline()) not in (b"\r\n", b""):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                reader.read(length)
+                self.seen.append((method, path))
+                if path == "/ok":
+                    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                    continue
+                if path == "/partial":
+                    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n" + b"x" * 10)
+                conn.shutdown(socket.SHUT_RDWR)
+                return
+
+    def count(self, method, path):
+        return self.seen.count((method, path))
+
+    def close(self):
+        self.sock.close()
+
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = DroppingServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_post_is_not_repeated_after_it_was_sent(self):
+        pool = httppool.ConnectionPool()
+        pool.request("GET", self.server.url + "/ok")
+        with self.assertRaises(http.client.RemoteDisconnected):
+            pool.request("POST", self.server.url + "/drop", body=b"{}")
+        self.assertEqual(self.server.count("POST", "/drop"), 1)
+
+    def test_get_is_repeated_once(self):
+        pool = httppool.ConnectionPool()
+        pool.request("GET", self.server.url + "/ok")
+        with self.assertRaises(http.client.RemoteDisconnected):
+            pool.request("GET", self.server.url + "/drop")
+        self.assertEqual(self.server.count("GET", "/drop"), 2)
+
+    def test_async_post_is_not_repeated_after_it_was_sent(self):
+        async def run():
+            pool = httppool.AsyncConnectionPool()
+            await pool.request("GET", self.server.url + "/ok")
+            with self.assertRaises(http.client.RemoteDisconnected):
+                await pool.request("POST", self.server.url + "/drop", body=b"{}")
+            pool.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.server.count("POST", "/drop"), 1)
+
+    def test_async_stream_is_not_repeated_after_on_data(self):
+        pieces = []
+
+        async def run():
+            pool = httppool.AsyncConnectionPool()
+            await pool.request("GET", self.server.url + "/ok")
+            with self.assertRaises(http.client.RemoteDisconnected):
+                await pool.request("GET", self.server.url + "/partial", on_data=pieces.append)
+            pool.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.server.count("GET", "/partial"), 1)
+        self.assertEqual(b"".join(pieces), b"x" * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
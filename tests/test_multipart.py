@@ -0,0 +1,60 @@
+"""parse_multipart must not leave spooled parts behind when reading fails."""
+
+import io
+import os
+import socket
+import tempfile
+import unittest
+
+import multipart
+
+
+BOUNDARY = "b0undary"
+BODY = (
+    f"--{BOUNDARY}\r\n"
+    'Content-Disposition: form-data; name="pdf"; filename="paper.pdf"\r\n'
+    "Content-Type: application/pdf\r\n\r\n"
+).encode() + b"%PDF-1.7 " + b"x" * 200000
+
+
+class FailingStream(io.BytesIO):
+    """Serves the first `limit` bytes of the body, then fails like a stalled socket."""
+
+    def __init__(self, data, limit, error):
+        super().__init__(data)
+        self.limit = limit
+        self.error = error
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise self.error
+        return super().read(min(size, self.limit - self.tell()))
+
+
+class ReadFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self, error):
+        stream = FailingStream(BODY, 100000, error)
+        multipart.parse_multipart(
+            stream, f"multipart/form-data; boundary={BOUNDARY}", len(BODY) + 1000,
+            upload_dir=self.tmp.name, chunk_size=16384,
+        )
+
+    def test_timeout_removes_partial_file(self):
+        with self.assertRaises(socket.timeout):
+            self.parse(socket.timeout("timed out"))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_reset_removes_partial_file(self):
+        with self.assertRaises(ConnectionResetError):
+            self.parse(ConnectionResetError())
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Revision fingerprints must see edits anywhere in the document.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import tempfile
+import unittest
+
+import criteriaeval
+import pdfengine
+import revisions
+
+
+SECTIONS = [
+    (1, "1 Introduction"),
+    (10, "2 Methods"),
+    (20, "3 Results"),
+    (30, "4 Discussion"),
+    (40, "5 Falsifiability"),
+]
+FILLER = "The framework maps each observable to a measurable quantity at the stated scale and no other. "
+
+
+def write_pdf(path, last_page_text):
+    """A 40-page paper, about 4,500 characters a page, ending in its falsifiability section."""
+    headings = dict(SECTIONS)
+    doc = pdfengine.pymupdf.open()
+    for number in range(1, 41):
+        page = doc.new_page()
+        lines = [headings[number], ""] if number in headings else []
+        if number == 40:
+            lines.append(last_page_text)
+        lines += [f"Page {number}, paragraph {i}. {FILLER}"[:95] for i in range(48)]
+        page.insert_text((36, 40), "\n".join(lines), fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+@unittest.skipUnless(pdfengine.PYMUPDF_AVAILABLE, "needs PyMuPDF")
+class LastPageEditTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = pdfengine.PdfEngine(workers=0)
+        self.v1 = os.path.join(self.tmp.name, "v1.pdf")
+        self.v2 = os.path.join(self.tmp.name, "v2.pdf")
+        write_pdf(self.v1, "A single null result at the stated scale would refute the claim.")
+        write_pdf(self.v2, "Three independent null results would be needed to refute the claim.")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fingerprint(self, path):
+        return revisions.fingerprint(self.engine.digest(path), {"submission_title": "Polarity"}, {"email": "a@b.c"})
+
+    def test_documents_exceed_prompt_text(self):
+        analysis = self.engine.analyze(self.v1, max_chars=60000, max_pages=0, stream=True)
+        self.assertTrue(analysis["truncated"])
+        self.assertNotIn("refute the claim", analysis["text"])
+
+    def test_last_page_edit_makes_its_criterion_stale(self):
+        changes = revisions.diff(self.fingerprint(self.v1), self.fingerprint(self.v2))
+        self.assertEqual(changes["pages_changed"], [40])
+        self.assertEqual(changes["changed"], ["5 Falsifiability"])
+        self.assertIn(5, changes["stale"])
+        self.assertLess(len(changes["stale"]), len(criteriaeval.ALL_CRITERIA))
+
+    def test_identical_versions_carry_everything_over(self):
+        changes = revisions.diff(self.fingerprint(self.v1), self.fingerprint(self.v1))
+        self.assertEqual(changes["stale"], {})
+
+
+class FallbackTest(unittest.TestCase):
+    def fingerprint(self, text, pages):
+        digest = {"text": text, "page_hashes": pages, "page_visual_hashes": [None] * len(pages)}
+        return revisions.fingerprint(digest, {}, {"email": "a@b.c"})
+
+    def test_fingerprint_from_truncated_text_reevaluates_everything(self):
+        old = self.fingerprint("Abstract\nSame text.", ["a"])
+        del old["complete"]
+        changes = revisions.diff(old, self.fingerprint("Abstract\nSame text.", ["a"]))
+        self.assertEqual(sorted(changes["stale"]), list(criteriaeval.ALL_CRITERIA))
+
+    def test_page_change_outside_sections_reevaluates_everything(self):
+        changes = revisions.diff(self.fingerprint("Abstract\nSame text.", ["a"]),
+                                 self.fingerprint("Abstract\nSame text.", ["b"]))
+        self.assertEqual(changes["pages_changed"], [1])
+        self.assertEqual(sorted(changes["stale"]), list(criteriaeval.ALL_CRITERIA))
+
+
+if __name__ == "__main__":
+    unittest.main()